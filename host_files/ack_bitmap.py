@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+"""
+确认位图
+宿主机把已确认的帧编号记录为位图（第n帧对应第n位，字节内低位在前），每确认一帧就原子地整体改写，
+共享文件夹上每帧只写入几十到几百字节，TAR分片保存在宿主机本地
+"""
+
+import os
+import time
+from typing import Iterable
+
+# 改写位图失败时的重试次数和间隔（Windows上虚拟机正在读取共享文件时os.replace可能被拒绝）
+WRITE_ATTEMPTS = 3
+WRITE_RETRY_DELAY = 0.05
+
+class AckBitmap:
+    """已确认帧编号的位图，写入时先写临时文件再原子替换"""
+
+    def __init__(self, path: str, confirmed: Iterable[int] = ()):
+        self.path = path
+        self.bits = bytearray()
+        # 已设置但尚未成功写入文件的位
+        self.unpublished = False
+        for frame_number in confirmed:
+            self.set(frame_number)
+
+    def set(self, frame_number: int) -> None:
+        """标记一帧为已确认"""
+        byte_index = frame_number >> 3
+        if byte_index >= len(self.bits):
+            self.bits.extend(bytes(byte_index + 1 - len(self.bits)))
+        self.bits[byte_index] |= 1 << (frame_number & 7)
+
+    def __contains__(self, frame_number: int) -> bool:
+        byte_index = frame_number >> 3
+        return byte_index < len(self.bits) and bool(self.bits[byte_index] & (1 << (frame_number & 7)))
+
+    def write(self) -> None:
+        """原子地改写共享文件夹中的位图文件"""
+        temp_path = self.path + ".tmp"
+        with open(temp_path, 'wb') as f:
+            f.write(self.bits)
+        os.replace(temp_path, self.path)
+
+    def publish(self, attempts: int = WRITE_ATTEMPTS, delay: float = WRITE_RETRY_DELAY) -> bool:
+        """
+        改写位图文件，失败时稍后重试；仍失败时返回False而不抛出异常，
+        已设置的位保留在内存中，下一次写入时一并发布
+        """
+        for attempt in range(attempts):
+            try:
+                self.write()
+                self.unpublished = False
+                return True
+            except OSError as e:
+                print(f"写入确认位图失败（第 {attempt + 1}/{attempts} 次）: {e}")
+                if attempt + 1 < attempts:
+                    time.sleep(delay)
+        self.unpublished = True
+        return False
@@ -3,8 +3,13 @@ from PIL import Image
 import numpy as np
 import array
 import argparse
-import concurrent.futures
-import threading
+import struct
+import time
+import zlib
+from math import gcd
+from typing import NamedTuple, Optional, Sequence, Tuple
+from color_classifier import ColorClassifier, build_palette_lut
+from reed_solomon import ReedSolomonError, fec_decode, fec_encoded_size, fec_extract
 
 # 预定义颜色映射
 COLOR_MAP = {
@@ -15,8 +20,61 @@ COLOR_MAP = {
     (0, 0, 0): '4'
 }
 
-# 预定义颜色数组
-COLOR_ARRAYS = np.array(list(COLOR_MAP.keys()))
+# 高密度调色板（与tar_to_bmp.py的PALETTES一致），符号即颜色下标；帧头始终使用COLOR_MAP的2位调色板
+PALETTES = {
+    3: [(255, 0, 0), (0, 255, 0), (0, 0, 255), (255, 255, 255),
+        (0, 255, 255), (255, 0, 255), (255, 255, 0), (0, 0, 0)],
+    4: [(255, 0, 0), (0, 255, 0), (0, 0, 255), (255, 255, 255),
+        (0, 255, 255), (255, 0, 255), (255, 255, 0), (0, 0, 0),
+        (0, 85, 0), (0, 170, 0), (255, 85, 0), (255, 170, 0),
+        (0, 85, 255), (0, 170, 255), (255, 85, 255), (255, 170, 255)],
+}
+
+# 颜色查找表分类器和高密度调色板查找表，每个会话只构建一次
+CLASSIFIER = ColorClassifier(COLOR_MAP)
+PALETTE_LUTS = {bits: build_palette_lut(palette) for bits, palette in PALETTES.items()}
+
+# 帧头：魔数、版本、标志、纠错校验字节数、每像素位数、帧编号、总帧数、负载长度、负载CRC32、帧头CRC32（与tar_to_bmp.py保持一致）
+FRAME_MAGIC = b'QF'
+FRAME_VERSION = 3
+FRAME_HEADER_STRUCT = struct.Struct('<2sBBBBIIIII')
+FRAME_HEADER_SYMBOLS = FRAME_HEADER_STRUCT.size * 4
+
+# 帧头标志位：跨帧纠删编码的校验帧；二进制索引的分段（帧编号、总帧数为分段编号、分段总数）
+FRAME_FLAG_PARITY = 0x01
+FRAME_FLAG_INDEX = 0x02
+
+class FrameError(ValueError):
+    """截图无法使用：帧头损坏、负载越界、CRC不匹配（截到半帧/撕裂帧）或错误超出纠错能力"""
+
+class PayloadError(FrameError):
+    """帧头有效但负载CRC不匹配或错误超出纠错能力；payload为按帧头长度尽力提取的负载，可按分块摘要定位损坏的块"""
+
+    def __init__(self, message: str, payload: bytes):
+        super().__init__(message)
+        self.payload = payload
+
+class FrameHeader(NamedTuple):
+    version: int
+    flags: int
+    fec_nsym: int
+    symbol_bits: int
+    frame_number: int
+    total_frames: int
+    payload_length: int
+    payload_crc: int
+
+def parse_frame_header(header_bytes: bytes) -> Optional[FrameHeader]:
+    """解析帧头；魔数不匹配（旧格式帧）时返回None，帧头CRC或版本不匹配时抛出FrameError"""
+    if len(header_bytes) < FRAME_HEADER_STRUCT.size or header_bytes[:2] != FRAME_MAGIC:
+        return None
+    fields = FRAME_HEADER_STRUCT.unpack(header_bytes[:FRAME_HEADER_STRUCT.size])
+    if zlib.crc32(header_bytes[:FRAME_HEADER_STRUCT.size - 4]) != fields[-1]:
+        raise FrameError("帧头CRC不匹配")
+    header = FrameHeader(*fields[1:-1])
+    if header.version != FRAME_VERSION:
+        raise FrameError(f"不支持的帧版本 {header.version}，请用相同版本的tar_to_bmp.py重新生成")
+    return header
 
 def quaternary_to_binary_optimized(quaternary_str: str) -> bytes:
     """优化的四进制到二进制转换"""
@@ -39,37 +97,118 @@ def quaternary_to_binary_optimized(quaternary_str: str) -> bytes:
     
     return bytes(binary_data)
 
-def process_image_chunk(chunk_pixels, lock, results, chunk_id):
-    """处理图像分块的核心逻辑"""
-    pixels_flat = chunk_pixels.reshape(-1, 3)
-    
-    # 创建规则掩码
-    white_mask = np.all(pixels_flat > 180, axis=1)
-    black_mask = np.all(pixels_flat < 100, axis=1)
-    
-    # 初始化结果数组
-    result = np.full(len(pixels_flat), '4', dtype='U1')
-    
-    # 应用规则
-    result[white_mask] = '3'
-    result[black_mask] = '4'
-    
-    # 处理其他像素
-    other_mask = ~(white_mask | black_mask)
-    if np.any(other_mask):
-        other_pixels = pixels_flat[other_mask]
-        
-        # 计算与所有颜色的距离
-        distances = np.sum((COLOR_ARRAYS[:, np.newaxis, :] - other_pixels[np.newaxis, :, :]) ** 2, axis=2)
-        min_indices = np.argmin(distances, axis=0)
-        
-        # 映射到对应的四进制数字
-        color_values = list(COLOR_MAP.values())
-        result[other_mask] = [color_values[i] for i in min_indices]
-    
-    # 将结果存储到共享列表
-    with lock:
-        results[chunk_id] = ''.join(result.tolist())
+def quaternary_to_bytes(symbols: np.ndarray) -> bytes:
+    """将uint8四进制符号数组按每4个符号打包为字节（移位运算，无字符串中转）"""
+    if symbols.size == 0:
+        return b''
+    
+    # 末尾补0使长度为4的倍数，与quaternary_to_binary_optimized保持一致
+    padding = (4 - symbols.size % 4) % 4
+    if padding:
+        symbols = np.concatenate([symbols, np.zeros(padding, dtype=np.uint8)])
+    
+    groups = symbols.reshape(-1, 4)
+    packed = groups[:, 0] << 6
+    packed |= groups[:, 1] << 4
+    packed |= groups[:, 2] << 2
+    packed |= groups[:, 3]
+    return packed.tobytes()
+
+def symbol_group(symbol_bits: int) -> Tuple[int, int]:
+    """最小打包单位：(符号数, 字节数)，例如3位时8个符号对应3个字节"""
+    symbols = 8 // gcd(8, symbol_bits)
+    return symbols, symbols * symbol_bits // 8
+
+def symbols_to_bytes(symbols: np.ndarray, symbol_bits: int) -> bytes:
+    """将每个symbol_bits位的符号数组按高位在前打包为字节，末尾补0到整数个打包单位"""
+    if symbol_bits == 2:
+        return quaternary_to_bytes(symbols)
+    if symbols.size == 0:
+        return b''
+    group_symbols, group_bytes = symbol_group(symbol_bits)
+    padding = -symbols.size % group_symbols
+    if padding:
+        symbols = np.concatenate([symbols, np.zeros(padding, dtype=np.uint8)])
+    
+    # 每个打包单位先拼成一个整数，再按字节拆开
+    groups = symbols.reshape(-1, group_symbols)
+    words = np.zeros(groups.shape[0], dtype=np.uint32)
+    for column in range(group_symbols):
+        words <<= symbol_bits
+        words |= groups[:, column]
+    shifts = np.arange(group_bytes - 1, -1, -1, dtype=np.uint32) * 8
+    return ((words[:, np.newaxis] >> shifts) & 0xFF).astype(np.uint8).tobytes()
+
+def image_to_symbols(image_array: np.ndarray, channels: Sequence[int] = (0, 1, 2),
+                     out: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    通过查找表一次性将图像像素分类为uint8符号数组（0-3为数据，4为黑色结束符）
+    帧头声明了高密度调色板时，帧头之后的像素改用该调色板的查找表分类
+    """
+    index = CLASSIFIER.quantize(image_array, channels)
+    if out is None:
+        out = np.empty(index.size, dtype=np.uint8)
+    np.take(CLASSIFIER.lut, index[:FRAME_HEADER_SYMBOLS], out=out[:FRAME_HEADER_SYMBOLS])
+    try:
+        header = read_frame_header(out)
+    except FrameError:
+        header = None
+    lut = PALETTE_LUTS.get(header.symbol_bits, CLASSIFIER.lut) if header is not None else CLASSIFIER.lut
+    np.take(lut, index[FRAME_HEADER_SYMBOLS:], out=out[FRAME_HEADER_SYMBOLS:])
+    return out
+
+def truncate_at_sentinel(symbols: np.ndarray) -> np.ndarray:
+    """截断到第一个黑色结束符（4）之前"""
+    sentinel = np.flatnonzero(symbols == 4)
+    if sentinel.size:
+        return symbols[:sentinel[0]]
+    return symbols  # 如果没有找到'4'，则使用整个数组
+
+def read_frame_header(symbols: np.ndarray) -> Optional[FrameHeader]:
+    """从符号数组开头解析帧头"""
+    return parse_frame_header(quaternary_to_bytes(symbols[:FRAME_HEADER_SYMBOLS]))
+
+def decode_symbols_fec(symbols: np.ndarray) -> Tuple[Optional[FrameHeader], bytes, int]:
+    """
+    根据帧头提取负载并校验CRC，只打包负载所在的符号，返回(帧头, 负载, 前向纠错修正的码字数)
+    没有帧头的旧格式帧返回(None, 负载, 0)，负载按黑色结束符截断；负载无法通过CRC时抛出携带尽力提取负载的PayloadError
+    本函数不输出日志，在解码进程中调用时由主进程汇报纠错结果
+    """
+    header = read_frame_header(symbols)
+    if header is None:
+        return None, quaternary_to_bytes(truncate_at_sentinel(symbols)), 0
+    
+    if header.symbol_bits != 2 and header.symbol_bits not in PALETTES:
+        raise FrameError(f"不支持的每像素位数 {header.symbol_bits}")
+    body_length = header.payload_length
+    if header.fec_nsym:
+        body_length = fec_encoded_size(header.payload_length, header.fec_nsym)
+    group_symbols, group_bytes = symbol_group(header.symbol_bits)
+    end = FRAME_HEADER_SYMBOLS + -(-body_length // group_bytes) * group_symbols
+    if end > symbols.size:
+        raise FrameError(f"帧头中的负载长度 {header.payload_length} 超出帧容量")
+    body = symbols_to_bytes(symbols[FRAME_HEADER_SYMBOLS:end], header.symbol_bits)[:body_length]
+    
+    corrected = 0
+    if not header.fec_nsym:
+        payload = body
+    else:
+        # 先直接取数据字节，CRC通过则无需纠错
+        payload = fec_extract(body, header.fec_nsym, header.payload_length)
+        if zlib.crc32(payload) != header.payload_crc:
+            try:
+                payload, corrected = fec_decode(body, header.fec_nsym, header.payload_length)
+            except ReedSolomonError as e:
+                raise PayloadError(f"第 {header.frame_number} 帧{e}", payload)
+    
+    if zlib.crc32(payload) != header.payload_crc:
+        raise PayloadError(f"第 {header.frame_number} 帧负载CRC不匹配", payload)
+    return header, payload, corrected
+
+def decode_symbols(symbols: np.ndarray) -> Tuple[Optional[FrameHeader], bytes]:
+    """根据帧头提取负载并校验CRC，返回(帧头, 负载)；没有帧头的旧格式帧返回(None, 负载)"""
+    header, payload, _ = decode_symbols_fec(symbols)
+    return header, payload
 
 def bmp_to_tar_vectorized(bmp_path: str, tar_path: str, bmp_width: int, bmp_height: int):
     """多线程版本的图像转换"""
@@ -79,59 +218,56 @@ def bmp_to_tar_vectorized(bmp_path: str, tar_path: str, bmp_width: int, bmp_heig
     
     # 转换为numpy数组
     image_array = np.array(cropped_image)
-    height = image_array.shape[0]
-    
-    # 将图像分成4个水平条带
-    chunk_height = height // 4
-    chunks = [
-        image_array[i*chunk_height: (i+1)*chunk_height] 
-        for i in range(4)
-    ]
-    
-    # 处理最后可能不完整的部分
-    if height % 4 != 0:
-        chunks[-1] = image_array[3*chunk_height:]
-    
-    # 多线程处理
-    lock = threading.Lock()
-    results = [None] * 4  # 预分配结果存储
-    
-    with concurrent.futures.ThreadPoolExecutor(max_workers=4) as executor:
-        futures = []
-        for i, chunk in enumerate(chunks):
-            futures.append(executor.submit(
-                process_image_chunk, chunk, lock, results, i
-            ))
-        
-        # 等待所有任务完成
-        concurrent.futures.wait(futures)
-    
-    # 合并结果
-    quaternary_str = ''.join(results)
-    
-    # 找到第一个'4'的位置
-    try:
-        end_idx = quaternary_str.index('4')
-        quaternary_str = quaternary_str[:end_idx]
-    except ValueError:
-        pass  # 如果没有找到'4'，则使用整个字符串
     
-    # 转换为二进制数据
-    binary_data = quaternary_to_binary_optimized(quaternary_str)
+    # 分类为符号，按帧头（或旧格式的结束符）提取二进制数据
+    _, binary_data = decode_symbols(image_to_symbols(image_array))
     
     # 写入文件
     with open(tar_path, 'wb') as tar_file:
         tar_file.write(binary_data)
 
+def benchmark_packing(width: int = 2550, height: int = 1590, repeats: int = 3) -> None:
+    """对比字符串打包与向量化打包的单帧耗时，并校验输出一致"""
+    rng = np.random.default_rng(0)
+    symbols = rng.integers(0, 4, size=width * height, dtype=np.uint8)
+    
+    # 旧流程：'U1'符号数组 -> 拼接字符串 -> 逐字符打包
+    legacy_symbols = symbols.astype('U1')
+    start_time = time.perf_counter()
+    quaternary_str = ''.join(legacy_symbols.tolist())
+    legacy_data = quaternary_to_binary_optimized(quaternary_str)
+    legacy_time = time.perf_counter() - start_time
+    
+    vectorized_time = float('inf')
+    for _ in range(repeats):
+        start_time = time.perf_counter()
+        vectorized_data = quaternary_to_bytes(symbols)
+        vectorized_time = min(vectorized_time, time.perf_counter() - start_time)
+    
+    if vectorized_data != legacy_data:
+        raise AssertionError("Vectorized packing output differs from legacy output")
+    
+    print(f"Frame: {width}x{height} ({symbols.size} symbols, {len(vectorized_data)} bytes)")
+    print(f"Legacy string packing: {legacy_time * 1000:.1f} ms/frame")
+    print(f"Vectorized packing:    {vectorized_time * 1000:.1f} ms/frame")
+    print(f"Speedup: {legacy_time / vectorized_time:.0f}x (output identical)")
+
 def main():
     parser = argparse.ArgumentParser(description='Convert BMP image to TAR file')
-    parser.add_argument('--input', '-i', required=True, help='Input BMP file path')
-    parser.add_argument('--output', '-o', required=True, help='Output TAR file path')
+    parser.add_argument('--input', '-i', help='Input BMP file path')
+    parser.add_argument('--output', '-o', help='Output TAR file path')
     parser.add_argument('--width', type=int, help='BMP file width')
     parser.add_argument('--height', type=int, help='BMP file height')
+    parser.add_argument('--benchmark', action='store_true', help='Benchmark per-frame symbol packing and exit')
     
     args = parser.parse_args()
     
+    if args.benchmark:
+        benchmark_packing(args.width or 2550, args.height or 1590)
+        return
+    if not args.input or not args.output:
+        parser.error('--input and --output are required')
+    
     bmp_to_tar_vectorized(args.input, args.output, args.width, args.height)
     print(f"Converted {args.input} to {args.output}")
 
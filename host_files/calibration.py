@@ -0,0 +1,208 @@
+# -*- coding: utf-8 -*-
+"""
+校准帧识别
+会话开始时虚拟机显示校准帧（四角灰色定位块 + 16色调色板色块，见虚拟机端tar_to_bmp.py），宿主机截取整个显示器，
+测出数据区域在显示器上的位置、缩放比例和每种调色板颜色的实际截图颜色；之后的裁剪和颜色分类都使用实测值，
+不再依赖固定的裁剪偏移和白色/黑色阈值
+"""
+
+import json
+import os
+from typing import NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+import bmp_to_tar
+from color_classifier import build_palette_lut
+from screen_capture import BGRA_CHANNELS
+
+# 校准帧布局参数（与tar_to_bmp.py保持一致）
+CALIBRATION_MARKER = 16
+CALIBRATION_MARKER_COLOR = (128, 128, 128)
+CALIBRATION_SIZE_BITS = 40
+CALIBRATION_BIT_ROW = (20, 28)
+
+# 定位块颜色的容差
+MARKER_TOLERANCE = 48
+
+# 基础调色板的红、绿、蓝、白、黑在16色色块中的下标，依次对应符号0-4
+BASE_PALETTE_INDEXES = (0, 1, 2, 3, 7)
+
+# 基础调色板实测颜色之间的最小距离，低于此值说明截到的不是校准帧
+MIN_COLOR_DISTANCE = 48
+
+class Calibration(NamedTuple):
+    """
+    校准结果
+    left/top: 数据区域在显示器上的左上角；width/height: 帧的逻辑尺寸；cell: 每个符号单元的边长（像素）
+    capture_width/capture_height: 数据区域在截图中的实际尺寸（显示缩放时与逻辑尺寸不同）
+    colors: 16色调色板每种颜色的实测RGB值
+    """
+    left: int
+    top: int
+    width: int
+    height: int
+    cell: int
+    capture_width: int
+    capture_height: int
+    colors: Tuple[Tuple[int, int, int], ...]
+
+    @property
+    def region(self) -> Tuple[int, int, int, int]:
+        """截图区域(left, top, width, height)"""
+        return self.left, self.top, self.capture_width, self.capture_height
+
+def calibration_layout(width: int, height: int) -> Tuple[int, int, int, int]:
+    """校准帧布局：(定位块边长, 色块边长, 色块区域左上角x, y)，色块为2行8列"""
+    swatch = min(64, (width - 4 * CALIBRATION_MARKER) // 8, (height - 4 * CALIBRATION_MARKER) // 2)
+    if swatch < 4:
+        raise ValueError(f"帧尺寸 {width}x{height} 过小，无法容纳校准帧")
+    return CALIBRATION_MARKER, swatch, (width - 8 * swatch) // 2, (height - 2 * swatch) // 2
+
+def palette_margin(colors: Sequence[Tuple[int, int, int]]) -> float:
+    """一组实测颜色两两之间的最小欧氏距离，越大越不容易误判"""
+    points = np.array(colors, dtype=np.float64)
+    distances = np.sqrt(((points[:, np.newaxis, :] - points[np.newaxis, :, :]) ** 2).sum(axis=2))
+    return float(distances[~np.eye(len(points), dtype=bool)].min())
+
+def _mask_components(mask: np.ndarray) -> np.ndarray:
+    """
+    掩码中的4连通区域，返回(N, 5)数组，每行为(top, left, bottom, right, 像素数)，坐标含端点
+    按行扫描出连续的行程，相邻两行中重叠的行程用并查集合并（不依赖scipy）
+    """
+    padded = np.zeros((mask.shape[0], mask.shape[1] + 2), dtype=np.int8)
+    padded[:, 1:-1] = mask
+    edges = np.diff(padded, axis=1)
+    run_rows, run_starts = np.nonzero(edges == 1)
+    run_ends = np.nonzero(edges == -1)[1]  # 行程结束位置（不含）
+    if run_rows.size == 0:
+        return np.empty((0, 5), dtype=np.int64)
+
+    parent = list(range(run_rows.size))
+
+    def find(i: int) -> int:
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    row_first = np.searchsorted(run_rows, np.arange(mask.shape[0] + 1)).tolist()
+    starts, ends = run_starts.tolist(), run_ends.tolist()
+    for y in range(1, mask.shape[0]):
+        # 上一行与本行的行程都按起点排列，双指针找出所有重叠的行程对
+        i, i_end, j, j_end = row_first[y - 1], row_first[y], row_first[y], row_first[y + 1]
+        while i < i_end and j < j_end:
+            if starts[i] < ends[j] and starts[j] < ends[i]:
+                root_i, root_j = find(i), find(j)
+                if root_i != root_j:
+                    parent[root_j] = root_i
+            if ends[i] < ends[j]:
+                i += 1
+            else:
+                j += 1
+
+    _, labels = np.unique([find(i) for i in range(len(parent))], return_inverse=True)
+    count = int(labels.max()) + 1
+    components = np.empty((count, 5), dtype=np.int64)
+    components[:, 0] = components[:, 1] = np.iinfo(np.int64).max
+    components[:, 2] = components[:, 3] = -1
+    components[:, 4] = 0
+    np.minimum.at(components[:, 0], labels, run_rows)
+    np.minimum.at(components[:, 1], labels, run_starts)
+    np.maximum.at(components[:, 2], labels, run_rows)
+    np.maximum.at(components[:, 3], labels, run_ends - 1)
+    np.add.at(components[:, 4], labels, run_ends - run_starts)
+    return components
+
+def _find_markers(mask: np.ndarray) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+    """
+    在灰色掩码中找出四角定位块：同样大小、实心、围成与坐标轴对齐的矩形的四个连通区域，
+    有多组时取围成面积最大的一组；返回(左上定位块, 右下定位块)的(top, left, bottom, right)
+    其他灰色像素（任务栏、窗口边框等）与定位块不相连，不影响定位
+    """
+    components = _mask_components(mask)
+    heights = components[:, 2] - components[:, 0] + 1
+    widths = components[:, 3] - components[:, 1] + 1
+    filled = components[:, 4] >= 0.9 * heights * widths
+    shaped = (widths >= 4) & (heights >= 4) & (widths <= 2 * heights) & (heights <= 2 * widths)
+    markers = components[filled & shaped, :4]
+    sizes = np.stack([heights, widths], axis=1)[filled & shaped]
+
+    best, best_area = None, 0
+    for a, size in zip(markers, sizes):
+        tolerance = 1 + int(size.max()) // 8
+        for d, other_size in zip(markers, sizes):
+            # 右下定位块在左上定位块的右下方，且大小相同
+            if d[0] <= a[2] or d[1] <= a[3] or np.any(np.abs(other_size - size) > tolerance):
+                continue
+            area = (d[2] - a[0]) * (d[3] - a[1])
+            if area <= best_area:
+                continue
+            corners = np.array([(a[0], d[1], a[2], d[3]), (d[0], a[1], d[2], a[3])])
+            if all(np.any(np.all(np.abs(markers - corner) <= tolerance, axis=1)) for corner in corners):
+                best, best_area = (a, d), area
+    return best
+
+def detect_calibration(image: np.ndarray,
+                       channels: Sequence[int] = BGRA_CHANNELS) -> Optional[Calibration]:
+    """
+    在整个显示器的截图中查找校准帧，未找到时返回None
+    先找出四角定位块，数据区域即它们围成的矩形；帧尺寸和单元边长从校准帧中记录的位读出，缩放比例为截图尺寸与帧尺寸之比
+    """
+    rgb = np.stack([image[..., c] for c in channels], axis=-1).astype(np.int16)
+    mask = (np.abs(rgb - np.array(CALIBRATION_MARKER_COLOR, dtype=np.int16)) <= MARKER_TOLERANCE).all(axis=-1)
+    found = _find_markers(mask)
+    if found is None:
+        return None
+    top_left, bottom_right = found
+    top, left, bottom, right = int(top_left[0]), int(top_left[1]), int(bottom_right[2]), int(bottom_right[3])
+    capture_width, capture_height = right - left + 1, bottom - top + 1
+    marker_width, marker_height = int(top_left[3] - left + 1), int(top_left[2] - top + 1)
+
+    # 读出帧尺寸和单元边长：比定位块亮的为1；再用定位块边长估算的尺寸排除误读
+    bit_y = top + int(sum(CALIBRATION_BIT_ROW) / 2 * marker_height / CALIBRATION_MARKER)
+    threshold = rgb[top, left].sum()
+    size_bits = 0
+    for k in range(CALIBRATION_SIZE_BITS):
+        bit_x = left + int((k + 1) * capture_width / (CALIBRATION_SIZE_BITS + 2))
+        size_bits = (size_bits << 1) | int(rgb[bit_y, bit_x].sum() > threshold)
+    width, height, cell = size_bits >> 24, (size_bits >> 8) & 0xFFFF, size_bits & 0xFF
+    estimated_width = capture_width * CALIBRATION_MARKER / marker_width
+    estimated_height = capture_height * CALIBRATION_MARKER / marker_height
+    if abs(width - estimated_width) > estimated_width / CALIBRATION_MARKER + 1 or \
+            abs(height - estimated_height) > estimated_height / CALIBRATION_MARKER + 1 or cell == 0:
+        return None
+
+    # 取每个色块中间一半区域的中位数作为该颜色的实测值
+    try:
+        _, swatch, swatch_left, swatch_top = calibration_layout(width, height)
+    except ValueError:
+        return None
+    scale_x, scale_y = capture_width / width, capture_height / height
+    colors = []
+    for i in range(16):
+        x = swatch_left + (i % 8) * swatch
+        y = swatch_top + (i // 8) * swatch
+        x0, x1 = left + int((x + swatch / 4) * scale_x), left + int((x + swatch * 3 / 4) * scale_x)
+        y0, y1 = top + int((y + swatch / 4) * scale_y), top + int((y + swatch * 3 / 4) * scale_y)
+        block = rgb[y0:max(y1, y0 + 1), x0:max(x1, x0 + 1)].reshape(-1, 3)
+        colors.append(tuple(int(value) for value in np.median(block, axis=0)))
+
+    if palette_margin([colors[i] for i in BASE_PALETTE_INDEXES]) < MIN_COLOR_DISTANCE:
+        return None
+    return Calibration(left, top, width, height, cell, capture_width, capture_height, tuple(colors))
+
+def apply_calibration(calibration: Calibration) -> None:
+    """用实测颜色重建所有颜色查找表（按最近实测颜色分类，取代固定的白色/黑色阈值规则）"""
+    colors = calibration.colors
+    base_lut = build_palette_lut([colors[i] for i in BASE_PALETTE_INDEXES])
+    bmp_to_tar.CLASSIFIER.lut = base_lut
+    for bits, palette in bmp_to_tar.PALETTES.items():
+        bmp_to_tar.PALETTE_LUTS[bits] = build_palette_lut(colors[:len(palette)])
+
+def save_calibration(calibration: Calibration, path: str) -> None:
+    """原子地写入校准结果，虚拟机看到该文件后结束校准帧的显示"""
+    temp_path = path + '.tmp'
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(calibration._asdict(), f)
+    os.replace(temp_path, path)
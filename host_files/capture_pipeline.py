@@ -0,0 +1,225 @@
+# -*- coding: utf-8 -*-
+"""
+流水线截图解码
+截图、解码、校验保存三个阶段并发执行：截图线程只负责截图和投递，CPU密集的分类与解码在进程池中进行，
+主线程按截图顺序取回结果并校验保存，每帧耗时接近最慢的单个阶段而不是各阶段之和
+"""
+
+import queue
+import signal
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, Iterator, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from bmp_to_tar import (FRAME_FLAG_INDEX, FRAME_FLAG_PARITY, FrameError, PayloadError, decode_symbols_fec,
+                        read_frame_header)
+from calibration import Calibration, apply_calibration
+from change_detector import ChangeDetector
+from frame_decoder import FrameDecoder, sample_cells
+from merkle import BLOCK_SIZE, block_hashes
+from screen_capture import ScreenCapture, BGRA_CHANNELS
+
+class DecodeResult(NamedTuple):
+    """
+    一次截图在解码进程中的结果
+    frame_number: 帧头中的帧编号，旧格式帧或帧头损坏时为None
+    flags: 帧头中的标志位（如校验帧），帧头不可用时为0
+    data/leaves: 解码成功时的TAR分片字节及其分块叶子摘要（索引帧、校验帧不计算叶子），失败时data为None；
+    负载CRC不匹配时leaves为尽力提取的负载的叶子摘要，用于按索引报告损坏的块
+    symbols: 需要多次截图融合时保留的符号数组，否则为None
+    corrected: 前向纠错修正的码字数（解码进程不输出日志，由主循环汇报）
+    """
+    timestamp: float
+    frame_number: Optional[int]
+    flags: int
+    data: Optional[bytes]
+    leaves: Optional[List[bytes]]
+    symbols: Optional[np.ndarray]
+    error: str
+    corrected: int = 0
+
+# 每个解码进程各自持有一个解码器，以及帧尺寸、单元边长和索引中的分块大小
+_decoder: Optional[FrameDecoder] = None
+_frame_geometry: Tuple[int, int, int] = (0, 0, 1)
+_block_size = BLOCK_SIZE
+
+def _init_decode_worker(width: int, height: int, cell: int, calibration: Optional[Calibration],
+                        block_size: int = BLOCK_SIZE) -> None:
+    """解码进程初始化：创建单元网格尺寸的解码器并应用校准颜色，Ctrl+C交给主进程处理"""
+    global _decoder, _frame_geometry, _block_size
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    _decoder = FrameDecoder(width // cell, height // cell)
+    _frame_geometry = (width, height, cell)
+    _block_size = block_size
+    if calibration is not None:
+        apply_calibration(calibration)
+
+def decode_capture_job(timestamp: float, image: np.ndarray, keep_symbols: bool) -> DecodeResult:
+    """在解码进程中分类像素、解析帧头、解码负载并计算分块叶子摘要；任何异常都作为该截图的错误结果返回"""
+    try:
+        return _decode_capture(timestamp, image, keep_symbols)
+    except Exception as e:
+        return DecodeResult(timestamp, None, 0, None, None, None, f"解码异常: {e!r}")
+
+def _decode_capture(timestamp: float, image: np.ndarray, keep_symbols: bool) -> DecodeResult:
+    image = sample_cells(image, *_frame_geometry)
+    symbols = _decoder.classify(image, BGRA_CHANNELS)
+    try:
+        header = read_frame_header(symbols)
+    except FrameError as e:
+        return DecodeResult(timestamp, None, 0, None, None, symbols if keep_symbols else None, f"帧头无效: {e}")
+
+    frame_number = header.frame_number if header is not None else None
+    flags = header.flags if header is not None else 0
+    try:
+        _, binary_data, corrected = decode_symbols_fec(symbols)
+    except PayloadError as e:
+        leaves = None if flags & (FRAME_FLAG_INDEX | FRAME_FLAG_PARITY) else block_hashes(e.payload, _block_size)
+        return DecodeResult(timestamp, frame_number, flags, None, leaves, symbols if keep_symbols else None, str(e))
+    except FrameError as e:
+        return DecodeResult(timestamp, frame_number, flags, None, None, symbols if keep_symbols else None, str(e))
+
+    # 旧格式帧没有负载CRC，摘要不匹配时仍需融合，因此保留符号数组
+    kept = symbols if keep_symbols and header is None else None
+    leaves = None if flags & (FRAME_FLAG_INDEX | FRAME_FLAG_PARITY) else block_hashes(binary_data, _block_size)
+    return DecodeResult(timestamp, frame_number, flags, binary_data, leaves, kept, '', corrected)
+
+class _PendingJob(NamedTuple):
+    """已提交的解码任务：截图时间、任务、提交到的进程池和保留的截图"""
+    timestamp: float
+    future: Future
+    executor: ProcessPoolExecutor
+    image: Optional[np.ndarray]
+
+class CapturePipeline:
+    """
+    截图线程 -> 解码进程池 -> 调用方（校验保存）
+    截图线程在自己的线程中创建截图对象（mss不能跨线程使用）；在途的解码任务数达到上限时不截图，
+    截图阶段从不等待解码或磁盘；block_size为索引头中的分块大小，解码进程按它计算叶子摘要
+    提供change_detector时只在检测到新的稳定帧时截图，画面超过interval秒没有变化时再截一次（供重试和融合），
+    解码繁忙时推迟到有空位再截图；否则每隔interval秒截图一次，解码繁忙时跳过（计入dropped）
+    解码进程意外退出（进程池损坏）时重建进程池，受影响的截图作为错误结果返回，流水线继续运行
+    """
+
+    def __init__(self, capture_factory: Callable[[], ScreenCapture], width: int, height: int,
+                 interval: float, workers: int = 2, depth: int = 4, keep_symbols: bool = True,
+                 keep_images: bool = False, cell: int = 1, calibration: Optional[Calibration] = None,
+                 change_detector: Optional[ChangeDetector] = None, block_size: int = BLOCK_SIZE):
+        self.capture_factory = capture_factory
+        self.interval = interval
+        self.keep_symbols = keep_symbols
+        self.keep_images = keep_images
+        self.change_detector = change_detector
+        self.dropped = 0
+        self.changes = 0
+        self.timeouts = 0
+        self.restarts = 0
+        self._pending: "queue.Queue[_PendingJob]" = queue.Queue(maxsize=depth)
+        self._stop = threading.Event()
+        self._error: Optional[BaseException] = None
+        self._executor_args = (width, height, cell, calibration, block_size)
+        self._workers = workers
+        self._executor_lock = threading.Lock()
+        self._executor = self._new_executor()
+        self._thread = threading.Thread(target=self._capture_loop, name='capture', daemon=True)
+
+    def _new_executor(self) -> ProcessPoolExecutor:
+        return ProcessPoolExecutor(max_workers=self._workers, initializer=_init_decode_worker,
+                                   initargs=self._executor_args)
+
+    def _restart_executor(self, broken: ProcessPoolExecutor) -> None:
+        """进程池已损坏时换成新的进程池（截图线程和主线程都可能发现损坏，只重建一次）"""
+        with self._executor_lock:
+            if self._executor is not broken:
+                return
+            broken.shutdown(wait=False, cancel_futures=True)
+            self._executor = self._new_executor()
+            self.restarts += 1
+
+    def _submit(self, timestamp: float, image: np.ndarray) -> Tuple[Future, ProcessPoolExecutor]:
+        """把截图提交给当前进程池，进程池已损坏时重建后再提交"""
+        executor = self._executor
+        try:
+            return executor.submit(decode_capture_job, timestamp, image, self.keep_symbols), executor
+        except BrokenProcessPool:
+            self._restart_executor(executor)
+            executor = self._executor
+            return executor.submit(decode_capture_job, timestamp, image, self.keep_symbols), executor
+
+    def start(self) -> 'CapturePipeline':
+        self._thread.start()
+        return self
+
+    def _capture_loop(self) -> None:
+        try:
+            detector = self.change_detector
+            last_capture = 0.0
+            with self.capture_factory() as capture:
+                while not self._stop.is_set():
+                    # 只有截图线程向队列投递，未满时随后的put不会阻塞
+                    if self._pending.full():
+                        if detector is None:
+                            self.dropped += 1
+                            self._stop.wait(self.interval)
+                        else:
+                            # 不记录已截图，空出位置后检测到的换帧仍会触发截图
+                            self._stop.wait(detector.poll_interval)
+                        continue
+
+                    if detector is not None:
+                        # 画面未换帧（或新帧尚未绘制完成）时只做廉价的探测
+                        changed = detector.poll(capture)
+                        if not changed and time.time() - last_capture < self.interval:
+                            self._stop.wait(detector.poll_interval)
+                            continue
+
+                    frame = capture.grab()
+                    last_capture = frame.timestamp
+                    future, executor = self._submit(frame.timestamp, frame.image)
+                    self._pending.put(_PendingJob(frame.timestamp, future, executor,
+                                                  frame.image if self.keep_images else None))
+                    if detector is None:
+                        self._stop.wait(self.interval)
+                    else:
+                        # 截图已投递给解码后才记录此时的内容指纹
+                        detector.mark_captured()
+                        if changed:
+                            self.changes += 1
+                        else:
+                            self.timeouts += 1
+        except BaseException as e:
+            self._error = e
+            self._stop.set()
+
+    def results(self) -> Iterator[Tuple[DecodeResult, Optional[np.ndarray]]]:
+        """按截图顺序逐个返回(解码结果, 截图)，截图仅在keep_images时保留"""
+        while True:
+            try:
+                job = self._pending.get(timeout=0.1)
+            except queue.Empty:
+                if self._stop.is_set():
+                    if self._error is not None:
+                        raise RuntimeError(f"截图线程异常退出: {self._error}") from self._error
+                    return
+                continue
+            try:
+                result = job.future.result()
+            except BrokenProcessPool as e:
+                self._restart_executor(job.executor)
+                result = DecodeResult(job.timestamp, None, 0, None, None, None, f"解码进程异常退出: {e}")
+            yield result, job.image
+
+    def close(self) -> None:
+        self._stop.set()
+        self._thread.join()
+        self._executor.shutdown(wait=True, cancel_futures=True)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+"""
+基于查找表的像素颜色分类器
+将RGB各通道量化为34级（8个值一级，另在白色/黑色阈值处切开，共39304个条目），
+预先为每个量化颜色计算出对应符号，分类整帧图像时只需一次查表
+"""
+
+import numpy as np
+from typing import Dict, Optional, Sequence, Tuple
+
+# 白色/黑色判定阈值（与原有规则一致：各通道都大于WHITE_THRESHOLD为白色，都小于BLACK_THRESHOLD为黑色）
+WHITE_THRESHOLD = 180
+BLACK_THRESHOLD = 100
+WHITE_SYMBOL = 3
+BLACK_SYMBOL = 4
+
+# 每通道量化区间的下界：8的倍数，再加上两个阈值处的切分点，使每个区间整体落在阈值的同一侧
+LEVEL_BOUNDS = np.union1d(np.arange(0, 256, 8), [BLACK_THRESHOLD, WHITE_THRESHOLD + 1]).astype(np.int32)
+LEVELS = LEVEL_BOUNDS.size
+LUT_SIZE = LEVELS ** 3
+# 通道值到量化级别的映射表
+CHANNEL_LEVELS = (np.searchsorted(LEVEL_BOUNDS, np.arange(256), side='right') - 1).astype(np.uint16)
+
+def _quantized_bounds() -> Tuple[np.ndarray, np.ndarray]:
+    """每个量化颜色区间各通道的最小值和最大值（含），按查找表索引排列"""
+    lows = LEVEL_BOUNDS
+    highs = np.append(LEVEL_BOUNDS[1:], 256) - 1
+
+    def expand(levels: np.ndarray) -> np.ndarray:
+        r, g, b = np.meshgrid(levels, levels, levels, indexing='ij')
+        return np.stack([r.ravel(), g.ravel(), b.ravel()], axis=1)
+
+    return expand(lows), expand(highs)
+
+def _quantized_centers() -> np.ndarray:
+    """每个量化颜色区间的中心值"""
+    lows, highs = _quantized_bounds()
+    return (lows + highs) / 2
+
+def build_palette_lut(palette: Sequence[Tuple[int, int, int]]) -> np.ndarray:
+    """高密度调色板的查找表：只做最近颜色匹配，符号即调色板下标（黑色也是数据颜色）"""
+    centers = _quantized_centers()
+    colors = np.array(palette, dtype=np.float64)
+    distances = ((centers[:, np.newaxis, :] - colors[np.newaxis, :, :]) ** 2).sum(axis=2)
+    return np.argmin(distances, axis=1).astype(np.uint8)
+
+def build_color_lut(color_map: Dict[Tuple[int, int, int], str],
+                    white_threshold: int = WHITE_THRESHOLD,
+                    black_threshold: int = BLACK_THRESHOLD) -> np.ndarray:
+    """
+    为所有量化颜色预先计算符号，返回长度为LUT_SIZE的uint8查找表
+    白色/黑色规则按区间的实际上下界判定（默认阈值处区间已切开，与逐像素判定完全一致）；
+    其余区间按区间中心做最近颜色匹配
+    """
+    lows, highs = _quantized_bounds()
+    centers = (lows + highs) / 2
+
+    # 最近颜色匹配
+    colors = np.array(list(color_map.keys()), dtype=np.float64)
+    symbols = np.array([int(value) for value in color_map.values()], dtype=np.uint8)
+    distances = ((centers[:, np.newaxis, :] - colors[np.newaxis, :, :]) ** 2).sum(axis=2)
+    lut = symbols[np.argmin(distances, axis=1)]
+
+    # 应用白色/黑色规则
+    lut[np.all(lows > white_threshold, axis=1)] = WHITE_SYMBOL
+    lut[np.all(highs < black_threshold, axis=1)] = BLACK_SYMBOL
+    return lut
+
+# 红、绿通道的量化级别预先乘以各自的位权
+_RED_LEVELS = CHANNEL_LEVELS * np.uint16(LEVELS * LEVELS)
+_GREEN_LEVELS = CHANNEL_LEVELS * np.uint16(LEVELS)
+
+class ColorClassifier:
+    """持有查找表和索引缓冲区的分类器，每个会话构建一次后重复使用"""
+
+    def __init__(self, color_map: Dict[Tuple[int, int, int], str]):
+        self.lut = build_color_lut(color_map)
+        self._index = np.empty(0, dtype=np.uint16)
+        self._scratch = np.empty(0, dtype=np.uint16)
+
+    def _buffers(self, size: int):
+        """按需扩容并返回索引缓冲区"""
+        if self._index.size < size:
+            self._index = np.empty(size, dtype=np.uint16)
+            self._scratch = np.empty(size, dtype=np.uint16)
+        return self._index[:size], self._scratch[:size]
+
+    def quantize(self, pixels: np.ndarray, channels: Sequence[int] = (0, 1, 2)) -> np.ndarray:
+        """
+        将(..., C)像素数组量化为一维查找表索引（复用内部缓冲区，下次调用前有效）
+        channels给出R、G、B所在的通道下标，例如BGRA数据传入(2, 1, 0)
+        """
+        shape = pixels.shape[:-1]
+        size = pixels.size // pixels.shape[-1]
+        index, scratch = self._buffers(size)
+        red, green, blue = (pixels[..., c] for c in channels)
+
+        # 直接在通道视图上查表累加各通道的量化级别得到查找表索引，不复制像素
+        index_view = index.reshape(shape)
+        scratch_view = scratch.reshape(shape)
+        np.take(_RED_LEVELS, red, out=index_view)
+        np.take(_GREEN_LEVELS, green, out=scratch_view)
+        index += scratch
+        np.take(CHANNEL_LEVELS, blue, out=scratch_view)
+        index += scratch
+        return index
+
+    def classify(self, pixels: np.ndarray, channels: Sequence[int] = (0, 1, 2),
+                 out: Optional[np.ndarray] = None) -> np.ndarray:
+        """将(..., C)像素数组分类为一维uint8符号数组"""
+        index = self.quantize(pixels, channels)
+        if out is None:
+            out = np.empty(index.size, dtype=np.uint8)
+        return np.take(self.lut, index, out=out)
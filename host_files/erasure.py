@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+"""
+跨帧纠删编码（解码端，与虚拟机端erasure.py的柯西矩阵一致）
+同组N个数据帧与K个校验帧中截到任意N帧，即可通过求逆GF(2^8)上的N×N矩阵恢复缺失的数据帧
+"""
+
+import struct
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from reed_solomon import GF_EXP, GF_LOG, GF_MUL
+
+# 校验帧负载前缀：组内第一个数据帧编号、组内数据帧数、校验帧序号、组内校验帧数，之后是组内各数据帧的负载长度
+PARITY_PREFIX_STRUCT = struct.Struct('<IHHH')
+PARITY_LENGTH_STRUCT = struct.Struct('<I')
+
+class ErasureError(ValueError):
+    """校验帧负载格式错误或分片不足"""
+
+class ParityShard(NamedTuple):
+    """一个校验帧的内容"""
+    first_frame: int
+    data_count: int
+    index: int
+    parity_count: int
+    lengths: Tuple[int, ...]
+    shard: bytes
+
+def parse_parity_payload(payload: bytes) -> ParityShard:
+    """解析校验帧负载"""
+    if len(payload) < PARITY_PREFIX_STRUCT.size:
+        raise ErasureError("校验帧负载过短")
+    first_frame, data_count, index, parity_count = PARITY_PREFIX_STRUCT.unpack_from(payload)
+    lengths_end = PARITY_PREFIX_STRUCT.size + PARITY_LENGTH_STRUCT.size * data_count
+    if len(payload) < lengths_end or index >= parity_count:
+        raise ErasureError("校验帧负载前缀无效")
+    lengths = struct.unpack_from(f'<{data_count}I', payload, PARITY_PREFIX_STRUCT.size)
+    return ParityShard(first_frame, data_count, index, parity_count, lengths, payload[lengths_end:])
+
+def cauchy_matrix(parity_count: int, data_count: int) -> np.ndarray:
+    """(K, N)柯西矩阵 C[j][i] = 1 / (j ^ (K + i))"""
+    rows = np.arange(parity_count)[:, np.newaxis]
+    columns = parity_count + np.arange(data_count)[np.newaxis, :]
+    return GF_EXP[255 - GF_LOG[rows ^ columns]].astype(np.uint8)
+
+def _invert_matrix(matrix: np.ndarray) -> np.ndarray:
+    """GF(2^8)上的高斯-约当消元求逆"""
+    size = matrix.shape[0]
+    work = np.concatenate([matrix, np.eye(size, dtype=np.uint8)], axis=1)
+    for column in range(size):
+        pivot = column + int(np.flatnonzero(work[column:, column])[0])
+        work[[column, pivot]] = work[[pivot, column]]
+        work[column] = GF_MUL[GF_EXP[255 - GF_LOG[work[column, column]]]][work[column]]
+        for row in range(size):
+            if row != column and work[row, column]:
+                work[row] ^= GF_MUL[work[row, column]][work[column]]
+    return work[:, size:]
+
+def reconstruct(data_count: int, parity_count: int, shards: Dict[int, np.ndarray]) -> Dict[int, np.ndarray]:
+    """
+    shards为{分片序号: uint8数组}，序号0..N-1为数据分片，N+j为第j个校验分片，所有分片等长
+    返回缺失的数据分片{序号: uint8数组}；可用分片少于N个时抛出ErasureError
+    """
+    missing = [i for i in range(data_count) if i not in shards]
+    if not missing:
+        return {}
+    available = sorted(shards)[:data_count]
+    if len(available) < data_count:
+        raise ErasureError(f"分片不足：需要 {data_count} 个，只有 {len(available)} 个")
+
+    # 生成矩阵 [I; C] 中与已有分片对应的行
+    cauchy = cauchy_matrix(parity_count, data_count)
+    rows = np.zeros((data_count, data_count), dtype=np.uint8)
+    for r, index in enumerate(available):
+        if index < data_count:
+            rows[r, index] = 1
+        else:
+            rows[r] = cauchy[index - data_count]
+    decode = _invert_matrix(rows)
+
+    recovered = {}
+    for i in missing:
+        data = np.zeros_like(shards[available[0]])
+        for r, index in enumerate(available):
+            if decode[i, r]:
+                data ^= GF_MUL[decode[i, r]][shards[index]]
+        recovered[i] = data
+    return recovered
+
+class ParityStore:
+    """按组保存截到的校验帧，组内缺失的数据帧不多于已有校验帧时恢复它们"""
+
+    def __init__(self):
+        self.groups: Dict[int, Dict[int, ParityShard]] = {}
+
+    def add(self, shard: ParityShard) -> None:
+        self.groups.setdefault(shard.first_frame, {})[shard.index] = shard
+
+    def group_of(self, frame_number: int) -> Optional[int]:
+        """返回包含该数据帧、且已有校验帧的组的第一个数据帧编号"""
+        for first_frame, parities in self.groups.items():
+            data_count = next(iter(parities.values())).data_count
+            if first_frame <= frame_number < first_frame + data_count:
+                return first_frame
+        return None
+
+    def recover(self, first_frame: int, missing: List[int],
+                load_data: Callable[[int], bytes]) -> Dict[int, bytes]:
+        """
+        用已有校验帧恢复组内缺失的数据帧，load_data读取已收到的数据帧负载
+        返回{帧编号: 负载}，校验帧不足时返回空字典
+        """
+        parities = self.groups.get(first_frame)
+        if not parities or not missing or len(parities) < len(missing):
+            return {}
+        sample = next(iter(parities.values()))
+        data_count, parity_count, lengths = sample.data_count, sample.parity_count, sample.lengths
+        shard_size = len(sample.shard)
+
+        shards = {}
+        for i in range(data_count):
+            if first_frame + i not in missing:
+                data = np.zeros(shard_size, dtype=np.uint8)
+                payload = load_data(first_frame + i)
+                data[:len(payload)] = np.frombuffer(payload, dtype=np.uint8)
+                shards[i] = data
+        for index, parity in parities.items():
+            shards[data_count + index] = np.frombuffer(parity.shard, dtype=np.uint8)
+
+        recovered = reconstruct(data_count, parity_count, shards)
+        return {first_frame + i: data[:lengths[i]].tobytes() for i, data in recovered.items()}
+
+    def discard(self, first_frame: int) -> None:
+        """组内数据帧全部收到后释放校验帧"""
+        self.groups.pop(first_frame, None)
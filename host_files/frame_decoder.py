@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+"""
+常驻内存的帧解码器
+宿主机主循环导入一次并重复调用，避免每次截图都启动Python子进程、重新导入numpy/PIL、重建查找表
+"""
+
+import numpy as np
+from typing import Optional, Sequence, Tuple
+
+from bmp_to_tar import image_to_symbols, decode_symbols, FrameHeader
+
+# 未校准时截图中有效数据区域的左上角偏移
+CROP_LEFT = 5
+CROP_TOP = 5
+
+# RGB数据中R、G、B所在的通道下标
+RGB_CHANNELS = (0, 1, 2)
+
+def _cell_samples(pitch: float, count: int) -> Tuple[np.ndarray, int]:
+    """每个单元中间一半区域内等距的采样坐标（按单元依次排列）及每个单元的采样数，pitch为单元在截图中的边长"""
+    per_cell = max(1, int(pitch) // 2)
+    offsets = pitch * (0.25 + 0.5 * (np.arange(per_cell) + 0.5) / per_cell)
+    return (np.arange(count)[:, np.newaxis] * pitch + offsets).astype(np.intp).ravel(), per_cell
+
+def sample_cells(image: np.ndarray, width: int, height: int, cell: int = 1) -> np.ndarray:
+    """
+    将width x height帧的数据区域截图（可能被缩放）还原为(height // cell, width // cell)的单元网格：
+    在每个单元中间一半区域内等距取样后按单元求平均，单元边缘的模糊像素不参与分类
+    截图与帧同尺寸且单元为1像素时原样返回
+    """
+    capture_height, capture_width = image.shape[:2]
+    if cell == 1 and (capture_width, capture_height) == (width, height):
+        return image
+    grid_width, grid_height = width // cell, height // cell
+    ys, per_y = _cell_samples(capture_height * cell / height, grid_height)
+    xs, per_x = _cell_samples(capture_width * cell / width, grid_width)
+    samples = image[np.ix_(ys, xs)]
+    if per_y == per_x == 1:
+        return samples
+    cells = samples.reshape(grid_height, per_y, grid_width, per_x, image.shape[-1])
+    return (cells.sum(axis=(1, 3), dtype=np.uint32) // (per_y * per_x)).astype(np.uint8)
+
+class FrameDecoder:
+    """将数据区域截图解码为帧头和TAR分片，复用符号缓冲区和颜色查找表"""
+
+    def __init__(self, width: int, height: int):
+        self.width = width
+        self.height = height
+        self._symbols = np.empty(width * height, dtype=np.uint8)
+
+    def classify(self, image_array: np.ndarray, channels: Sequence[int] = RGB_CHANNELS) -> np.ndarray:
+        """将数据区域像素分类为新的符号数组（不复用缓冲区，可保留用于多次截图融合）"""
+        return image_to_symbols(image_array, channels)
+
+    def decode_frame(self, image_array: np.ndarray,
+                     channels: Sequence[int] = RGB_CHANNELS) -> Tuple[Optional[FrameHeader], bytes]:
+        """
+        将数据区域像素解码为(帧头, TAR分片字节)，channels为R、G、B所在的通道下标
+        旧格式帧的帧头为None；帧头或负载CRC不匹配时抛出FrameError
+        """
+        symbols = image_to_symbols(image_array, channels, out=self._symbols)
+        return decode_symbols(symbols)
@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+"""
+二进制索引（与虚拟机端frame_index.py的格式一致）
+定长索引头（帧数、总字节数、编码参数、分块大小、清单根）+ 每帧的长度和分块叶子摘要（见merkle.py）+ CRC32，
+帧编号即顺序（从1开始），没有帧数上限；虚拟机把索引拆分为若干索引帧（帧头带FRAME_FLAG_INDEX，
+帧编号、总帧数为分段编号、分段总数），宿主机按帧头收齐所有分段后拼接解析，耗时与索引大小成正比
+"""
+
+import os
+import struct
+import zlib
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from bmp_to_tar import FrameHeader
+from merkle import BLOCK_SIZE, DIGEST_SIZE, leaf_count, merkle_root
+
+INDEX_MAGIC = b'QI'
+INDEX_VERSION = 2
+INDEX_HEADER_STRUCT = struct.Struct('<2sBBIQHHBBBHBI%ds' % DIGEST_SIZE)
+ENTRY_LENGTH_STRUCT = struct.Struct('<I')
+INDEX_CRC_STRUCT = struct.Struct('<I')
+
+class IndexFormatError(ValueError):
+    """索引格式错误、CRC或清单根不匹配"""
+
+class IndexHeader(NamedTuple):
+    """索引头；编码参数未知时为0"""
+    frame_count: int
+    total_size: int
+    width: int = 0
+    height: int = 0
+    fec_nsym: int = 0
+    symbol_bits: int = 0
+    cell: int = 0
+    parity_group: int = 0
+    parity_count: int = 0
+    block_size: int = BLOCK_SIZE
+    root: bytes = bytes(DIGEST_SIZE)
+
+class FrameDigest(NamedTuple):
+    """一帧（TAR分片）的长度和按索引头中block_size分块的叶子摘要"""
+    length: int
+    leaves: Tuple[bytes, ...]
+
+    @property
+    def root(self) -> bytes:
+        return merkle_root(self.leaves)
+
+def is_binary_index(data: bytes) -> bool:
+    return data[:2] == INDEX_MAGIC
+
+def parse_index(data: bytes) -> Tuple[IndexHeader, List[FrameDigest]]:
+    """解析二进制索引并校验CRC和清单根，返回(索引头, 按帧编号顺序的各帧摘要)"""
+    if len(data) < INDEX_HEADER_STRUCT.size + INDEX_CRC_STRUCT.size or not is_binary_index(data):
+        raise IndexFormatError("不是二进制索引")
+    magic, version, digest_size, *fields = INDEX_HEADER_STRUCT.unpack_from(data)
+    if version != INDEX_VERSION or digest_size != DIGEST_SIZE:
+        raise IndexFormatError(f"不支持的索引版本 {version}")
+    header = IndexHeader(*fields)
+    end = len(data) - INDEX_CRC_STRUCT.size
+    if zlib.crc32(data[:end]) != INDEX_CRC_STRUCT.unpack_from(data, end)[0]:
+        raise IndexFormatError("索引CRC不匹配")
+    if header.block_size <= 0:
+        raise IndexFormatError(f"无效的分块大小 {header.block_size}")
+    entries = []
+    offset = INDEX_HEADER_STRUCT.size
+    for _ in range(header.frame_count):
+        if offset + ENTRY_LENGTH_STRUCT.size > end:
+            raise IndexFormatError(f"索引在第 {len(entries) + 1} 帧处截断")
+        length, = ENTRY_LENGTH_STRUCT.unpack_from(data, offset)
+        offset += ENTRY_LENGTH_STRUCT.size
+        leaves_end = offset + leaf_count(length, header.block_size) * DIGEST_SIZE
+        if leaves_end > end:
+            raise IndexFormatError(f"索引在第 {len(entries) + 1} 帧处截断")
+        entries.append(FrameDigest(length, tuple(data[i:i + DIGEST_SIZE] for i in range(offset, leaves_end, DIGEST_SIZE))))
+        offset = leaves_end
+    if offset != end:
+        raise IndexFormatError(f"索引长度 {len(data)} 与帧数 {header.frame_count} 不符")
+    if merkle_root([entry.root for entry in entries]) != header.root:
+        raise IndexFormatError("清单根不匹配")
+    return header, entries
+
+def index_entries(entries: List[FrameDigest]) -> List[Tuple[str, FrameDigest]]:
+    """(文件编号, 帧摘要)列表，文件编号至少三位，与虚拟机端分片文件名example.tar.NNN一致"""
+    return [(f"{frame_number:03d}", entry) for frame_number, entry in enumerate(entries, 1)]
+
+def read_index(index_path: str) -> Tuple[Optional[IndexHeader], List[Tuple[str, FrameDigest]]]:
+    """读取并校验索引文件，返回(索引头, (文件编号, 帧摘要)列表)；文件不存在或格式错误时返回(None, [])"""
+    try:
+        with open(index_path, 'rb') as f:
+            header, entries = parse_index(f.read())
+    except (OSError, IndexFormatError):
+        return None, []
+    return header, index_entries(entries)
+
+def save_index(index_data: bytes, index_path: str) -> None:
+    """先写临时文件再原子替换，虚拟机看到的索引文件总是完整的"""
+    temp_path = index_path + '.tmp'
+    with open(temp_path, 'wb') as f:
+        f.write(index_data)
+    os.replace(temp_path, index_path)
+
+class IndexAssembler:
+    """收集索引帧的各个分段（可以乱序截到、重复截到），收齐后拼接为完整的二进制索引"""
+
+    def __init__(self):
+        self.part_count: Optional[int] = None
+        self.parts: Dict[int, bytes] = {}
+
+    def add(self, header: FrameHeader, payload: bytes) -> bool:
+        """加入一个索引帧的负载，返回是否是新的分段；分段总数与之前不一致时（换了一次会话）重新收集"""
+        if self.part_count != header.total_frames:
+            self.part_count = header.total_frames
+            self.parts = {}
+        if header.frame_number in self.parts or not 1 <= header.frame_number <= header.total_frames:
+            return False
+        self.parts[header.frame_number] = payload
+        return True
+
+    @property
+    def complete(self) -> bool:
+        return self.part_count is not None and len(self.parts) == self.part_count
+
+    def assemble(self) -> Tuple[bytes, IndexHeader, List[FrameDigest]]:
+        """拼接所有分段并解析，返回(索引字节, 索引头, 各帧摘要)；解析失败时清空已收集的分段并抛出IndexFormatError"""
+        index_data = b''.join(self.parts[part] for part in range(1, self.part_count + 1))
+        try:
+            header, entries = parse_index(index_data)
+        except IndexFormatError:
+            self.parts = {}
+            raise
+        return index_data, header, entries
@@ -2,47 +2,38 @@
 宿主机端自动截图脚本（带重试机制）
 """
 
-import mss
 import time
 import os
-import hashlib
-import subprocess
 import sys
 import signal
 import atexit
-import re
+import traceback
 from PIL import Image
+import numpy as np
 import argparse
-from typing import List, Tuple
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Sequence, Tuple
+from frame_decoder import FrameDecoder, CROP_LEFT, CROP_TOP, sample_cells
+from bmp_to_tar import FRAME_FLAG_INDEX, FRAME_FLAG_PARITY, FrameError, decode_symbols_fec, read_frame_header
+from symbol_fusion import MIN_FUSION_CAPTURES, SymbolFusion
+from screen_capture import ScreenCapture, BGRA_CHANNELS
+from capture_pipeline import CapturePipeline
+from change_detector import ChangeDetector
+from reassembler import Reassembler
+from ack_bitmap import AckBitmap
+from erasure import ErasureError, ParityStore, parse_parity_payload
+from calibration import Calibration, apply_calibration, detect_calibration, palette_margin, save_calibration
+from frame_index import FrameDigest, IndexAssembler, IndexFormatError, read_index, save_index
+from merkle import bad_blocks, block_hashes, merkle_root
 
-def capture_screen(monitor_id=2, output_path="screenshot.bmp"):
-    """截取指定屏幕的截图"""
-    with mss.mss() as sct:
-        # 获取所有显示器信息
-        monitors = sct.monitors
-        
-        # 检查输入的显示器编号是否有效（编号从1开始）
-        if monitor_id < 1 or monitor_id >= len(monitors):
-            raise ValueError(f"无效的屏幕编号。可用屏幕范围: 1 ~ {len(monitors)-1}")
-        
-        # 选择指定编号的显示器（monitors[0]是合并所有屏幕的区域）
-        target_monitor = monitors[monitor_id]
-      
-        # 截取屏幕
-        screenshot = sct.grab(target_monitor)
-        
-        # 转换为PIL图像并保存为BMP
-        img = Image.frombytes("RGB", screenshot.size, screenshot.rgb)
-        img.save(output_path, "BMP")
-        print(f"截图已保存至: {output_path}")
+# 同时保留融合历史的帧数上限
+MAX_FUSION_FRAMES = 8
 
-def calculate_md5(file_path: str) -> str:
-    """计算文件的MD5值"""
-    hash_md5 = hashlib.md5()
-    with open(file_path, "rb") as f:
-        for chunk in iter(lambda: f.read(4096), b""):
-            hash_md5.update(chunk)
-    return hash_md5.hexdigest()
+def save_screenshot(frame: np.ndarray, output_path: str) -> None:
+    """调试用：将BGRA截图保存为BMP"""
+    img = Image.fromarray(np.ascontiguousarray(frame[..., 2::-1]), 'RGB')
+    img.save(output_path, "BMP")
+    print(f"截图已保存至: {output_path}")
 
 def read_progress_file(progress_path: str) -> set[str]:
     """读取进度文件，返回已处理的文件编号集合"""
@@ -59,103 +50,212 @@ def read_progress_file(progress_path: str) -> set[str]:
             print(f"进度文件读取失败: {e}")
     return processed_files
 
-def read_index_file(index_path: str) -> List[Tuple[str, str]]:
-    """读取index.txt文件，返回文件编号和MD5值的列表（宽松模式）"""
-    files = []
-    with open(index_path, 'r', encoding='utf-8') as f:
-        for line in f:
-            line = line.strip()
-            if line:
-                parts = line.split(',')
-                if len(parts) == 2:
-                    file_number, md5_value = parts
-                    files.append((file_number, md5_value))
-    return files
+def write_progress_file(progress_path: str, processed_files: set[str]) -> None:
+    """按文件编号顺序重写进度文件（断点续传时去掉校验失败的分片）"""
+    temp_path = progress_path + '.tmp'
+    with open(temp_path, 'w') as f:
+        for file_number in sorted(processed_files, key=int):
+            f.write(f"{file_number}\n")
+    os.replace(temp_path, progress_path)
 
-def read_index_file_strict(index_path: str) -> List[Tuple[str, str]]:
-    """严格读取并校验index.txt，全部行需满足: 三位编号,32位MD5。返回有效列表，若任何行不合法或为空则返回空列表。"""
-    if not os.path.exists(index_path):
-        return []
+def decode_symbols_to_tar(symbols: np.ndarray, file_number: str) -> Tuple[bool, Optional[bytes]]:
+    """
+    将一次截图（或融合结果）的符号数组解码为TAR分片字节
+    返回(截图是否可能属于期望的帧, 解码结果)；帧头损坏、CRC不匹配时解码结果为None，无需再计算摘要
+    """
     try:
-        with open(index_path, 'r', encoding='utf-8') as f:
-            lines = [ln.strip() for ln in f.readlines() if ln.strip()]
-    except Exception:
-        return []
-    if not lines:
-        return []
-    pattern = re.compile(r'^(\d{3}),([a-fA-F0-9]{32})$')
-    results: List[Tuple[str, str]] = []
-    for ln in lines:
-        m = pattern.match(ln)
-        if not m:
-            # 任意一行不合法，视为无效
-            return []
-        results.append((m.group(1), m.group(2).lower()))
-    # 合法且至少一条
-    return results
+        header = read_frame_header(symbols)
+    except FrameError as e:
+        print(f"帧头无效（可能截到了切换中的画面）: {e}")
+        return True, None
+    
+    if header is not None and header.frame_number != int(file_number):
+        print(f"截到的是第 {header.frame_number} 帧，期望第 {int(file_number)} 帧（画面尚未切换）")
+        return False, None
+    
+    try:
+        _, binary_data, corrected = decode_symbols_fec(symbols)
+    except FrameError as e:
+        print(f"帧无效: {e}")
+        return True, None
+    if corrected:
+        print(f"前向纠错修正了第 {file_number} 帧中的 {corrected} 个码字")
+    return True, binary_data
+
+def report_bad_blocks(bad: List[int], total: int) -> None:
+    """输出损坏的块下标（最多16个）"""
+    print(f"共 {total} 块，损坏的块: {bad[:16]}{' ...' if len(bad) > 16 else ''}")
 
-def convert_bmp_to_tar(bmp_path: str, tar_path: str, bmp_width: str, bmp_height: str) -> bool:
-    """将BMP图片转换为TAR文件"""
+def verify_volume(binary_data: Optional[bytes], expected: FrameDigest, block_size: int,
+                  leaves: Optional[List[bytes]] = None) -> bool:
+    """
+    在内存中按索引记录的分块叶子摘要验证TAR分片，不一致时报告损坏的块
+    leaves为解码进程中已算好的叶子摘要，未提供时在此计算；负载CRC不匹配时binary_data为None，
+    leaves为尽力提取的负载的叶子摘要，只报告损坏的块
+    """
+    if binary_data is None:
+        if leaves is not None:
+            report_bad_blocks(bad_blocks(leaves, expected.leaves), len(expected.leaves))
+        return False
+    if leaves is None:
+        leaves = block_hashes(binary_data, block_size)
+    print(f"期望摘要: {expected.root.hex()}")
+    print(f"实际摘要: {merkle_root(leaves).hex()}")
+    if len(binary_data) != expected.length or list(leaves) != list(expected.leaves):
+        print(f"摘要不匹配：长度 {len(binary_data)}/{expected.length}")
+        report_bad_blocks(bad_blocks(leaves, expected.leaves), len(expected.leaves))
+        return False
+    return True
+
+def verify_local_volume(volume_path: str, expected: FrameDigest, block_size: int) -> Tuple[List[int], Optional[bytes]]:
+    """按索引校验一个已保存到本地的TAR分片，返回(损坏的块下标, 分片字节)；文件无法读取时全部块都算损坏"""
     try:
-        subprocess.run([
-            sys.executable, 'bmp_to_tar.py',
-            '--input', bmp_path,
-            '--output', tar_path,
-            '--width', str(bmp_width),
-            '--height', str(bmp_height)
-        ], check=True)
-        return True
-    except subprocess.CalledProcessError as e:
-        print(f"转换失败: {e}")
+        with open(volume_path, 'rb') as f:
+            binary_data = f.read()
+    except OSError:
+        return list(range(len(expected.leaves))), None
+    return bad_blocks(block_hashes(binary_data, block_size), expected.leaves), binary_data
+
+def resume_local_volumes(reassembler: Reassembler, payload_folder: str, volumes: Sequence[Tuple[str, FrameDigest]],
+                         block_size: int, workers: int) -> List[str]:
+    """
+    断点续传：在线程池中并行校验进度文件中记录的本地TAR分片，并按帧编号顺序把通过校验的字节直接交给重组器，
+    每个分片只读取一次；压缩包中已重组的部分只校验。返回缺失或已损坏的文件编号，并逐个报告损坏的块
+    """
+    appended = set(reassembler.resumable(int(file_number) for file_number, _ in volumes))
+    
+    def check(volume: Tuple[str, FrameDigest]) -> Tuple[List[int], Optional[bytes]]:
+        file_number, expected = volume
+        bad, binary_data = verify_local_volume(os.path.join(payload_folder, f"example.tar.{file_number}"),
+                                               expected, block_size)
+        # 已在压缩包中的分片不再需要其字节，不必留在内存中
+        return bad, None if int(file_number) in appended else binary_data
+    
+    damaged = []
+    started = False
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        # 结果按帧编号顺序返回，压缩包中已有的前缀排在最前面：前缀全部校验完后再开始重组，损坏的分片不计入前缀
+        for (file_number, expected), (bad, binary_data) in zip(volumes, executor.map(check, volumes)):
+            frame_number = int(file_number)
+            if bad:
+                damaged.append(file_number)
+                print(f"本地分片 {file_number} 校验失败，损坏的块: {bad[:16]}{' ...' if len(bad) > 16 else ''}"
+                      f"（共 {len(expected.leaves)} 块），将重新接收")
+                continue
+            if frame_number in appended:
+                continue
+            if not started:
+                reassembler.start(appended.difference(int(n) for n in damaged))
+                started = True
+            reassembler.add(frame_number, binary_data)
+    if not started:
+        reassembler.start(appended.difference(int(n) for n in damaged))
+    return damaged
+
+def verify_fused(fusion: SymbolFusion, symbols: np.ndarray, file_number: str, expected: FrameDigest,
+                 block_size: int) -> Optional[bytes]:
+    """
+    将一次校验失败的截图符号数组加入融合历史，与同一帧最近几次截图按像素投票融合后再验证
+    返回通过摘要验证的TAR分片字节，仍失败时返回None
+    """
+    fusion.add(symbols)
+    fused = fusion.fuse()
+    if fused is None:
+        return None
+    print(f"融合最近 {len(fusion.history)} 次截图后重新验证...")
+    _, binary_data = decode_symbols_to_tar(fused, file_number)
+    if verify_volume(binary_data, expected, block_size):
+        return binary_data
+    return None
+
+def capture_index_frame(decoder: FrameDecoder, frame: np.ndarray, assembler: IndexAssembler, index_path: str) -> bool:
+    """
+    解码一次索引截图：二进制索引的分段交给assembler，收齐所有分段后原子地写入索引文件
+    返回是否已写出完整的索引文件
+    """
+    try:
+        header, payload = decoder.decode_frame(frame, BGRA_CHANNELS)
+    except FrameError as e:
+        print(f"索引帧无效: {e}")
+        return False
+    if header is None:
+        print("截到的帧没有帧头，不是索引帧")
+        return False
+    if not header.flags & FRAME_FLAG_INDEX:
+        print(f"截到的是第 {header.frame_number} 帧，不是索引帧")
+        return False
+    if assembler.add(header, payload):
+        print(f"截到索引分段 {header.frame_number}/{header.total_frames}")
+    if not assembler.complete:
         return False
+    try:
+        index_data, index_header, _ = assembler.assemble()
+    except IndexFormatError as e:
+        print(f"索引无效，重新收集所有分段: {e}")
+        return False
+    save_index(index_data, index_path)
+    print(f"索引共 {index_header.frame_count} 帧，压缩包 {index_header.total_size} 字节"
+          f"（帧尺寸 {index_header.width}x{index_header.height}，每像素 {index_header.symbol_bits} 位，"
+          f"单元 {index_header.cell}，每 {index_header.parity_group} 帧 {index_header.parity_count} 个校验帧）")
+    print(f"清单根: {index_header.root.hex()}（分块 {index_header.block_size} 字节）")
+    return True
 
-def convert_bmp_to_txt(bmp_path: str, txt_path: str, bmp_width: str, bmp_height: str) -> bool:
-    """将BMP图片转换为TXT文件"""
+def capture_calibration(monitor_id: int, timeout: float, interval: float) -> Optional[Calibration]:
+    """截取整个显示器直到识别出校准帧，超时返回None"""
+    deadline = time.time() + timeout
+    with ScreenCapture(monitor_id) as capture:
+        while True:
+            calibration = detect_calibration(capture.grab().image)
+            if calibration is not None:
+                return calibration
+            if time.time() >= deadline:
+                return None
+            time.sleep(interval)
+
+def save_tar_data(binary_data: bytes, final_tar_path: str) -> bool:
+    """先写临时文件再原子替换，避免虚拟机读到未写完的文件"""
+    temp_tar_path = os.path.join(os.path.dirname(final_tar_path), "temp_" + os.path.basename(final_tar_path))
     try:
-        subprocess.run([
-            sys.executable, 'bmp_to_txt.py',
-            '--input', bmp_path,
-            '--output', txt_path,
-            '--width', str(bmp_width),
-            '--height', str(bmp_height)
-        ], check=True)
+        with open(temp_tar_path, 'wb') as f:
+            f.write(binary_data)
+        os.replace(temp_tar_path, final_tar_path)
+        print(f"文件验证成功，已保存到: {final_tar_path}")
         return True
-    except subprocess.CalledProcessError as e:
-        print(f"转换失败: {e}")
+    except Exception as e:
+        print(f"保存文件失败: {e}")
         return False
 
-def verify_and_save_tar_file(temp_tar_path: str, final_tar_path: str, expected_md5: str) -> bool:
+def recover_with_parity(parity_store: ParityStore, first_frame: int, remaining: Dict[int, Tuple[str, FrameDigest]],
+                        file_numbers: Dict[int, str], payload_folder: str, block_size: int) -> Dict[int, bytes]:
     """
-    验证TAR文件MD5值并保存（单次校验）
-    返回: True-验证成功, False-验证失败
+    用校验帧恢复一组中缺失的数据帧（已收到的数据帧从本地TAR分片读取）
+    返回通过摘要验证的{帧编号: TAR分片字节}；组内数据帧已全部收到时释放该组校验帧
     """
-    if not os.path.exists(temp_tar_path):
-        print(f"错误: 临时TAR文件不存在: {temp_tar_path}")
-        return False
+    parities = parity_store.groups.get(first_frame)
+    if not parities:
+        return {}
+    data_count = next(iter(parities.values())).data_count
+    missing = [n for n in range(first_frame, first_frame + data_count) if n in remaining]
+    if not missing:
+        parity_store.discard(first_frame)
+        return {}
     
-    # 验证MD5值
-    actual_md5 = calculate_md5(temp_tar_path)
-    print(f"期望MD5: {expected_md5}")
-    print(f"实际MD5: {actual_md5}")
+    def load_data(frame_number: int) -> bytes:
+        with open(os.path.join(payload_folder, f"example.tar.{file_numbers[frame_number]}"), 'rb') as f:
+            return f.read()
     
-    if actual_md5 == expected_md5:
-        # MD5匹配，移动到传输路径并重命名
-        try:
-            os.rename(temp_tar_path, final_tar_path)
-            print(f"文件验证成功，已保存到: {final_tar_path}")
-            return True
-        except Exception as e:
-            print(f"移动文件失败: {e}")
-            return False
-    else:
-        print("MD5值不匹配")
-        # 删除临时文件
-        try:
-            os.remove(temp_tar_path)
-            print(f"已删除临时文件: {temp_tar_path}")
-        except Exception as e:
-            print(f"删除临时文件失败: {e}")
-        return False
+    try:
+        recovered = parity_store.recover(first_frame, missing, load_data)
+    except (ErasureError, OSError, KeyError) as e:
+        print(f"校验帧恢复失败: {e}")
+        return {}
+    
+    verified = {}
+    for frame_number, binary_data in recovered.items():
+        print(f"由校验帧恢复第 {frame_number} 帧")
+        if verify_volume(binary_data, remaining[frame_number][1], block_size):
+            verified[frame_number] = binary_data
+    return verified
 
 def signal_handler(signum, frame):
     """信号处理器，确保程序退出时清理资源"""
@@ -175,31 +275,58 @@ def main():
     parser.add_argument('--bmp-height', type=int, default=1070, help='BMP file height pixels')
     parser.add_argument('--transfer-path', default='D:\\auto_transfer\\host_files\\transferPath', help='Transfer path for communication')
     parser.add_argument('--output-folder', default='D:\\auto_transfer\\host_files\\transferPath', help='Output folder for screenshots')
+    parser.add_argument('--save-screenshots', action='store_true', help='Also save every screenshot as BMP to the output folder (debugging)')
     parser.add_argument('--monitor-id', type=int, default=2, help='Monitor ID to capture')
-    parser.add_argument('--screenshot-interval', type=int, default=1, help='Screenshot interval in seconds')
-    parser.add_argument('--index-file', default='index.txt', help='Index file name')
-    parser.add_argument('--index-bmp', default='index.bmp', help='Index BMP file name')
-    parser.add_argument('--max-retries', type=int, default=3, help='(unused)Maximum retry attempts for MD5 verification')
+    parser.add_argument('--screenshot-interval', type=float, default=1, help='Screenshot interval in seconds (fractions allowed); with frame-change detection, the longest wait before re-capturing an unchanged frame')
+    parser.add_argument('--change-poll', type=float, default=0.005, help='Interval in seconds for polling a few rows of the data area for a frame change; a full capture starts only when a new, stable frame appears (0 = capture every --screenshot-interval)')
+    parser.add_argument('--stable-polls', type=int, default=2, help='Consecutive identical polls required before a changed frame is considered fully painted')
+    parser.add_argument('--decode-workers', type=int, default=2, help='Number of decode worker processes in the capture pipeline')
+    parser.add_argument('--pipeline-depth', type=int, default=4, help='Maximum screenshots waiting for decode; newer screenshots are dropped while the pipeline is full')
+    parser.add_argument('--legacy-frames', action='store_true', help='The VM shows legacy frames without a frame header (tar_to_bmp.py --legacy); a capture without a header is then taken as the first unfinished frame instead of being dropped')
+    parser.add_argument('--fusion-depth', type=int, default=3, help='Number of recent captures of the same frame to fuse by majority vote when decoding fails (values below %d disable fusion, since two captures always vote for the latest one)' % MIN_FUSION_CAPTURES)
+    parser.add_argument('--payload-folder', default='D:\\auto_transfer\\host_files\\received', help='Host-local folder for decoded tar volumes and the progress file')
+    parser.add_argument('--archive-file', default='files.tar.xz', help='Archive rebuilt in the payload folder by appending the verified volumes in frame order')
+    parser.add_argument('--extract-folder', default='D:\\auto_transfer\\host_files\\extracted', help='Folder the archive is extracted into while frames arrive')
+    parser.add_argument('--no-extract', action='store_true', help='Only rebuild the archive, do not extract it')
+    parser.add_argument('--ack-file', default='ack.bin', help='Bitmap of confirmed frame numbers written to the transfer path for the VM')
+    parser.add_argument('--cell', type=int, default=1, help='Symbol cell size in pixels (tar_to_bmp.py --cell); only used when no calibration frame is found, which records it')
+    parser.add_argument('--calibration-file', default='calibration.json', help='Calibration result written to the transfer path; the VM stops showing the calibration frame when it appears')
+    parser.add_argument('--calibration-timeout', type=float, default=30, help='Seconds to look for the calibration frame before falling back to the fixed crop offset and color rules (0 disables calibration)')
+    parser.add_argument('--index-file', default='index.bin', help='Binary index file written to the transfer path once all index frames are captured')
+    parser.add_argument('--index-bmp', default='index.bmp', help='Screenshot file name for index frames with --save-screenshots')
+    parser.add_argument('--hash-workers', type=int, default=os.cpu_count() or 1, help='Threads that verify the already received volumes against the index block digests when resuming')
+    parser.add_argument('--max-retries', type=int, default=3, help='(unused)Maximum retry attempts for index verification')
     
     args = parser.parse_args()
+    capture = None
+    reassembler = None
     
     try:
         # 确保输出文件夹存在
         os.makedirs(args.output_folder, exist_ok=True)
         os.makedirs(args.transfer_path, exist_ok=True)
+        os.makedirs(args.payload_folder, exist_ok=True)
         
-        # 进度文件路径
-        progress_path = os.path.join(args.transfer_path, args.progress_file)
+        # 进度文件与TAR分片一起保存在宿主机本地
+        progress_path = os.path.join(args.payload_folder, args.progress_file)
         
         # 读取已有进度
         processed_files = read_progress_file(progress_path)
-
+        
+        # 确认位图写在共享的传输路径中，启动时按已有进度重写，清除上一次传输遗留的位图
+        ack_bitmap = AckBitmap(os.path.join(args.transfer_path, args.ack_file),
+                               (int(file_number) for file_number in processed_files))
+        ack_bitmap.write()
+        
         print("=== 宿主机端自动截图脚本 ===")
         print(f"图片宽高: {args.bmp_width}x{args.bmp_height}")
         print(f"传输路径: {args.transfer_path}")
+        print(f"TAR分片保存路径: {args.payload_folder}")
         print(f"输出文件夹: {args.output_folder}")
         print(f"显示器ID: {args.monitor_id}")
         print(f"截图间隔: {args.screenshot_interval}秒")
+        if args.change_poll > 0:
+            print(f"帧切换检测: 每 {args.change_poll}秒 探测一次，连续 {args.stable_polls} 次不变后截图")
         print(f"已处理文件数: {len(processed_files)}")
         print(f"最大重试次数(未使用): {args.max_retries}")
         
@@ -207,88 +334,236 @@ def main():
         print("等待5秒后开始执行...")
         time.sleep(5)
         
-        # 步骤1: 循环截图index.bmp并转换为index.txt，直到得到有效列表，如果已有进度，则跳过索引捕获
+        # 步骤0: 识别虚拟机显示的校准帧，得到数据区域位置、缩放比例和实测颜色；超时则使用固定偏移和颜色阈值
+        calibration = None
+        if args.calibration_timeout > 0:
+            print("\n[校准] 等待虚拟机显示校准帧...")
+            calibration = capture_calibration(args.monitor_id, args.calibration_timeout, min(args.screenshot_interval, 0.5))
+            if calibration is None:
+                print(f"[校准] {args.calibration_timeout}秒内未识别到校准帧，使用固定裁剪偏移({CROP_LEFT}, {CROP_TOP})和默认颜色规则")
+            else:
+                apply_calibration(calibration)
+                save_calibration(calibration, os.path.join(args.transfer_path, args.calibration_file))
+                print(f"[校准] 数据区域: ({calibration.left}, {calibration.top})，截图尺寸 "
+                      f"{calibration.capture_width}x{calibration.capture_height}，帧尺寸 {calibration.width}x{calibration.height}，"
+                      f"单元 {calibration.cell}x{calibration.cell} 像素")
+                if (calibration.width, calibration.height) != (args.bmp_width, args.bmp_height):
+                    print(f"[校准] 警告: 实测帧尺寸与 --bmp-width/--bmp-height 不一致，以校准帧为准")
+                for count in (4, 8, 16):
+                    print(f"[校准] {count}色调色板实测颜色最小间距: {palette_margin(calibration.colors[:count]):.0f}")
+        
+        if calibration is not None:
+            width, height, cell, region = calibration.width, calibration.height, calibration.cell, calibration.region
+        else:
+            width, height, cell = args.bmp_width, args.bmp_height, args.cell
+            region = (CROP_LEFT, CROP_TOP, width, height)
+        
+        # 解码器只创建一次，后续每次截图直接在进程内解码（多像素单元模式下按单元网格解码）
+        decoder = FrameDecoder(width // cell, height // cell)
+        
+        # 截图引擎常驻打开，只截取数据区域
+        capture = ScreenCapture(args.monitor_id, region)
+        
+        # 步骤1: 循环截图索引帧并拼接为索引文件，直到得到有效列表，如果已有进度，则跳过索引捕获
         index_txt_output = os.path.join(args.transfer_path, args.index_file)
-        files_to_process: List[Tuple[str, str]] = []
+        files_to_process: List[Tuple[str, FrameDigest]] = []
         
         if processed_files:
             print("检测到已有进度，跳过索引捕获步骤...")
-            # 直接读取现有的index.txt文件
-            files_to_process = read_index_file_strict(index_txt_output)
+            # 直接读取现有的索引文件
+            index_header, files_to_process = read_index(index_txt_output)
             if len(files_to_process) == 0:
-                print("错误: 无法读取有效的index.txt文件")
+                print(f"错误: 无法读取有效的{args.index_file}文件")
                 return
-            print(f"从现有index.txt读取 {len(files_to_process)} 条记录")
+            print(f"从现有{args.index_file}读取 {len(files_to_process)} 条记录")
         else:
-            # 没有进度时执行索引捕获
+            # 没有进度时执行索引捕获；索引较大时虚拟机轮流显示各个索引帧，按帧头收齐所有分段
             index_bmp_screenshot = os.path.join(args.output_folder, args.index_bmp)
+            index_assembler = IndexAssembler()
             attempt = 0
             while True:
                 attempt += 1
-                print(f"\n[索引捕获] 第 {attempt} 次尝试：截图 index.bmp 并转换为 index.txt")
-                capture_screen(args.monitor_id, index_bmp_screenshot)
-                if not convert_bmp_to_txt(index_bmp_screenshot, index_txt_output, args.bmp_width, args.bmp_height):
-                    print("转换index.txt失败，准备重试...")
-                    time.sleep(max(1, args.screenshot_interval))
+                print(f"\n[索引捕获] 第 {attempt} 次尝试：截图索引帧并拼接为 {args.index_file}")
+                frame = capture.grab().image
+                if args.save_screenshots:
+                    save_screenshot(frame, index_bmp_screenshot)
+                frame = sample_cells(frame, width, height, cell)
+                if not capture_index_frame(decoder, frame, index_assembler, index_txt_output):
+                    time.sleep(args.screenshot_interval)
                     continue
-                # 严格校验读取
-                files_to_process = read_index_file_strict(index_txt_output)
+                # 读取并校验索引（CRC和清单根）
+                index_header, files_to_process = read_index(index_txt_output)
                 if len(files_to_process) == 0:
-                    print("index.txt 无效（为空/零条/格式错误），继续重试截图...")
-                    time.sleep(max(1, args.screenshot_interval))
+                    print(f"{args.index_file} 无效（为空/零条/格式错误），继续重试截图...")
+                    time.sleep(args.screenshot_interval)
                     continue
                 else:
-                    print(f"index.txt 有效，包含 {len(files_to_process)} 条记录")
+                    print(f"{args.index_file} 有效，包含 {len(files_to_process)} 条记录")
                     break
         
-        # 步骤2: 循环截图并转换文件 - 修改为持续重试直到成功
-        print("\n步骤2: 开始循环截图并转换文件（失败将持续重试）（支持断点续传）...")
-        for i, (file_number, expected_md5) in enumerate(files_to_process, 1):
+        # mss对象不能跨线程使用，截图线程会自行创建截图对象
+        capture.close()
+        capture = None
+        
+        # 按帧编号顺序重组压缩包并边收边解压；断点续传时从上次追加到的位置继续
+        file_numbers = {int(file_number): file_number for file_number, _ in files_to_process}
+        reassembler = Reassembler(file_numbers,
+                                  lambda frame_number: os.path.join(args.payload_folder,
+                                                                    f"example.tar.{file_numbers[frame_number]}"),
+                                  os.path.join(args.payload_folder, args.archive_file),
+                                  None if args.no_extract else args.extract_folder,
+                                  {int(file_number): entry.length for file_number, entry in files_to_process})
+        if processed_files:
+            # 并行校验本地已保存的分片并同时交给重组器，缺失或损坏的分片从进度和确认位图中去掉，重新接收
+            resumed = [(file_number, entry) for file_number, entry in files_to_process if file_number in processed_files]
+            start_time = time.time()
+            damaged = resume_local_volumes(reassembler, args.payload_folder, resumed, index_header.block_size,
+                                           args.hash_workers)
+            print(f"已校验 {len(resumed)} 个本地分片，耗时 {time.time() - start_time:.2f} 秒，需重新接收 {len(damaged)} 个")
+            if damaged:
+                processed_files.difference_update(damaged)
+                write_progress_file(progress_path, processed_files)
+                ack_bitmap = AckBitmap(ack_bitmap.path, (int(file_number) for file_number in processed_files))
+                ack_bitmap.write()
+        else:
+            reassembler.start()
+        
+        # 步骤2: 流水线截图并转换文件 - 持续重试直到全部成功
+        print("\n步骤2: 开始流水线截图并转换文件（失败将持续重试）（支持断点续传）...")
+        remaining: Dict[int, Tuple[str, FrameDigest]] = {}
+        for i, (file_number, expected) in enumerate(files_to_process, 1):
             # 检查是否已处理
             if file_number in processed_files:
                 print(f"跳过已处理文件 {file_number} ({i}/{len(files_to_process)})")
-                continue
             else:
-                print("asdfasdfasdfasdfasdfasfasdf======")
-
-            success = False
-            attempt = 0
+                remaining[int(file_number)] = (file_number, expected)
+        
+        if remaining:
+            fusions: Dict[int, SymbolFusion] = {}
+            attempts: Dict[int, int] = {}
+            parity_store = ParityStore()
             
-            while not success:
-                attempt += 1
-                print(f"\n处理文件 {i}/{len(files_to_process)}: {file_number} (尝试 #{attempt})")
-                
-                # 等待指定间隔
-                print(f"等待 {args.screenshot_interval} 秒...")
-                time.sleep(args.screenshot_interval)
-                
-                try:
-                    # 截图
-                    screenshot_path = os.path.join(args.output_folder, f"example.{file_number}.bmp")
-                    print(f"截取图片: {screenshot_path}")
-                    capture_screen(args.monitor_id, screenshot_path)
+            def commit_volume(frame_number: int, binary_data: bytes) -> bool:
+                """保存通过验证的TAR分片，更新进度文件和确认位图"""
+                file_number = remaining[frame_number][0]
+                final_tar_path = os.path.join(args.payload_folder, f"example.tar.{file_number}")
+                if not save_tar_data(binary_data, final_tar_path):
+                    return False
+                del remaining[frame_number]
+                fusions.pop(frame_number, None)
+                # 更新进度
+                processed_files.add(file_number)
+                with open(progress_path, 'a') as f:  # 追加模式
+                    f.write(f"{file_number}\n")
+                # 先交给重组器，确认位图写入失败也不会漏掉这一帧；写入失败的位留到下次确认时一并发布
+                reassembler.add(frame_number, binary_data)
+                ack_bitmap.set(frame_number)
+                ack_bitmap.publish()
+                return True
+            
+            def recover_group(first_frame: int) -> None:
+                """用已截到的校验帧恢复组内缺失的数据帧"""
+                recovered = recover_with_parity(parity_store, first_frame, remaining, file_numbers, args.payload_folder,
+                                                index_header.block_size)
+                for frame_number, binary_data in recovered.items():
+                    if commit_volume(frame_number, binary_data):
+                        print(f"✓ 文件 {file_numbers[frame_number]} 由校验帧恢复，且已添加到进度")
+            
+            # 帧切换检测：按数据区域的截图尺寸探测帧头CRC32所在的竖直窄条
+            change_detector = None
+            if args.change_poll > 0:
+                change_detector = ChangeDetector(region[2], region[3], width, height, cell,
+                                                 args.stable_polls, args.change_poll)
+            
+            pipeline = CapturePipeline(lambda: ScreenCapture(args.monitor_id, region),
+                                       width, height, args.screenshot_interval,
+                                       workers=args.decode_workers, depth=args.pipeline_depth,
+                                       keep_symbols=args.fusion_depth >= MIN_FUSION_CAPTURES, keep_images=args.save_screenshots,
+                                       cell=cell, calibration=calibration, change_detector=change_detector,
+                                       block_size=index_header.block_size)
+            with pipeline:
+                for result, image in pipeline.results():
+                    # 虚拟机还在显示的索引帧：帧编号是索引分段编号，不是数据帧
+                    if result.flags & FRAME_FLAG_INDEX:
+                        continue
+                    
+                    # 校验帧：保存分片，组内缺失的数据帧不多于已有校验帧时立即恢复
+                    if result.flags & FRAME_FLAG_PARITY:
+                        if result.data is None:
+                            print(f"校验帧 {result.frame_number} 无效: {result.error}")
+                            continue
+                        try:
+                            shard = parse_parity_payload(result.data)
+                        except ErasureError as e:
+                            print(f"校验帧 {result.frame_number} 无效: {e}")
+                            continue
+                        if shard.index not in parity_store.groups.get(shard.first_frame, {}):
+                            print(f"截到校验帧 {result.frame_number}（第 {shard.first_frame} 帧起的一组）")
+                        parity_store.add(shard)
+                        recover_group(shard.first_frame)
+                        if not remaining:
+                            break
+                        continue
+                    
+                    # 帧头缺失或损坏的截图是切换中、撕裂的画面或非数据帧（校准帧、空白画面），无法确定属于哪一帧，直接丢弃，
+                    # 不计入任何帧的尝试次数和融合历史；只有虚拟机播放无帧头的旧格式帧时才视为正在显示的第一个未完成文件
+                    if result.frame_number is None:
+                        if not args.legacy_frames:
+                            print(f"截图没有可用的帧头，跳过{'：' + result.error if result.error else ''}")
+                            continue
+                        target = next(iter(remaining))
+                    else:
+                        target = result.frame_number
+                    if target not in remaining:
+                        print(f"截到的是第 {target} 帧（已完成或不在列表中），跳过")
+                        continue
+                    
+                    file_number, expected = remaining[target]
+                    attempts[target] = attempts.get(target, 0) + 1
+                    print(f"\n处理文件 {file_number}（剩余 {len(remaining)} 个，尝试 #{attempts[target]}）")
+                    if image is not None:
+                        save_screenshot(image, os.path.join(args.output_folder, f"example.{file_number}.bmp"))
+                    if result.corrected:
+                        print(f"前向纠错修正了第 {file_number} 帧中的 {result.corrected} 个码字")
                     
-                    # 转换为tar文件
-                    temp_tar_path = os.path.join(args.output_folder, f"temp_example.tar.{file_number}")
-                    print(f"转换为tar文件: {temp_tar_path}")
+                    try:
+                        # 解码进程已完成解码和分块摘要计算，失败时与同一帧最近几次截图融合后再验证
+                        binary_data = (result.data if verify_volume(result.data, expected, index_header.block_size,
+                                                                    result.leaves) else None)
+                        if binary_data is None:
+                            if result.error:
+                                print(f"帧无效: {result.error}")
+                            if result.symbols is not None:
+                                if target not in fusions and len(fusions) >= MAX_FUSION_FRAMES:
+                                    # 连续播放模式下各帧交替出现，只保留最近几帧的融合历史
+                                    fusions.pop(next(iter(fusions)))
+                                fusion = fusions.setdefault(target, SymbolFusion(args.fusion_depth))
+                                binary_data = verify_fused(fusion, result.symbols, file_number, expected,
+                                                           index_header.block_size)
                     
-                    if convert_bmp_to_tar(screenshot_path, temp_tar_path, args.bmp_width, args.bmp_height):
-                        # 验证MD5值并保存文件
-                        final_tar_path = os.path.join(args.transfer_path, f"example.tar.{file_number}")
-                        if verify_and_save_tar_file(temp_tar_path, final_tar_path, expected_md5):
-                            success = True
-                            # 更新进度
-                            processed_files.add(file_number)
-                            with open(progress_path, 'a') as f:  # 追加模式
-                                f.write(f"{file_number}\n")
-                            print(f"✓ 文件 {file_number} 处理成功，且已添加到进度")
+                        if binary_data is not None and commit_volume(target, binary_data):
+                            print(f"✓ 文件 {file_number} 处理成功，且已添加到进度（截图到保存耗时 {time.time() - result.timestamp:.2f} 秒）")
+                            # 同组已有校验帧时，新收到的数据帧可能使缺失的帧变得可恢复
+                            first_frame = parity_store.group_of(target)
+                            if first_frame is not None:
+                                recover_group(first_frame)
+                            if not remaining:
+                                break
                         else:
                             print(f"× 文件 {file_number} 验证失败，准备重试...")
-                    else:
-                        print(f"× 文件 {file_number} 转换失败，准备重试...")
-                except Exception as e:
-                    print(f"! 处理过程中发生异常: {e}")
-                    traceback.print_exc()
+                    except Exception as e:
+                        print(f"! 处理过程中发生异常: {e}")
+                        traceback.print_exc()
+            
+            # 最后几帧的确认写入失败时，虚拟机还在等待，继续重试直到发布成功
+            while ack_bitmap.unpublished and not ack_bitmap.publish():
+                time.sleep(1)
+            if pipeline.dropped:
+                print(f"解码繁忙时丢弃的截图数: {pipeline.dropped}")
+            if pipeline.restarts:
+                print(f"解码进程异常退出后重建进程池 {pipeline.restarts} 次")
+            if change_detector is not None:
+                print(f"检测到换帧后截图 {pipeline.changes} 次，画面无变化超时重截 {pipeline.timeouts} 次")
 
         print("\n=== 所有文件处理完成 ===")
         
@@ -297,8 +572,12 @@ def main():
         print("\n用户中断程序，进度已保存")
     except Exception as e:
         print(f"\n程序发生错误: {e}")
-        import traceback
         traceback.print_exc()
+    finally:
+        if capture is not None:
+            capture.close()
+        if reassembler is not None:
+            reassembler.close()
 
 if __name__ == '__main__':
     main()
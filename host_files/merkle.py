@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+"""
+分块哈希树（Merkle树，与虚拟机端merkle.py的分块大小和摘要规则一致）
+数据按固定大小（默认64 KiB）分块，每块的BLAKE2b摘要（16字节）为叶子，相邻两个节点的摘要拼接后再求摘要，
+直到只剩一个根；叶子和内部节点使用不同的personalization，不会互相冒充
+宿主机按索引中记录的叶子校验每个分片，校验失败时指出具体哪几块损坏；断点续传时本地已保存的分片在线程池中
+并行校验（hashlib在哈希较大的数据块时释放GIL）
+"""
+
+import hashlib
+from concurrent.futures import Executor
+from typing import List, Optional, Sequence
+
+BLOCK_SIZE = 64 * 1024
+DIGEST_SIZE = 16
+LEAF_PERSON = b'qf-merkle-leaf'
+NODE_PERSON = b'qf-merkle-node'
+
+def leaf_hash(block: bytes) -> bytes:
+    """一个数据块的叶子摘要"""
+    return hashlib.blake2b(block, digest_size=DIGEST_SIZE, person=LEAF_PERSON).digest()
+
+def node_hash(left: bytes, right: bytes) -> bytes:
+    """两个子节点的父节点摘要"""
+    return hashlib.blake2b(left + right, digest_size=DIGEST_SIZE, person=NODE_PERSON).digest()
+
+def leaf_count(length: int, block_size: int = BLOCK_SIZE) -> int:
+    """长度为length的数据的叶子数；空数据也有一个叶子"""
+    return max(1, -(-length // block_size))
+
+def block_hashes(data: bytes, block_size: int = BLOCK_SIZE, executor: Optional[Executor] = None) -> List[bytes]:
+    """按block_size分块求叶子摘要；提供线程池时各块并行计算"""
+    view = memoryview(data)
+    blocks = [view[i:i + block_size] for i in range(0, len(view), block_size)] or [view]
+    if executor is None or len(blocks) == 1:
+        return [leaf_hash(block) for block in blocks]
+    return list(executor.map(leaf_hash, blocks))
+
+def merkle_root(hashes: Sequence[bytes]) -> bytes:
+    """逐层两两合并直到只剩根；某层为奇数个节点时最后一个直接进入上一层"""
+    level = list(hashes)
+    if not level:
+        return leaf_hash(b'')
+    while len(level) > 1:
+        level = [node_hash(level[i], level[i + 1]) if i + 1 < len(level) else level[i]
+                 for i in range(0, len(level), 2)]
+    return level[0]
+
+def bad_blocks(actual: Sequence[bytes], expected: Sequence[bytes]) -> List[int]:
+    """比较两组叶子，返回摘要不同的块下标；块数不同时多出或缺少的块也计入"""
+    bad = [i for i, (a, e) in enumerate(zip(actual, expected)) if a != e]
+    bad.extend(range(min(len(actual), len(expected)), max(len(actual), len(expected))))
+    return bad
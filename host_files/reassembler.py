@@ -0,0 +1,246 @@
+# -*- coding: utf-8 -*-
+"""
+流式重组与解压
+通过验证的TAR分片按帧编号顺序追加到重组后的压缩包（分片依次拼接即为虚拟机端打包的原始压缩流），
+同样的字节同时送入后台线程中的tarfile流式解压（'r|*'自动识别tar.xz/tar.gz/tar），
+每个文件的字节一到齐就出现在解压目录中，不必等最后一帧，也不必在传输结束后再读一遍所有分片；
+已追加的分片数记录在压缩包旁的状态文件中，断点续传时从这里继续追加，不再从本地分片重建已有的部分
+"""
+
+import json
+import os
+import tarfile
+import threading
+from typing import BinaryIO, Callable, Dict, Iterable, List, Optional
+
+class ChunkPipe:
+    """线程间的字节管道：主线程按顺序写入分片，解压线程像读文件一样阻塞读取"""
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._chunks: List[bytes] = []
+        self._offset = 0
+        self._closed = False
+
+    def write(self, data: bytes) -> None:
+        with self._condition:
+            self._chunks.append(data)
+            self._condition.notify_all()
+
+    def close(self) -> None:
+        """写入结束，读取方读完剩余数据后得到EOF"""
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+
+    def read(self, size: int = -1) -> bytes:
+        with self._condition:
+            while not self._chunks and not self._closed:
+                self._condition.wait()
+            if not self._chunks:
+                return b''
+            chunk = self._chunks[0]
+            if size < 0 or self._offset + size >= len(chunk):
+                data = chunk[self._offset:]
+                self._chunks.pop(0)
+                self._offset = 0
+            else:
+                data = chunk[self._offset:self._offset + size]
+                self._offset += size
+            return data
+
+class ResumeReader:
+    """断点续传时解压线程的输入：先读压缩包中已重组的前缀，读完后接着读管道中新追加的分片"""
+
+    def __init__(self, prefix: BinaryIO, prefix_size: int, pipe: ChunkPipe):
+        self._prefix = prefix
+        self._remaining = prefix_size
+        self._pipe = pipe
+
+    def read(self, size: int = -1) -> bytes:
+        if self._remaining > 0:
+            data = self._prefix.read(self._remaining if size < 0 else min(size, self._remaining))
+            if data:
+                self._remaining -= len(data)
+                return data
+            self._remaining = 0
+        if self._prefix is not None:
+            self._prefix.close()
+            self._prefix = None
+        return self._pipe.read(size)
+
+def is_extracted(member: tarfile.TarInfo, extract_folder: str) -> bool:
+    """该文件此前已完整解压（大小和修改时间与压缩包中的记录一致）"""
+    path = os.path.join(extract_folder, member.name)
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return False
+    return os.path.isfile(path) and stat.st_size == member.size and int(stat.st_mtime) == int(member.mtime)
+
+def is_safe_member(member: tarfile.TarInfo) -> bool:
+    """只解压普通文件和目录，拒绝绝对路径和指向解压目录之外的路径"""
+    if not (member.isfile() or member.isdir()):
+        return False
+    name = member.name.replace('\\', '/')
+    return not name.startswith('/') and '..' not in name.split('/') and ':' not in name
+
+class Reassembler:
+    """
+    按帧编号顺序重组压缩包并流式解压
+    volume_path: 帧编号 -> 本地TAR分片路径（乱序到达的分片在补齐前面的帧后从磁盘读取）
+    lengths: 帧编号 -> 分片长度（来自索引），提供时才能从状态文件记录的位置断点续传
+    extract_folder为None时只重组不解压
+    """
+
+    def __init__(self, frame_numbers: Iterable[int], volume_path: Callable[[int], str], archive_path: str,
+                 extract_folder: Optional[str] = None, lengths: Optional[Dict[int, int]] = None):
+        self.order = sorted(frame_numbers)
+        self.volume_path = volume_path
+        self.archive_path = archive_path
+        self.state_path = archive_path + '.state'
+        self.extract_folder = extract_folder
+        self.lengths = lengths
+        self.extracted = 0
+        self.skipped = 0
+        self.error: Optional[BaseException] = None
+        self._position = 0
+        self._arrived: Dict[int, Optional[bytes]] = {}
+        self._archive = None
+        self._pipe: Optional[ChunkPipe] = None
+        self._thread: Optional[threading.Thread] = None
+
+    def resumable(self, received: Iterable[int]) -> List[int]:
+        """断点续传时可以直接保留在压缩包中的帧（状态文件记录的已追加部分中，仍在received中的连续前缀）"""
+        return self.order[:self._resume_position(set(received))]
+
+    def _resume_position(self, received: set) -> int:
+        """状态文件记录的已追加分片数中，仍在received中的连续部分；压缩包比记录的短或无法续传时为0"""
+        if self.lengths is None:
+            return 0
+        try:
+            with open(self.state_path, 'r', encoding='utf-8') as f:
+                saved = int(json.load(f)['position'])
+            archive_size = os.path.getsize(self.archive_path)
+        except (OSError, ValueError, KeyError, TypeError):
+            return 0
+        position = 0
+        for frame_number in self.order[:saved]:
+            if frame_number not in received:
+                break
+            position += 1
+        if archive_size < sum(self.lengths[frame_number] for frame_number in self.order[:position]):
+            return 0
+        return position
+
+    def _save_state(self) -> None:
+        temp_path = self.state_path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump({'position': self._position}, f)
+        os.replace(temp_path, self.state_path)
+
+    def start(self, received: Iterable[int] = ()) -> 'Reassembler':
+        """
+        开始重组；received为之前已保存到本地的帧（断点续传）
+        状态文件记录的已追加部分直接保留在压缩包中，只在解压线程里重新解压（已完整解压的文件跳过），
+        其后连续的部分立即从磁盘追加
+        """
+        received = set(received)
+        self._position = self._resume_position(received)
+        prefix_size = sum(self.lengths[frame_number] for frame_number in self.order[:self._position])
+        if self._position:
+            self._archive = open(self.archive_path, 'r+b')
+            self._archive.truncate(prefix_size)
+            self._archive.seek(prefix_size)
+            print(f"[重组] 从第 {self._position + 1} 个分片继续重组，压缩包中已有 {prefix_size} 字节")
+        else:
+            self._archive = open(self.archive_path, 'wb')
+        self._save_state()
+        if self.extract_folder is not None:
+            os.makedirs(self.extract_folder, exist_ok=True)
+            self._pipe = ChunkPipe()
+            source = self._pipe
+            if prefix_size:
+                source = ResumeReader(open(self.archive_path, 'rb'), prefix_size, self._pipe)
+            self._thread = threading.Thread(target=self._extract_loop, args=(source,), name='extract', daemon=True)
+            self._thread.start()
+        appended = set(self.order[:self._position])
+        for frame_number in received - appended:
+            self._arrived[frame_number] = None
+        self._advance()
+        return self
+
+    @property
+    def complete(self) -> bool:
+        return self._position == len(self.order)
+
+    def add(self, frame_number: int, binary_data: bytes) -> None:
+        """一帧已通过验证；前面的帧都已到达时立即追加，否则等前面的帧补齐（期间只记录编号，数据留在磁盘上）"""
+        if self._archive is None:
+            return
+        next_frame = self.order[self._position] if not self.complete else None
+        self._arrived[frame_number] = binary_data if frame_number == next_frame else None
+        self._advance()
+
+    def _advance(self) -> None:
+        """追加所有已连续到达的帧，并更新状态文件"""
+        position = self._position
+        while not self.complete and self.order[self._position] in self._arrived:
+            frame_number = self.order[self._position]
+            binary_data = self._arrived.pop(frame_number)
+            if binary_data is None:
+                try:
+                    with open(self.volume_path(frame_number), 'rb') as f:
+                        binary_data = f.read()
+                except OSError as e:
+                    print(f"[重组] 无法读取第 {frame_number} 帧的分片，停止重组: {e}")
+                    self.close()
+                    return
+            self._archive.write(binary_data)
+            self._archive.flush()
+            if self._pipe is not None and self.error is None:
+                self._pipe.write(binary_data)
+            self._position += 1
+        if self._position != position:
+            self._save_state()
+
+    def _extract_loop(self, source) -> None:
+        try:
+            with tarfile.open(fileobj=source, mode='r|*') as tar:
+                if hasattr(tarfile, 'data_filter'):
+                    # 支持解压过滤器的Python版本再额外拒绝危险的权限和链接
+                    tar.extraction_filter = tarfile.data_filter
+                for member in tar:
+                    if not is_safe_member(member):
+                        print(f"[解压] 跳过不安全或不支持的条目: {member.name}")
+                        continue
+                    if member.isfile() and is_extracted(member, self.extract_folder):
+                        # 断点续传前已解压的文件：流式读取时直接跳过其数据
+                        self.skipped += 1
+                        continue
+                    tar.extract(member, self.extract_folder)
+                    if member.isfile():
+                        self.extracted += 1
+                        print(f"[解压] {member.name}（{member.size} 字节）")
+        except BaseException as e:
+            self.error = e
+            # 继续读空管道，避免主线程写入的数据无限堆积
+            while source.read(1 << 20):
+                pass
+
+    def close(self) -> None:
+        """结束重组；全部帧都已追加时等待解压完成，否则放弃尚未完整的文件"""
+        if self._archive is None:
+            return
+        self._archive.close()
+        self._archive = None
+        if self._pipe is not None:
+            self._pipe.close()
+            if self.complete:
+                self._thread.join()
+                if self.error is not None:
+                    print(f"[解压] 解压失败: {self.error}（重组后的压缩包已保存在 {self.archive_path}）")
+                else:
+                    print(f"[解压] 完成，共 {self.extracted} 个文件（另有 {self.skipped} 个此前已解压），"
+                          f"解压目录: {self.extract_folder}")
+        print(f"已按顺序重组 {self._position}/{len(self.order)} 个分片到 {self.archive_path}")
@@ -0,0 +1,199 @@
+# -*- coding: utf-8 -*-
+"""
+帧内前向纠错（Reed-Solomon解码端，与虚拟机端reed_solomon.py的编码参数一致）
+GF(2^8)，本原多项式0x11d，生成元2，码字长度255字节，码字按列交织
+先用numpy同时计算所有码字的伴随式，只对出错的码字逐个做Berlekamp-Massey、Chien搜索和Forney纠错
+"""
+
+from typing import List, Tuple
+
+import numpy as np
+
+RS_CODEWORD_SIZE = 255
+RS_PRIMITIVE_POLY = 0x11d
+
+class ReedSolomonError(ValueError):
+    """错误数量超过纠错能力"""
+
+def _build_gf_tables():
+    """构建GF(2^8)的指数表、对数表和完整乘法表"""
+    exp = np.zeros(512, dtype=np.int32)
+    log = np.zeros(256, dtype=np.int32)
+    x = 1
+    for i in range(255):
+        exp[i] = x
+        log[x] = i
+        x <<= 1
+        if x & 0x100:
+            x ^= RS_PRIMITIVE_POLY
+    exp[255:510] = exp[:255]
+
+    mul = exp[(log[:, np.newaxis] + log[np.newaxis, :])].astype(np.uint8)
+    mul[0, :] = 0
+    mul[:, 0] = 0
+    return exp, log, mul
+
+GF_EXP, GF_LOG, GF_MUL = _build_gf_tables()
+
+# 逐码字纠错使用Python列表查表，比numpy标量运算快
+_EXP = GF_EXP.tolist()
+_LOG = GF_LOG.tolist()
+
+def _mul(x: int, y: int) -> int:
+    if x == 0 or y == 0:
+        return 0
+    return _EXP[_LOG[x] + _LOG[y]]
+
+def _div(x: int, y: int) -> int:
+    if x == 0:
+        return 0
+    return _EXP[(_LOG[x] + 255 - _LOG[y]) % 255]
+
+def _pow(x: int, power: int) -> int:
+    return _EXP[(_LOG[x] * power) % 255]
+
+def _inverse(x: int) -> int:
+    return _EXP[255 - _LOG[x]]
+
+def _poly_scale(p: List[int], x: int) -> List[int]:
+    return [_mul(coef, x) for coef in p]
+
+def _poly_add(p: List[int], q: List[int]) -> List[int]:
+    result = [0] * max(len(p), len(q))
+    for i, coef in enumerate(p):
+        result[i + len(result) - len(p)] = coef
+    for i, coef in enumerate(q):
+        result[i + len(result) - len(q)] ^= coef
+    return result
+
+def _poly_mul(p: List[int], q: List[int]) -> List[int]:
+    result = [0] * (len(p) + len(q) - 1)
+    for j, q_coef in enumerate(q):
+        for i, p_coef in enumerate(p):
+            result[i + j] ^= _mul(p_coef, q_coef)
+    return result
+
+def _poly_eval(poly: List[int], x: int) -> int:
+    y = poly[0]
+    for coef in poly[1:]:
+        y = _mul(y, x) ^ coef
+    return y
+
+def _poly_div(dividend: List[int], divisor: List[int]) -> Tuple[List[int], List[int]]:
+    """扩展综合除法（除数为首一多项式），返回(商, 余式)"""
+    out = list(dividend)
+    for i in range(len(dividend) - (len(divisor) - 1)):
+        coef = out[i]
+        if coef != 0:
+            for j in range(1, len(divisor)):
+                if divisor[j] != 0:
+                    out[i + j] ^= _mul(divisor[j], coef)
+    separator = -(len(divisor) - 1)
+    return out[:separator], out[separator:]
+
+def rs_syndromes(codewords: np.ndarray, nsym: int) -> np.ndarray:
+    """同时计算(nblocks, n)码字的伴随式 S_i = C(α^i)，返回(nblocks, nsym)"""
+    alpha_powers = GF_EXP[:nsym].astype(np.uint8)[np.newaxis, :]
+    syndromes = np.zeros((codewords.shape[0], nsym), dtype=np.uint8)
+    for column in range(codewords.shape[1]):
+        # 霍纳法则：S = S * α^i + c_j
+        syndromes = GF_MUL[syndromes, alpha_powers]
+        syndromes ^= codewords[:, column, np.newaxis]
+    return syndromes
+
+def _find_error_locator(synd: List[int], nsym: int) -> List[int]:
+    """Berlekamp-Massey算法求错误定位多项式（synd首位补0）"""
+    err_loc = [1]
+    old_loc = [1]
+    for i in range(nsym):
+        k = i + 1
+        delta = synd[k]
+        for j in range(1, len(err_loc)):
+            delta ^= _mul(err_loc[-(j + 1)], synd[k - j])
+        old_loc = old_loc + [0]
+        if delta != 0:
+            if len(old_loc) > len(err_loc):
+                new_loc = _poly_scale(old_loc, delta)
+                old_loc = _poly_scale(err_loc, _inverse(delta))
+                err_loc = new_loc
+            err_loc = _poly_add(err_loc, _poly_scale(old_loc, delta))
+    while err_loc and err_loc[0] == 0:
+        del err_loc[0]
+    if (len(err_loc) - 1) * 2 > nsym:
+        raise ReedSolomonError("错误数量超过纠错能力")
+    return err_loc
+
+def _find_errors(err_loc_reversed: List[int], length: int) -> List[int]:
+    """Chien搜索：返回出错字节在码字中的位置"""
+    err_count = len(err_loc_reversed) - 1
+    err_pos = [length - 1 - i for i in range(length) if _poly_eval(err_loc_reversed, _pow(2, i)) == 0]
+    if len(err_pos) != err_count:
+        raise ReedSolomonError("Chien搜索找到的错误位置数量不符")
+    return err_pos
+
+def _correct_errata(codeword: List[int], synd: List[int], err_pos: List[int]) -> List[int]:
+    """Forney算法计算错误值并修正码字（synd首位补0）"""
+    coef_pos = [len(codeword) - 1 - p for p in err_pos]
+
+    # 错误定位多项式与错误求值多项式
+    err_loc = [1]
+    for position in coef_pos:
+        err_loc = _poly_mul(err_loc, _poly_add([1], [_pow(2, position), 0]))
+    _, remainder = _poly_div(_poly_mul(synd[::-1], err_loc), [1] + [0] * len(err_loc))
+    err_eval = remainder[::-1]
+
+    locations = [_pow(2, -(255 - position)) for position in coef_pos]
+    errors = [0] * len(codeword)
+    for i, location in enumerate(locations):
+        location_inv = _inverse(location)
+        err_loc_prime = 1
+        for j, other in enumerate(locations):
+            if j != i:
+                err_loc_prime = _mul(err_loc_prime, 1 ^ _mul(location_inv, other))
+        if err_loc_prime == 0:
+            raise ReedSolomonError("Forney算法求值失败")
+        y = _mul(location, _poly_eval(err_eval[::-1], location_inv))
+        errors[err_pos[i]] = _div(y, err_loc_prime)
+    return _poly_add(codeword, errors)
+
+def rs_correct_codeword(codeword: List[int], syndromes: List[int], nsym: int) -> List[int]:
+    """根据非零伴随式纠正单个码字，无法纠正时抛出ReedSolomonError"""
+    synd = [0] + syndromes
+    err_loc = _find_error_locator(synd, nsym)
+    err_pos = _find_errors(err_loc[::-1], len(codeword))
+    corrected = _correct_errata(codeword, synd, err_pos)
+
+    # 纠正后重新校验
+    check = rs_syndromes(np.array([corrected], dtype=np.uint8), nsym)
+    if check.any():
+        raise ReedSolomonError("码字纠正后校验仍不通过")
+    return corrected
+
+def fec_block_count(payload_length: int, nsym: int) -> int:
+    """负载需要的码字数量"""
+    data_size = RS_CODEWORD_SIZE - nsym
+    return -(-payload_length // data_size)
+
+def fec_encoded_size(payload_length: int, nsym: int) -> int:
+    """负载经过纠错编码后的字节数"""
+    return fec_block_count(payload_length, nsym) * RS_CODEWORD_SIZE
+
+def fec_extract(encoded: bytes, nsym: int, payload_length: int) -> bytes:
+    """不纠错，直接从交织码字中取出系统部分（数据字节）"""
+    nblocks = fec_block_count(payload_length, nsym)
+    codewords = np.frombuffer(encoded, dtype=np.uint8).reshape(RS_CODEWORD_SIZE, nblocks).T
+    return codewords[:, :RS_CODEWORD_SIZE - nsym].tobytes()[:payload_length]
+
+def fec_decode(encoded: bytes, nsym: int, payload_length: int) -> Tuple[bytes, int]:
+    """
+    解交织并纠正所有码字，返回(负载, 被纠正的码字数量)
+    任一码字错误过多时抛出ReedSolomonError
+    """
+    nblocks = fec_block_count(payload_length, nsym)
+    codewords = np.frombuffer(encoded, dtype=np.uint8).reshape(RS_CODEWORD_SIZE, nblocks).T.copy()
+    syndromes = rs_syndromes(codewords, nsym)
+    bad_blocks = np.flatnonzero(syndromes.any(axis=1))
+    for block in bad_blocks:
+        corrected = rs_correct_codeword(codewords[block].tolist(), syndromes[block].tolist(), nsym)
+        codewords[block] = corrected
+    return codewords[:, :RS_CODEWORD_SIZE - nsym].tobytes()[:payload_length], int(bad_blocks.size)
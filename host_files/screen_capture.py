@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+"""
+常驻截图引擎
+截图后端在整个会话中只打开一次，只截取数据区域矩形，并保留最近几帧及其时间戳
+"""
+
+import time
+from collections import deque
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+# 截图缓冲区为BGRA格式，R、G、B所在的通道下标
+BGRA_CHANNELS = (2, 1, 0)
+
+class CapturedFrame(NamedTuple):
+    """一次截图结果：截图时间戳和(height, width, 4)的BGRA像素数组"""
+    timestamp: float
+    image: np.ndarray
+
+class MssBackend:
+    """基于mss的截图后端（mss对象不能跨线程使用，需在同一线程中创建和截图）"""
+
+    def __init__(self):
+        import mss
+        self._sct = mss.mss()
+
+    def monitors(self) -> List[Dict[str, int]]:
+        return self._sct.monitors
+
+    def grab(self, region: Dict[str, int]) -> np.ndarray:
+        """截取指定矩形，返回直接引用mss原始缓冲区的数组（不复制）"""
+        screenshot = self._sct.grab(region)
+        return np.frombuffer(screenshot.raw, dtype=np.uint8).reshape(screenshot.height, screenshot.width, 4)
+
+    def close(self) -> None:
+        self._sct.close()
+
+class SyntheticBackend:
+    """内存中的合成屏幕，用于没有显示器的Linux环境测试，用show()把RGB图像“显示”到屏幕上"""
+
+    def __init__(self, width: int = 1920, height: int = 1080, monitor_count: int = 2):
+        self.width = width
+        self.height = height
+        self.monitor_count = monitor_count
+        self.screen = np.zeros((height, width, 4), dtype=np.uint8)
+        self.screen[..., 3] = 255
+
+    def show(self, rgb_image: np.ndarray, left: int = 0, top: int = 0) -> None:
+        """在屏幕(left, top)处绘制RGB图像"""
+        height, width = rgb_image.shape[:2]
+        self.screen[top:top + height, left:left + width, 2::-1] = rgb_image
+
+    def monitors(self) -> List[Dict[str, int]]:
+        # 与mss一致：monitors[0]为全部屏幕的合并区域，所有显示器共用同一块合成屏幕
+        monitor = {'left': 0, 'top': 0, 'width': self.width, 'height': self.height}
+        return [dict(monitor) for _ in range(self.monitor_count + 1)]
+
+    def grab(self, region: Dict[str, int]) -> np.ndarray:
+        top, left = region['top'], region['left']
+        return self.screen[top:top + region['height'], left:left + region['width']].copy()
+
+    def close(self) -> None:
+        pass
+
+class ScreenCapture:
+    """常驻截图对象：持续打开截图后端，只截取数据区域，并在环形缓冲区中保留最近的帧"""
+
+    def __init__(self, monitor_id: int = 2, region: Optional[Tuple[int, int, int, int]] = None,
+                 backend=None, history: int = 4):
+        """
+        region为相对于显示器左上角的(left, top, width, height)，为None时截取整个显示器
+        backend默认为MssBackend
+        """
+        self.backend = backend if backend is not None else MssBackend()
+        monitors = self.backend.monitors()
+
+        # 检查输入的显示器编号是否有效（编号从1开始，monitors[0]是合并所有屏幕的区域）
+        if monitor_id < 1 or monitor_id >= len(monitors):
+            self.backend.close()
+            raise ValueError(f"无效的屏幕编号。可用屏幕范围: 1 ~ {len(monitors)-1}")
+
+        monitor = monitors[monitor_id]
+        if region is None:
+            region = (0, 0, monitor['width'], monitor['height'])
+        left, top, width, height = region
+        self.region = {
+            'left': monitor['left'] + left,
+            'top': monitor['top'] + top,
+            'width': width,
+            'height': height,
+        }
+        self.frames = deque(maxlen=history)
+
+    def grab(self) -> CapturedFrame:
+        """截取数据区域并加入环形缓冲区"""
+        frame = CapturedFrame(time.time(), self.backend.grab(self.region))
+        self.frames.append(frame)
+        return frame
+
+    def grab_strip(self, left: int, width: int) -> np.ndarray:
+        """一次截取数据区域中的一条竖直窄条（列号相对于数据区域左边），返回(height, width, 4)数组，不加入环形缓冲区"""
+        return self.backend.grab(dict(self.region, left=self.region['left'] + left, width=width))
+
+    def latest(self) -> Optional[CapturedFrame]:
+        """返回最近一次截图"""
+        return self.frames[-1] if self.frames else None
+
+    def close(self) -> None:
+        self.frames.clear()
+        self.backend.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
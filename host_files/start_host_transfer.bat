@@ -25,6 +25,9 @@ if "%resumeMode%"=="1" (
     echo Cleaning up previous files...
     rd /s /q "transferPath" 2>nul
     if not exist "transferPath" mkdir "transferPath"
+    rd /s /q "received" 2>nul
+    if not exist "received" mkdir "received"
+    rd /s /q "extracted" 2>nul
 )
 if "%resumeMode%"=="2" (
     echo Do Nothing.
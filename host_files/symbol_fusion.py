@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+"""
+多次截图融合
+保留同一帧最近几次截图的符号数组，按像素多数投票得到融合结果，
+闪烁、压缩块等瞬时干扰只要不在多数截图的同一像素上出现，就会被投票消除
+"""
+
+from collections import deque
+from typing import Optional
+
+import numpy as np
+
+# 融合所需的最少截图次数：只有两次截图时投票总是以最新一次为准，融合结果与最新截图相同，不必重新解码
+MIN_FUSION_CAPTURES = 3
+
+class SymbolFusion:
+    """同一帧多次截图的符号数组按像素加权多数投票融合，票数相同时以最新一次截图为准"""
+
+    def __init__(self, depth: int = 3):
+        self.history = deque(maxlen=depth)
+
+    def reset(self) -> None:
+        """开始新的一帧时清空历史"""
+        self.history.clear()
+
+    def add(self, symbols: np.ndarray) -> None:
+        """加入一次截图的符号数组（调用方不得再修改该数组）"""
+        if self.history and self.history[-1].shape != symbols.shape:
+            self.reset()
+        self.history.append(symbols)
+
+    def fuse(self) -> Optional[np.ndarray]:
+        """返回融合后的符号数组，历史不足MIN_FUSION_CAPTURES次截图时返回None"""
+        if len(self.history) < MIN_FUSION_CAPTURES:
+            return None
+
+        # 只有各次截图不一致的像素需要投票，其余像素直接取最新截图
+        latest = self.history[-1]
+        differs = np.zeros(latest.size, dtype=bool)
+        for symbols in list(self.history)[:-1]:
+            differs |= symbols != latest
+        fused = latest.copy()
+        index = np.flatnonzero(differs)
+        if index.size == 0:
+            return fused
+
+        # 每次截图2票，最新一次额外加1票用于打破平局
+        candidates = np.stack([symbols[index] for symbols in self.history])
+        weights = np.full(len(self.history), 2, dtype=np.uint16)
+        weights[-1] = 3
+        votes = np.stack([((candidates == value) * weights[:, np.newaxis]).sum(axis=0)
+                          for value in range(int(candidates.max()) + 1)])
+        fused[index] = np.argmax(votes, axis=0)
+        return fused
@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+"""
+测试公共设置
+宿主机端模块直接导入（host_files加入sys.path）；虚拟机端与宿主机端有同名模块（merkle、frame_index……），
+虚拟机端模块用load_vm_module单独导入，不会与宿主机端的版本混用
+"""
+
+import importlib
+import os
+import sys
+from types import ModuleType
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HOST_FOLDER = os.path.join(ROOT, 'host_files')
+VM_FOLDER = os.path.join(ROOT, 'vm_files')
+# 两端各有一份的模块
+SHARED_MODULES = ('erasure', 'frame_index', 'merkle', 'reed_solomon')
+
+sys.path.insert(0, HOST_FOLDER)
+
+def load_vm_module(name: str) -> ModuleType:
+    """导入vm_files中的模块：导入期间同名模块临时换成虚拟机端的版本，导入后恢复宿主机端的版本"""
+    names = SHARED_MODULES + (name, 'tar_to_bmp')
+    saved = {module: sys.modules.pop(module) for module in names if module in sys.modules}
+    sys.path.insert(0, VM_FOLDER)
+    try:
+        return importlib.import_module(name)
+    finally:
+        sys.path.remove(VM_FOLDER)
+        for module in names:
+            sys.modules.pop(module, None)
+        sys.modules.update(saved)
+
+@pytest.fixture(scope='session')
+def tar_to_bmp() -> ModuleType:
+    """虚拟机端的帧编码模块"""
+    return load_vm_module('tar_to_bmp')
+
+@pytest.fixture(scope='session')
+def vm_frame_index() -> ModuleType:
+    """虚拟机端的二进制索引模块"""
+    return load_vm_module('frame_index')
+
+@pytest.fixture(scope='session')
+def vm_merkle() -> ModuleType:
+    """虚拟机端的分块摘要模块"""
+    return load_vm_module('merkle')
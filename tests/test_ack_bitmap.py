@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+"""确认位图：原子替换失败时重试，仍失败的位保留到下一次写入时发布"""
+
+import os
+
+import ack_bitmap
+from ack_bitmap import AckBitmap
+
+def fail_replace(monkeypatch, failures):
+    """让接下来的failures次os.replace抛出PermissionError（模拟虚拟机正在读取位图文件）"""
+    replace = os.replace
+    remaining = [failures]
+
+    def flaky_replace(src, dst):
+        if remaining[0] > 0:
+            remaining[0] -= 1
+            raise PermissionError(13, '另一个程序正在使用此文件', dst)
+        replace(src, dst)
+
+    monkeypatch.setattr(ack_bitmap.os, 'replace', flaky_replace)
+
+def test_publish_retries_failed_replace(tmp_path, monkeypatch):
+    bitmap = AckBitmap(str(tmp_path / 'ack.bin'))
+    bitmap.set(3)
+    fail_replace(monkeypatch, 1)
+    assert bitmap.publish(delay=0)
+    assert (tmp_path / 'ack.bin').read_bytes() == b'\x08'
+
+def test_unpublished_bit_is_written_next_time(tmp_path, monkeypatch):
+    bitmap = AckBitmap(str(tmp_path / 'ack.bin'), [1])
+    bitmap.write()
+    bitmap.set(2)
+    fail_replace(monkeypatch, 3)
+    assert not bitmap.publish(attempts=3, delay=0)
+    assert bitmap.unpublished and (tmp_path / 'ack.bin').read_bytes() == b'\x02'
+
+    bitmap.set(9)
+    assert bitmap.publish(delay=0)
+    assert not bitmap.unpublished
+    assert (tmp_path / 'ack.bin').read_bytes() == b'\x06\x02'
@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+"""校准帧识别：在整个显示器的截图中找到四角定位块，测出数据区域、缩放比例和实测颜色"""
+
+import os
+
+import numpy as np
+import pytest
+
+import bmp_to_tar
+from calibration import apply_calibration, detect_calibration
+from screen_capture import BGRA_CHANNELS, ScreenCapture, SyntheticBackend
+
+WIDTH, HEIGHT = 160, 96
+LEFT, TOP = 37, 21
+
+@pytest.fixture
+def backend():
+    return SyntheticBackend(400, 300)
+
+@pytest.fixture
+def restore_luts():
+    """测试结束后恢复校准前的颜色查找表"""
+    luts = bmp_to_tar.CLASSIFIER.lut, dict(bmp_to_tar.PALETTE_LUTS)
+    yield
+    bmp_to_tar.CLASSIFIER.lut = luts[0]
+    bmp_to_tar.PALETTE_LUTS.clear()
+    bmp_to_tar.PALETTE_LUTS.update(luts[1])
+
+def tint(pixels):
+    """显示链路整体偏色"""
+    return (pixels * 0.7 + 40).astype(np.uint8)
+
+def detect(backend):
+    with ScreenCapture(1, backend=backend) as capture:
+        return detect_calibration(capture.grab().image)
+
+def test_locates_region_and_decodes_with_measured_colors(backend, tar_to_bmp, restore_luts):
+    backend.show(tint(tar_to_bmp.render_calibration_frame(WIDTH, HEIGHT)), LEFT, TOP)
+    calibration = detect(backend)
+    assert calibration is not None
+    assert calibration.region == (LEFT, TOP, WIDTH, HEIGHT)
+    assert (calibration.width, calibration.height, calibration.cell) == (WIDTH, HEIGHT, 1)
+
+    # 偏色后白色不再满足固定阈值，按实测颜色分类才能解码
+    apply_calibration(calibration)
+    renderer = tar_to_bmp.FrameRenderer(WIDTH, HEIGHT, 1, symbol_bits=3)
+    payload = os.urandom(tar_to_bmp.frame_capacity(WIDTH, HEIGHT, symbol_bits=3))
+    backend.show(tint(renderer.render(payload, 1)), LEFT, TOP)
+    with ScreenCapture(1, calibration.region, backend=backend) as capture:
+        symbols = bmp_to_tar.image_to_symbols(capture.grab().image, BGRA_CHANNELS)
+    assert bmp_to_tar.decode_symbols(symbols)[1] == payload
+
+def test_scaled_frame_reports_capture_size(backend, tar_to_bmp):
+    pixels = tar_to_bmp.render_calibration_frame(WIDTH, HEIGHT, cell=2)
+    backend.show(pixels.repeat(2, axis=0).repeat(2, axis=1)[:, :WIDTH * 3 // 2], LEFT, TOP)
+    calibration = detect(backend)
+    assert calibration is None  # 右侧定位块被裁掉：没有围成矩形的四个定位块
+
+    backend.show(pixels.repeat(2, axis=0).repeat(2, axis=1), LEFT, TOP)
+    calibration = detect(backend)
+    assert calibration.region == (LEFT, TOP, 2 * WIDTH, 2 * HEIGHT)
+    assert (calibration.width, calibration.height, calibration.cell) == (WIDTH, HEIGHT, 2)
+
+def test_gray_clutter_does_not_move_the_region(backend, tar_to_bmp):
+    """屏幕上其他灰色像素（任务栏、灰色窗口、零散的灰色文字）不属于定位块，不影响数据区域"""
+    gray = (120, 130, 125)
+    backend.show(np.full((30, backend.width, 3), gray, dtype=np.uint8), 0, backend.height - 30)
+    backend.show(np.full((50, 40, 3), gray, dtype=np.uint8), 300, 150)
+    for x in range(0, backend.width, 9):
+        backend.show(np.full((3, 2, 3), gray, dtype=np.uint8), x, 5)
+    backend.show(tar_to_bmp.render_calibration_frame(WIDTH, HEIGHT), LEFT, TOP)
+
+    calibration = detect(backend)
+    assert calibration is not None
+    assert calibration.region == (LEFT, TOP, WIDTH, HEIGHT)
+
+def test_screen_without_calibration_frame(backend, tar_to_bmp):
+    backend.show(np.full((30, backend.width, 3), 128, dtype=np.uint8), 0, backend.height - 30)
+    renderer = tar_to_bmp.FrameRenderer(WIDTH, HEIGHT, 1)
+    backend.show(renderer.render(os.urandom(100), 1), LEFT, TOP)
+    assert detect(backend) is None
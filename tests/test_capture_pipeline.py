@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+"""流水线截图解码：单个截图的解码异常和解码进程意外退出都不会结束流水线"""
+
+import os
+import signal
+
+import numpy as np
+import pytest
+
+import capture_pipeline
+from capture_pipeline import CapturePipeline, decode_capture_job
+from screen_capture import ScreenCapture, SyntheticBackend
+
+WIDTH, HEIGHT = 120, 40
+LEFT, TOP = 5, 5
+
+@pytest.fixture
+def worker_state():
+    """在测试进程中初始化解码进程的全局状态，结束后恢复SIGINT处理"""
+    handler = signal.getsignal(signal.SIGINT)
+    capture_pipeline._init_decode_worker(WIDTH, HEIGHT, 1, None)
+    yield
+    signal.signal(signal.SIGINT, handler)
+
+def test_unexpected_error_becomes_error_result(worker_state):
+    # 只有两个通道的截图会在分类像素时抛出IndexError，而不是FrameError
+    result = decode_capture_job(1.0, np.zeros((HEIGHT, WIDTH, 2), dtype=np.uint8), True)
+    assert (result.timestamp, result.frame_number, result.data, result.symbols) == (1.0, None, None, None)
+    assert result.error.startswith('解码异常')
+
+def test_pipeline_survives_broken_process_pool(tar_to_bmp):
+    renderer = tar_to_bmp.FrameRenderer(WIDTH, HEIGHT, 1)
+    payload = os.urandom(tar_to_bmp.frame_capacity(WIDTH, HEIGHT))
+    backend = SyntheticBackend(WIDTH + 10, HEIGHT + 10)
+    backend.show(renderer.render(payload, 1), LEFT, TOP)
+
+    decoded = 0
+    errors = []
+    with CapturePipeline(lambda: ScreenCapture(1, (LEFT, TOP, WIDTH, HEIGHT), backend=backend),
+                         WIDTH, HEIGHT, interval=0.01, workers=1, keep_symbols=False) as pipeline:
+        for result, _ in pipeline.results():
+            if result.data is None:
+                errors.append(result.error)
+            elif decoded == 0:
+                # 第一帧解码成功后让解码进程退出，进程池随之损坏
+                decoded += 1
+                pipeline._executor.submit(os._exit, 1)
+            elif pipeline.restarts:
+                assert result.data == payload
+                break
+    assert pipeline.restarts == 1
+    assert all(error.startswith('解码进程异常退出') for error in errors)
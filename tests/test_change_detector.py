@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+"""帧切换检测：在合成屏幕上显示虚拟机渲染的帧，检查探测次数和触发整帧截图的时机"""
+
+import os
+import time
+
+import pytest
+
+from capture_pipeline import CapturePipeline
+from change_detector import ChangeDetector
+from screen_capture import ScreenCapture, SyntheticBackend
+
+WIDTH, HEIGHT = 160, 60
+LEFT, TOP = 5, 5
+
+class CountingBackend(SyntheticBackend):
+    """记录截图后端调用次数的合成屏幕"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.grabs = 0
+
+    def grab(self, region):
+        self.grabs += 1
+        return super().grab(region)
+
+@pytest.fixture
+def backend():
+    return CountingBackend(WIDTH + 20, HEIGHT + 20)
+
+@pytest.fixture
+def frames(tar_to_bmp):
+    """三个随机负载的数据帧：[(负载, RGB画面)]"""
+    renderer = tar_to_bmp.FrameRenderer(WIDTH, HEIGHT, 3)
+    capacity = tar_to_bmp.frame_capacity(WIDTH, HEIGHT)
+    payloads = [os.urandom(capacity) for _ in range(3)]
+    return [(payload, renderer.render(payload, number)) for number, payload in enumerate(payloads, 1)]
+
+def open_capture(backend):
+    return ScreenCapture(1, (LEFT, TOP, WIDTH, HEIGHT), backend=backend)
+
+def test_probe_grabs_once_per_poll(backend, frames):
+    backend.show(frames[0][1], LEFT, TOP)
+    detector = ChangeDetector(WIDTH, HEIGHT, WIDTH, HEIGHT)
+    with open_capture(backend) as capture:
+        for _ in range(10):
+            detector.poll(capture)
+    assert backend.grabs == 10
+    assert detector.width < WIDTH
+
+def test_new_frame_triggers_once_stable(backend, frames):
+    detector = ChangeDetector(WIDTH, HEIGHT, WIDTH, HEIGHT, stable_polls=2)
+    with open_capture(backend) as capture:
+        backend.show(frames[0][1], LEFT, TOP)
+        assert not detector.poll(capture)
+        assert detector.poll(capture)
+        detector.mark_captured()
+        assert not any(detector.poll(capture) for _ in range(5))
+
+        # 新帧只绘制了上半部分：窄条纵贯所有行，内容仍在变化，不会触发
+        backend.show(frames[1][1][:HEIGHT // 2], LEFT, TOP)
+        assert not detector.poll(capture)
+        backend.show(frames[1][1], LEFT, TOP)
+        assert not detector.poll(capture)
+        assert detector.poll(capture)
+
+def test_same_payload_with_new_header_is_a_change(backend, tar_to_bmp, frames):
+    payload = frames[0][0]
+    renderer = tar_to_bmp.FrameRenderer(WIDTH, HEIGHT, 3)
+    detector = ChangeDetector(WIDTH, HEIGHT, WIDTH, HEIGHT)
+    with open_capture(backend) as capture:
+        backend.show(renderer.render(payload, 1), LEFT, TOP)
+        first = detector.probe(capture)
+        backend.show(renderer.render(payload, 2), LEFT, TOP)
+        assert detector.probe(capture) != first
+
+def test_pipeline_captures_each_frame_on_change(backend, frames):
+    """截图间隔远大于测试时长：除了启动时的第一次截图，之后的每一帧都必须由帧切换检测触发截图"""
+    backend.show(frames[0][1], LEFT, TOP)
+    detector = ChangeDetector(WIDTH, HEIGHT, WIDTH, HEIGHT)
+    received = {}
+    with CapturePipeline(lambda: open_capture(backend), WIDTH, HEIGHT, interval=30, workers=1,
+                         keep_symbols=False, change_detector=detector) as pipeline:
+        for result, _ in pipeline.results():
+            if result.data is not None:
+                received[result.frame_number] = result.data
+            if len(received) == len(frames):
+                break
+            backend.show(frames[len(received)][1], LEFT, TOP)
+    assert received == {number: payload for number, (payload, _) in enumerate(frames, 1)}
+    assert pipeline.timeouts == 1
+    assert pipeline.changes >= len(frames) - 1
+
+def test_change_while_decoding_is_busy_is_not_lost(backend, frames):
+    """解码队列已满时出现的新帧不能记为已截图：队列空出后仍由帧切换检测触发截图"""
+    backend.show(frames[0][1], LEFT, TOP)
+    detector = ChangeDetector(WIDTH, HEIGHT, WIDTH, HEIGHT)
+    received = []
+    with CapturePipeline(lambda: open_capture(backend), WIDTH, HEIGHT, interval=30, workers=1, depth=1,
+                         keep_symbols=False, change_detector=detector) as pipeline:
+        while not pipeline._pending.full():
+            time.sleep(0.001)
+        backend.show(frames[1][1], LEFT, TOP)
+        time.sleep(0.05)
+        for result, _ in pipeline.results():
+            received.append(result.frame_number)
+            if len(received) == 2:
+                break
+    assert received == [1, 2]
+    assert (pipeline.timeouts, pipeline.changes) == (1, 1)
@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+"""颜色查找表分类器：白色/黑色规则在阈值两侧与逐像素判定一致，通道顺序不影响分类结果"""
+
+import itertools
+
+import numpy as np
+
+from bmp_to_tar import COLOR_MAP
+from color_classifier import (BLACK_SYMBOL, BLACK_THRESHOLD, CHANNEL_LEVELS, LEVEL_BOUNDS, WHITE_SYMBOL,
+                              WHITE_THRESHOLD, ColorClassifier)
+
+# 阈值本身及其两侧的通道值
+VALUES = (0, 97, 98, 99, 100, 101, 179, 180, 181, 182, 183, 255)
+# 量化区间的最大半径：像素到区间中心的距离不超过它
+MAX_OFFSET = np.sqrt(3) * max(np.diff(np.append(LEVEL_BOUNDS, 256)) - 1) / 2
+
+def reference_symbol(pixel):
+    """原有的逐像素规则：各通道都大于180为白色，都小于100为黑色，否则取最近颜色"""
+    if all(c > WHITE_THRESHOLD for c in pixel):
+        return WHITE_SYMBOL, None
+    if all(c < BLACK_THRESHOLD for c in pixel):
+        return BLACK_SYMBOL, None
+    colors = np.array(list(COLOR_MAP), dtype=np.float64)
+    distances = np.sqrt(((colors - pixel) ** 2).sum(axis=1))
+    order = np.argsort(distances)
+    return int(list(COLOR_MAP.values())[order[0]]), distances[order[1]] - distances[order[0]]
+
+def test_threshold_rules_match_per_pixel_rule():
+    classifier = ColorClassifier(COLOR_MAP)
+    pixels = np.array(list(itertools.product(VALUES, repeat=3)), dtype=np.uint8)
+    symbols = classifier.classify(pixels)
+    for pixel, symbol in zip(pixels.astype(np.float64), symbols):
+        expected, margin = reference_symbol(pixel)
+        # 最近颜色匹配按区间中心计算：只有最近与次近颜色的距离差超过区间直径时，结论才与逐像素计算必然相同
+        if margin is None or margin > 2 * MAX_OFFSET:
+            assert symbol == expected, tuple(pixel)
+
+def test_bins_do_not_straddle_thresholds():
+    assert CHANNEL_LEVELS[BLACK_THRESHOLD - 1] != CHANNEL_LEVELS[BLACK_THRESHOLD]
+    assert CHANNEL_LEVELS[WHITE_THRESHOLD] != CHANNEL_LEVELS[WHITE_THRESHOLD + 1]
+
+def test_channel_order_does_not_change_symbols():
+    classifier = ColorClassifier(COLOR_MAP)
+    rgb = np.random.default_rng(0).integers(0, 256, (40, 30, 3), dtype=np.uint8)
+    bgra = np.dstack([rgb[..., ::-1], np.full(rgb.shape[:2], 255, dtype=np.uint8)])
+    expected = classifier.classify(rgb).copy()
+    assert np.array_equal(classifier.classify(bgra, (2, 1, 0)), expected)
@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+"""跨帧纠删编码：虚拟机端生成的校验帧负载由宿主机端解析，并恢复组内任意不多于校验帧数的缺失数据帧"""
+
+import itertools
+import os
+
+import pytest
+
+from conftest import load_vm_module
+from erasure import ParityStore, parse_parity_payload
+from frame_index import FrameDigest
+from host_screenshot import recover_with_parity
+from merkle import block_hashes
+
+BLOCK_SIZE = 1024
+
+@pytest.fixture(scope='module')
+def vm_erasure():
+    return load_vm_module('erasure')
+
+@pytest.fixture(scope='module')
+def group():
+    """第11帧起的一组5个数据帧（最后一帧较短）"""
+    return {11 + i: os.urandom(3000 if i < 4 else 1234) for i in range(5)}
+
+def parity_store(vm_erasure, group, parity_count, indexes=None):
+    store = ParityStore()
+    payloads = vm_erasure.build_parity_payloads(min(group), list(group.values()), parity_count)
+    for index in (indexes if indexes is not None else range(parity_count)):
+        store.add(parse_parity_payload(payloads[index]))
+    return store
+
+@pytest.mark.parametrize('missing_count', [1, 2])
+def test_recovers_any_missing_frames(vm_erasure, group, missing_count):
+    store = parity_store(vm_erasure, group, 2)
+    for missing in itertools.combinations(group, missing_count):
+        recovered = store.recover(min(group), list(missing), group.__getitem__)
+        assert recovered == {n: group[n] for n in missing}
+
+def test_single_parity_frame_of_two_is_enough_for_one_loss(vm_erasure, group):
+    store = parity_store(vm_erasure, group, 2, indexes=[1])
+    assert store.group_of(13) == 11 and store.group_of(16) is None
+    assert store.recover(11, [13], group.__getitem__) == {13: group[13]}
+    assert store.recover(11, [12, 13], group.__getitem__) == {}
+
+def test_recover_with_parity_reads_saved_volumes(vm_erasure, group, tmp_path):
+    file_numbers = {n: f"{n:03d}" for n in group}
+    for n, payload in group.items():
+        if n != 14:
+            (tmp_path / f"example.tar.{file_numbers[n]}").write_bytes(payload)
+    remaining = {14: ('014', FrameDigest(len(group[14]), tuple(block_hashes(group[14], BLOCK_SIZE))))}
+    store = parity_store(vm_erasure, group, 1)
+    assert recover_with_parity(store, 11, remaining, file_numbers, str(tmp_path), BLOCK_SIZE) == {14: group[14]}
+
+def test_parity_ranges_follow_each_group(tar_to_bmp):
+    renderer = tar_to_bmp.FrameRenderer(160, 96, 6, parity_group=4, parity_count=1)
+    assert renderer.parity_ranges(list(range(1, 7))) == [(7, 1, 4), (8, 5, 6)]
+
+@pytest.mark.parametrize('parity, parity_group, valid', [
+    (0, 20, True), (2, 254, True), (0, 300, True),
+    (-1, 20, False), (1, 0, False), (0, -5, False), (3, 254, False),
+])
+def test_parity_settings_are_validated(tar_to_bmp, parity, parity_group, valid):
+    assert (tar_to_bmp.parity_settings_error(parity, parity_group) is None) == valid
@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+"""单元采样：放大为多像素单元的帧、被缩放或边缘模糊的截图都能还原为单元网格并解码"""
+
+import os
+
+import numpy as np
+import pytest
+
+from frame_decoder import FrameDecoder, sample_cells
+
+WIDTH, HEIGHT = 160, 96
+
+def render(tar_to_bmp, cell):
+    renderer = tar_to_bmp.FrameRenderer(WIDTH, HEIGHT, 1, cell=cell)
+    payload = os.urandom(tar_to_bmp.frame_capacity(WIDTH // cell, HEIGHT // cell))
+    return renderer.render(payload, 1), payload
+
+def decode(image, cell):
+    decoder = FrameDecoder(WIDTH // cell, HEIGHT // cell)
+    return decoder.decode_frame(sample_cells(image, WIDTH, HEIGHT, cell))
+
+def test_unscaled_single_pixel_cells_are_unchanged():
+    image = np.zeros((HEIGHT, WIDTH, 3), dtype=np.uint8)
+    assert sample_cells(image, WIDTH, HEIGHT) is image
+
+@pytest.mark.parametrize('cell', [2, 4])
+def test_cell_frame_round_trip(tar_to_bmp, cell):
+    pixels, payload = render(tar_to_bmp, cell)
+    header, data = decode(pixels, cell)
+    assert (header.frame_number, data) == (1, payload)
+
+@pytest.mark.parametrize('scale', [0.75, 1.5])
+def test_scaled_capture_is_resampled(tar_to_bmp, scale):
+    """显示链路把画面缩放后，按截图与帧的尺寸比例在单元中心取样"""
+    pixels, payload = render(tar_to_bmp, 4)
+    ys = (np.arange(int(HEIGHT * scale)) / scale).astype(np.intp)
+    xs = (np.arange(int(WIDTH * scale)) / scale).astype(np.intp)
+    _, data = decode(pixels[np.ix_(ys, xs)], 4)
+    assert data == payload
+
+def test_blurred_cell_edges_are_ignored(tar_to_bmp):
+    """单元边缘与相邻单元混色的像素不在采样区域内"""
+    pixels, payload = render(tar_to_bmp, 4)
+    blurred = pixels.astype(np.uint16)
+    blurred[:, :-1] += pixels[:, 1:]
+    blurred[:, -1] += pixels[:, -1]
+    _, data = decode((blurred // 2).astype(np.uint8), 4)
+    assert data == payload
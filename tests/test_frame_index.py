@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+"""二进制索引：虚拟机端写出、拆分为索引帧，宿主机端乱序收齐后拼接解析，得到相同的各帧摘要和清单根"""
+
+import os
+
+import numpy as np
+import pytest
+
+from bmp_to_tar import FrameHeader
+from frame_decoder import FrameDecoder
+from frame_index import IndexAssembler, IndexFormatError, IndexHeader, parse_index, read_index
+from host_screenshot import capture_index_frame
+
+WIDTH, HEIGHT = 160, 96
+BLOCK_SIZE = 1024
+
+def to_bgra(pixels):
+    """虚拟机端渲染的RGB画面转换为截图缓冲区的BGRA格式"""
+    return np.dstack([pixels[..., ::-1], np.full(pixels.shape[:2], 255, dtype=np.uint8)])
+
+@pytest.fixture(scope='module')
+def index(vm_frame_index, vm_merkle):
+    """200个随机长度分片的索引：(虚拟机端索引字节, 各分片)"""
+    rng = np.random.default_rng(0)
+    volumes = [os.urandom(int(length)) for length in rng.integers(1, 3 * BLOCK_SIZE, 200)]
+    entries = [vm_frame_index.FrameDigest(len(v), tuple(vm_merkle.block_hashes(v, BLOCK_SIZE))) for v in volumes]
+    header = vm_frame_index.IndexHeader(len(volumes), sum(map(len, volumes)), WIDTH, HEIGHT, block_size=BLOCK_SIZE)
+    return vm_frame_index.build_index(header, entries), volumes
+
+def test_host_parses_vm_index(index, vm_frame_index):
+    index_data, volumes = index
+    header, entries = parse_index(index_data)
+    assert header == IndexHeader(*vm_frame_index.parse_index(index_data)[0])
+    assert (header.frame_count, header.total_size, header.block_size) == (200, sum(map(len, volumes)), BLOCK_SIZE)
+    assert [entry.length for entry in entries] == [len(v) for v in volumes]
+
+@pytest.mark.parametrize('offset', [10, -10, -2])
+def test_corrupted_index_is_rejected(index, offset):
+    damaged = bytearray(index[0])
+    damaged[offset] ^= 0x01
+    with pytest.raises(IndexFormatError):
+        parse_index(bytes(damaged))
+
+def test_index_frames_assemble_out_of_order(index, tar_to_bmp, tmp_path):
+    """索引大于一帧容量：各索引帧乱序、重复截到，收齐后写出与虚拟机端相同的索引"""
+    index_data, volumes = index
+    frames = tar_to_bmp.render_index_frames(index_data, WIDTH, HEIGHT)
+    assert len(frames) > 1
+
+    index_path = str(tmp_path / 'index.bin')
+    decoder = FrameDecoder(WIDTH, HEIGHT)
+    assembler = IndexAssembler()
+    shown = list(reversed(frames)) + frames[:1]
+    complete = [capture_index_frame(decoder, to_bgra(pixels), assembler, index_path) for pixels in shown]
+    assert complete.index(True) == len(frames) - 1
+    with open(index_path, 'rb') as f:
+        assert f.read() == index_data
+
+    header, files = read_index(index_path)
+    assert header.frame_count == len(volumes)
+    assert [file_number for file_number, _ in files] == [f"{n:03d}" for n in range(1, len(volumes) + 1)]
+
+def test_assembler_restarts_on_new_session():
+    def part(number, total):
+        return FrameHeader(3, 2, 0, 2, number, total, 0, 0)
+
+    assembler = IndexAssembler()
+    assert assembler.add(part(1, 3), b'a')
+    assert not assembler.add(part(1, 3), b'a')
+    assert not assembler.add(part(4, 3), b'x')
+    # 分段总数变化说明虚拟机开始了新的会话，此前收集的分段作废
+    assert assembler.add(part(2, 2), b'b')
+    assert assembler.parts == {2: b'b'} and not assembler.complete
+
+def test_missing_index_file(tmp_path):
+    assert read_index(str(tmp_path / 'index.bin')) == (None, [])
@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+"""分块摘要：两端的叶子和根一致；负载CRC不匹配的截图按索引叶子报告损坏的块"""
+
+import os
+import signal
+
+import numpy as np
+import pytest
+
+import capture_pipeline
+from bmp_to_tar import FRAME_HEADER_SYMBOLS
+from capture_pipeline import decode_capture_job
+from frame_index import FrameDigest
+from host_screenshot import verify_volume
+from merkle import bad_blocks, block_hashes, merkle_root
+
+WIDTH, HEIGHT = 160, 96
+BLOCK_SIZE = 512
+
+def digest(payload):
+    return FrameDigest(len(payload), tuple(block_hashes(payload, BLOCK_SIZE)))
+
+@pytest.fixture
+def worker_state():
+    """在测试进程中初始化解码进程的全局状态，结束后恢复SIGINT处理"""
+    handler = signal.getsignal(signal.SIGINT)
+    capture_pipeline._init_decode_worker(WIDTH, HEIGHT, 1, None, BLOCK_SIZE)
+    yield
+    signal.signal(signal.SIGINT, handler)
+
+@pytest.mark.parametrize('length', [0, 1, BLOCK_SIZE, 5 * BLOCK_SIZE + 3])
+def test_host_and_vm_digests_match(vm_merkle, length):
+    data = os.urandom(length)
+    leaves = block_hashes(data, BLOCK_SIZE)
+    assert leaves == vm_merkle.block_hashes(data, BLOCK_SIZE)
+    assert merkle_root(leaves) == vm_merkle.merkle_root(leaves)
+    assert len(leaves) == vm_merkle.leaf_count(length, BLOCK_SIZE)
+
+def test_damaged_block_is_reported():
+    payload = os.urandom(4 * BLOCK_SIZE)
+    damaged = bytearray(payload)
+    damaged[2 * BLOCK_SIZE + 7] ^= 0xFF
+    assert not verify_volume(bytes(damaged), digest(payload), BLOCK_SIZE)
+    assert bad_blocks(block_hashes(bytes(damaged), BLOCK_SIZE), digest(payload).leaves) == [2]
+
+def test_missing_blocks_are_reported():
+    payload = os.urandom(3 * BLOCK_SIZE)
+    assert bad_blocks(block_hashes(payload[:BLOCK_SIZE], BLOCK_SIZE), digest(payload).leaves) == [1, 2]
+
+def test_crc_failure_reports_damaged_block(tar_to_bmp, worker_state, capsys):
+    """负载CRC不匹配的截图不返回数据，但按尽力提取的负载报告出唯一损坏的块"""
+    renderer = tar_to_bmp.FrameRenderer(WIDTH, HEIGHT, 1)
+    payload = os.urandom(4 * BLOCK_SIZE)
+    pixels = renderer.render(payload, 1)
+    # 2位符号每字节占4个像素：把第3块中一个字节的第一个像素换成另一种颜色
+    y, x = divmod(FRAME_HEADER_SYMBOLS + 4 * (2 * BLOCK_SIZE + 100), WIDTH)
+    current = tuple(int(c) for c in pixels[y, x])
+    pixels[y, x] = next(color for color in tar_to_bmp.PALETTES[2] if tuple(color) != current)
+    image = np.dstack([pixels[..., ::-1], np.full(pixels.shape[:2], 255, dtype=np.uint8)])
+
+    result = decode_capture_job(0.0, image, False)
+    assert (result.frame_number, result.data) == (1, None)
+    assert 'CRC' in result.error
+    expected = digest(payload)
+    assert bad_blocks(result.leaves, expected.leaves) == [2]
+    assert not verify_volume(result.data, expected, BLOCK_SIZE, result.leaves)
+    assert '损坏的块: [2]' in capsys.readouterr().out
@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+"""流式打包：并行压缩的多块xz流切分为分片，拼接后可按流式tar.xz解压出原始文件；索引与generate_index.py写出的一致"""
+
+import io
+import lzma
+import os
+import tarfile
+
+import pytest
+
+from conftest import load_vm_module
+from frame_index import read_index
+from host_screenshot import verify_volume
+
+@pytest.fixture(scope='module')
+def package_stream():
+    return load_vm_module('package_stream')
+
+@pytest.fixture
+def input_folder(tmp_path):
+    folder = tmp_path / 'input'
+    (folder / 'sub').mkdir(parents=True)
+    (folder / 'random.bin').write_bytes(os.urandom(300000))
+    (folder / 'sub' / 'text.txt').write_bytes(b'frame transfer\n' * 40000)
+    (folder / 'empty.txt').write_bytes(b'')
+    return folder
+
+def read_volumes(folder, count):
+    return b''.join((folder / f"example.tar.{n:03d}").read_bytes() for n in range(1, count + 1))
+
+def test_parallel_blocks_form_one_xz_stream(package_stream, input_folder, tmp_path):
+    output = tmp_path / 'output'
+    writer = package_stream.package_folder(str(input_folder), str(output), 50000, workers=3, xz_block=64 * 1024)
+    archive = read_volumes(output, writer.frame_number)
+    assert len(archive) == writer.total_bytes
+    assert [digest.length for digest in writer.digests[:-1]] == [50000] * (writer.frame_number - 1)
+
+    # 一条流、多个块：流尾部的索引记录了每个块
+    index_size = (int.from_bytes(archive[-8:-4], 'little') + 1) * 4
+    block_count = package_stream._decode_varint(archive, len(archive) - 12 - index_size + 1)[0]
+    assert archive.startswith(package_stream.XZ_HEADER_MAGIC)
+    assert block_count > 1
+
+    # 宿主机按流式方式解压
+    extract = tmp_path / 'extract'
+    with tarfile.open(fileobj=io.BytesIO(archive), mode='r|xz') as tar:
+        tar.extractall(str(extract))
+    for path in ('random.bin', 'sub/text.txt', 'empty.txt'):
+        assert (extract / 'input' / path).read_bytes() == (input_folder / path).read_bytes()
+
+def test_block_compression_matches_lzma(package_stream):
+    data = os.urandom(1000) + bytes(100000)
+    blocks, records = zip(*(package_stream.compress_xz_block(data[i:i + 40000], 1) for i in range(0, len(data), 40000)))
+    stream = (package_stream.xz_stream_header() + b''.join(blocks)
+              + package_stream.xz_stream_footer([record for block_records in records for record in block_records]))
+    assert lzma.decompress(stream) == data
+    assert lzma.decompress(package_stream.xz_stream_header() + package_stream.xz_stream_footer([])) == b''
+
+def test_index_matches_generate_index(package_stream, input_folder, tmp_path, tar_to_bmp, vm_frame_index):
+    """package_stream.py与generate_index.py共用同一个索引写入函数：同样的分片和帧参数得到相同的索引"""
+    generate_index = load_vm_module('generate_index')
+    output = tmp_path / 'output'
+    writer = package_stream.package_folder(str(input_folder), str(output), 70000, workers=2)
+    renderer = tar_to_bmp.FrameRenderer(640, 360, writer.frame_number, symbol_bits=3, cell=2)
+    renderer.save(str(tmp_path / 'frames.json'))
+    vm_frame_index.write_index(str(tmp_path / 'streamed.bin'), writer.digests, renderer)
+    generate_index.generate_index_from_folder(str(output), str(tmp_path / 'generated.bin'), str(tmp_path / 'frames.json'))
+    assert (tmp_path / 'streamed.bin').read_bytes() == (tmp_path / 'generated.bin').read_bytes()
+
+    # 宿主机读取索引，按其中的摘要校验各分片
+    index_header, files = read_index(str(tmp_path / 'streamed.bin'))
+    assert (index_header.width, index_header.height, index_header.symbol_bits, index_header.cell) == (640, 360, 3, 2)
+    for file_number, expected in files:
+        assert verify_volume((output / f"example.tar.{file_number}").read_bytes(), expected, index_header.block_size)
@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+"""高密度调色板：两端调色板一致，每像素2/3/4位的帧都能按帧头声明的调色板解码回原负载"""
+
+import os
+
+import numpy as np
+import pytest
+
+from bmp_to_tar import PALETTES, decode_symbols, image_to_symbols, symbols_to_bytes
+
+WIDTH, HEIGHT = 120, 60
+
+def test_palettes_match_vm(tar_to_bmp):
+    assert sorted(tar_to_bmp.PALETTES) == [2, 3, 4]
+    for bits, palette in PALETTES.items():
+        assert np.array_equal(tar_to_bmp.PALETTES[bits], np.array(palette, dtype=np.uint8))
+
+@pytest.mark.parametrize('symbol_bits', [2, 3, 4])
+def test_symbol_packing_round_trip(tar_to_bmp, symbol_bits):
+    data = os.urandom(301)
+    symbols = tar_to_bmp.pack_symbols(data, symbol_bits)
+    assert symbols.max() < 1 << symbol_bits
+    assert symbols_to_bytes(symbols, symbol_bits)[:len(data)] == data
+
+@pytest.mark.parametrize('symbol_bits', [2, 3, 4])
+def test_palette_frame_round_trip(tar_to_bmp, symbol_bits):
+    renderer = tar_to_bmp.FrameRenderer(WIDTH, HEIGHT, 1, symbol_bits=symbol_bits)
+    payload = os.urandom(tar_to_bmp.frame_capacity(WIDTH, HEIGHT, symbol_bits=symbol_bits))
+    header, data = decode_symbols(image_to_symbols(renderer.render(payload, 1)))
+    assert (header.symbol_bits, data) == (symbol_bits, payload)
+
+def test_denser_palettes_carry_more_data(tar_to_bmp):
+    capacities = [tar_to_bmp.frame_capacity(WIDTH, HEIGHT, symbol_bits=bits) for bits in (2, 3, 4)]
+    assert capacities[0] < capacities[1] < capacities[2]
@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+"""前向纠错：虚拟机端编码、宿主机端纠错，交织后的码字各自纠正，超出纠错能力时报错"""
+
+import os
+import signal
+
+import numpy as np
+import pytest
+
+import capture_pipeline
+from capture_pipeline import decode_capture_job
+from conftest import load_vm_module
+from reed_solomon import RS_CODEWORD_SIZE, ReedSolomonError, fec_block_count, fec_decode, fec_extract
+
+vm_reed_solomon = load_vm_module('reed_solomon')
+
+NSYM = 16
+WIDTH, HEIGHT = 160, 96
+
+def corrupt(encoded, nblocks, block, count):
+    """把第block个码字的前count个字节取反（交织后码字的第j个字节位于j * nblocks + block）"""
+    damaged = bytearray(encoded)
+    for j in range(count):
+        damaged[j * nblocks + block] ^= 0xFF
+    return bytes(damaged)
+
+@pytest.fixture
+def payload():
+    return np.random.default_rng(0).integers(0, 256, 1000, dtype=np.uint8).tobytes()
+
+def test_clean_codewords_need_no_correction(payload):
+    encoded = vm_reed_solomon.fec_encode(payload, NSYM)
+    assert len(encoded) == vm_reed_solomon.fec_encoded_size(len(payload), NSYM)
+    assert fec_extract(encoded, NSYM, len(payload)) == payload
+    assert fec_decode(encoded, NSYM, len(payload)) == (payload, 0)
+
+def test_errors_within_capacity_are_corrected(payload):
+    nblocks = fec_block_count(len(payload), NSYM)
+    encoded = vm_reed_solomon.fec_encode(payload, NSYM)
+    # 第0个码字的错误数正好等于纠错能力，第2个码字只有一个错误（在校验字节区域）
+    damaged = bytearray(corrupt(encoded, nblocks, 0, NSYM // 2))
+    damaged[(RS_CODEWORD_SIZE - 1) * nblocks + 2] ^= 0x55
+    damaged = bytes(damaged)
+    assert fec_extract(damaged, NSYM, len(payload)) != payload
+    assert fec_decode(damaged, NSYM, len(payload)) == (payload, 2)
+
+def test_errors_beyond_capacity_raise(payload):
+    nblocks = fec_block_count(len(payload), NSYM)
+    damaged = corrupt(vm_reed_solomon.fec_encode(payload, NSYM), nblocks, 1, NSYM)
+    with pytest.raises(ReedSolomonError):
+        fec_decode(damaged, NSYM, len(payload))
+
+def test_nsym_for_overhead_is_even_and_bounded():
+    assert vm_reed_solomon.fec_nsym_for_overhead(0) == 2
+    assert vm_reed_solomon.fec_nsym_for_overhead(10) % 2 == 0
+    assert vm_reed_solomon.fec_nsym_for_overhead(200) == RS_CODEWORD_SIZE - 1
+
+def test_fec_corrects_misread_pixels(tar_to_bmp):
+    """帧头之后随机误读的像素由解码进程纠正，并报告修正的码字数"""
+    fec_nsym = tar_to_bmp.fec_nsym_for_overhead(10)
+    renderer = tar_to_bmp.FrameRenderer(WIDTH, HEIGHT, 1, fec_nsym)
+    payload = os.urandom(tar_to_bmp.frame_capacity(WIDTH, HEIGHT, fec_nsym))
+    pixels = renderer.render(payload, 1)
+    rng = np.random.default_rng(1)
+    for y, x in zip(rng.integers(1, HEIGHT, 20), rng.integers(0, WIDTH, 20)):
+        current = tuple(int(c) for c in pixels[y, x])
+        pixels[y, x] = next(color for color in tar_to_bmp.PALETTES[2] if tuple(color) != current)
+    image = np.dstack([pixels[..., ::-1], np.full(pixels.shape[:2], 255, dtype=np.uint8)])
+
+    handler = signal.getsignal(signal.SIGINT)
+    try:
+        capture_pipeline._init_decode_worker(WIDTH, HEIGHT, 1, None)
+        result = decode_capture_job(0.0, image, False)
+    finally:
+        signal.signal(signal.SIGINT, handler)
+    assert (result.frame_number, result.error, result.data) == (1, '', payload)
+    assert result.corrected > 0
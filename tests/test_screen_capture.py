@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+"""常驻截图引擎：只截取数据区域（BGRA），窄条截图相对于数据区域，环形缓冲区只保留最近几帧"""
+
+import numpy as np
+import pytest
+
+from screen_capture import BGRA_CHANNELS, ScreenCapture, SyntheticBackend
+
+REGION = (5, 7, 12, 8)
+
+@pytest.fixture
+def backend():
+    backend = SyntheticBackend(40, 30)
+    pixels = np.random.default_rng(0).integers(0, 256, (REGION[3], REGION[2], 3), dtype=np.uint8)
+    backend.show(pixels, REGION[0], REGION[1])
+    backend.pixels = pixels
+    return backend
+
+def test_grab_returns_region_as_bgra(backend):
+    with ScreenCapture(1, REGION, backend=backend) as capture:
+        frame = capture.grab()
+    assert frame.image.shape == (REGION[3], REGION[2], 4)
+    assert np.array_equal(frame.image[..., list(BGRA_CHANNELS)], backend.pixels)
+    assert (frame.image[..., 3] == 255).all()
+
+def test_grab_strip_is_relative_to_region(backend):
+    with ScreenCapture(1, REGION, backend=backend) as capture:
+        strip = capture.grab_strip(3, 2)
+        assert np.array_equal(strip, capture.grab().image[:, 3:5])
+        # 窄条截图不加入环形缓冲区
+        assert len(capture.frames) == 1
+
+def test_whole_monitor_when_no_region(backend):
+    with ScreenCapture(2, backend=backend) as capture:
+        assert capture.grab().image.shape == (30, 40, 4)
+
+@pytest.mark.parametrize('monitor_id', [0, 3])
+def test_invalid_monitor_is_rejected(backend, monitor_id):
+    with pytest.raises(ValueError):
+        ScreenCapture(monitor_id, REGION, backend=backend)
+
+def test_history_keeps_latest_frames(backend):
+    with ScreenCapture(1, REGION, backend=backend, history=2) as capture:
+        assert capture.latest() is None
+        frames = [capture.grab() for _ in range(3)]
+        assert list(capture.frames) == frames[1:]
+        assert capture.latest() is frames[-1]
+    assert not capture.frames
@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+"""多次截图融合：按像素多数投票，平局以最新截图为准，不足三次截图不融合"""
+
+import os
+
+import numpy as np
+
+from bmp_to_tar import image_to_symbols
+from frame_index import FrameDigest
+from host_screenshot import verify_fused
+from merkle import block_hashes
+from symbol_fusion import SymbolFusion
+
+WIDTH, HEIGHT = 160, 96
+BLOCK_SIZE = 1024
+
+def test_majority_vote_removes_transient_errors():
+    fusion = SymbolFusion(depth=3)
+    fusion.add(np.array([0, 1, 2, 3], dtype=np.uint8))
+    fusion.add(np.array([0, 2, 2, 3], dtype=np.uint8))
+    fusion.add(np.array([1, 1, 2, 0], dtype=np.uint8))
+    assert fusion.fuse().tolist() == [0, 1, 2, 3]
+
+def test_tie_goes_to_latest_capture():
+    fusion = SymbolFusion(depth=4)
+    for symbols in ([0, 0], [1, 1], [2, 2]):
+        fusion.add(np.array(symbols, dtype=np.uint8))
+    assert fusion.fuse().tolist() == [2, 2]
+    fusion.add(np.array([1, 0], dtype=np.uint8))
+    assert fusion.fuse().tolist() == [1, 0]
+
+def test_fusion_needs_three_captures():
+    fusion = SymbolFusion(depth=2)
+    fusion.add(np.zeros(8, dtype=np.uint8))
+    fusion.add(np.ones(8, dtype=np.uint8))
+    assert fusion.fuse() is None
+
+def test_shape_change_resets_history():
+    fusion = SymbolFusion(depth=3)
+    fusion.add(np.zeros(8, dtype=np.uint8))
+    fusion.add(np.zeros(8, dtype=np.uint8))
+    fusion.add(np.zeros(6, dtype=np.uint8))
+    assert len(fusion.history) == 1
+
+def test_fusion_recovers_from_transient_noise(tar_to_bmp):
+    """每次截图的误读像素位置不同：单次截图都无法解码，三次截图投票融合后通过摘要校验"""
+    renderer = tar_to_bmp.FrameRenderer(WIDTH, HEIGHT, 1)
+    payload = os.urandom(tar_to_bmp.frame_capacity(WIDTH, HEIGHT))
+    pixels = renderer.render(payload, 1)
+    expected = FrameDigest(len(payload), tuple(block_hashes(payload, BLOCK_SIZE)))
+
+    fusion = SymbolFusion(depth=3)
+    fused = []
+    for seed in range(3):
+        rng = np.random.default_rng(seed)
+        noisy = pixels.copy()
+        for y, x in zip(rng.integers(1, HEIGHT, 10), rng.integers(0, WIDTH, 10)):
+            current = tuple(int(c) for c in noisy[y, x])
+            noisy[y, x] = next(color for color in tar_to_bmp.PALETTES[2] if tuple(color) != current)
+        fused.append(verify_fused(fusion, image_to_symbols(noisy).copy(), '001', expected, BLOCK_SIZE))
+    assert fused == [None, None, payload]
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+确认位图监视
+宿主机每确认一帧就原子地改写传输路径中的确认位图（第n帧对应第n位，字节内低位在前），
+虚拟机在Linux上用inotify等待该文件变化，其他平台或共享文件夹收不到事件时退化为自适应轮询
+"""
+
+import ctypes
+import ctypes.util
+import os
+import select
+import sys
+import time
+from typing import Optional
+
+# inotify常量（见linux/inotify.h）
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+def _open_inotify(directory: str) -> Optional[int]:
+    """创建监视目录的inotify描述符，不支持时返回None"""
+    if not sys.platform.startswith('linux'):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if fd < 0:
+            return None
+        mask = IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+        if libc.inotify_add_watch(fd, os.fsencode(directory), mask) < 0:
+            os.close(fd)
+            return None
+        return fd
+    except (OSError, AttributeError):
+        return None
+
+def is_acked(bitmap: bytes, frame_number: int) -> bool:
+    """位图中第frame_number帧是否已确认"""
+    byte_index = frame_number >> 3
+    return byte_index < len(bitmap) and bool(bitmap[byte_index] & (1 << (frame_number & 7)))
+
+class AckWatcher:
+    """读取确认位图，并等待指定帧被确认"""
+
+    def __init__(self, directory: str, filename: str = 'ack.bin',
+                 min_interval: float = 0.005, max_interval: float = 0.25):
+        self.path = os.path.join(directory, filename)
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self._fd = _open_inotify(directory) if os.path.isdir(directory) else None
+        if self._fd is not None:
+            print("确认文件监视: 使用inotify")
+        else:
+            print("确认文件监视: 使用自适应轮询")
+
+    def read(self) -> bytes:
+        """读取确认位图，文件不存在或不可读时视为空位图"""
+        try:
+            with open(self.path, 'rb') as f:
+                return f.read()
+        except (IOError, OSError):
+            return b''
+
+    def is_acked(self, frame_number: int) -> bool:
+        return is_acked(self.read(), frame_number)
+
+    def _wait_event(self, timeout: float) -> None:
+        """等待目录变化或超时（共享文件夹可能收不到inotify事件，因此始终带超时）"""
+        if self._fd is None:
+            time.sleep(timeout)
+            return
+        readable, _, _ = select.select([self._fd], [], [], timeout)
+        if readable:
+            try:
+                while os.read(self._fd, 4096):
+                    pass
+            except BlockingIOError:
+                pass
+
+    def wait_for(self, frame_number: int, timeout: Optional[float] = None) -> bool:
+        """等待第frame_number帧被确认，超时返回False；轮询间隔从min_interval逐步增大到max_interval"""
+        deadline = None if timeout is None else time.time() + timeout
+        interval = self.min_interval
+        while not self.is_acked(frame_number):
+            if deadline is not None:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    return False
+                interval = min(interval, remaining)
+            self._wait_event(interval)
+            interval = min(interval * 1.5, self.max_interval)
+        return True
+
+    def close(self) -> None:
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
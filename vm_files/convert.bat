@@ -4,7 +4,6 @@ cls
 
 :: Python 3·Ըʵ
 set "PYTHONEXE=C:\Program Files\Python36\python.exe"
-set "SEVENZIP=C:\Program Files\7-Zip\7z.exe"
 
 :: Python 3Ƿ
 "%PYTHONEXE%" --version >nul 2>&1
@@ -15,14 +14,6 @@ if errorlevel 1 (
     goto End
 )
 
-:: 7-ZipǷ
-if not exist "%SEVENZIP%" (
-    echo Error: 7-Zip not found at %SEVENZIP%
-    echo Please install 7-Zip or update the SEVENZIP path.
-    pause
-    goto End
-)
-
 ::Set default type value
 set "choice=1"
 
@@ -44,14 +35,12 @@ if "%choice%"=="1" (
     set /a HEIGHT=1070
     set "RESOLUTION=1080P"
     set "SURFFIX="
-    set /a THRESHOLD=!WIDTH!*!HEIGHT!/4
 )
 if "%choice%"=="2" (
     set /a WIDTH=2550
     set /a HEIGHT=1590
     set "RESOLUTION=4K"
     set "SURFFIX=_4K"
-    set /a THRESHOLD=!WIDTH!*!HEIGHT!/4
 )
 if "%choice%"=="3" (
     echo.
@@ -61,28 +50,43 @@ if "%choice%"=="3" (
     if "!HEIGHT!"=="" set "HEIGHT=1470"
     set "RESOLUTION=Custom"
     set "SURFFIX=_custom"
-    set /a THRESHOLD=!WIDTH!*!HEIGHT!/4
 )
 if "%choice%"=="4" goto Exit
 
+echo.
+set "FEC=0"
+set /p FEC="Reed-Solomon error correction overhead in percent, e.g. 10 (default 0 = off): "
+if "!FEC!"=="" set "FEC=0"
+set "BITS=2"
+set /p BITS="Bits per pixel: 2 = 4 colors, 3 = 8 colors, 4 = 16 colors (default 2, use 3/4 only on lossless displays): "
+if "!BITS!"=="" set "BITS=2"
+set "CELL=1"
+set /p CELL="Pixels per symbol cell edge, e.g. 3 if the display path scales or blurs (default 1): "
+if "!CELL!"=="" set "CELL=1"
+set "PARITY=0"
+set /p PARITY="Parity frames per group of 20 data frames, e.g. 2 (default 0 = off): "
+if "!PARITY!"=="" set "PARITY=0"
+
+:: Payload capacity per frame (frame size minus the frame header and error correction)
+for /f "usebackq" %%C in (`"%PYTHONEXE%" "%cd%\tar_to_bmp.py" --capacity --width !WIDTH! --height !HEIGHT! --fec !FEC! --parity !PARITY! --bits !BITS! --cell !CELL!`) do set "THRESHOLD=%%C"
+
 echo.
 echo Selected resolution: %RESOLUTION% (!WIDTH!x!HEIGHT!)
-echo Threshold size: %THRESHOLD% bytes
+echo Error correction overhead: !FEC!%%
+echo Bits per pixel: !BITS!
+echo Symbol cell: !CELL!x!CELL! pixels
+echo Parity frames per 20 data frames: !PARITY!
+echo Frame payload size: %THRESHOLD% bytes
 echo.
 
 :: ļ·
 set "SOURCE_FOLDER=%cd%\input"
 set "SHELL_FOLDER=%cd%"
 set "OUTPUT_FOLDER=%cd%\output"
-set "TEMP_FOLDER=%cd%\temp"
-set "SEVENZ_FILE=%TEMP_FOLDER%\files_compressed.7z"
-set "TAR_FILE=%TEMP_FOLDER%\example.tar"
 
 :: ʱļ
 echo Cleaning up previous files...
-rd /s /q "%TEMP_FOLDER%" 2>nul
 rd /s /q "%OUTPUT_FOLDER%" 2>nul
-if not exist "%TEMP_FOLDER%" mkdir "%TEMP_FOLDER%"
 if not exist "%OUTPUT_FOLDER%" mkdir "%OUTPUT_FOLDER%"
 
 :: ļǷ
@@ -103,77 +107,29 @@ if errorlevel 1 (
 )
 
 echo.
-echo Step 1: Compressing files with 7-Zip...
-"%SEVENZIP%" a -r -t7z -mx9 -m0=LZMA2:d=27:mt=4:fb=64 "%SEVENZ_FILE%" "%SOURCE_FOLDER%"
+echo Step 1: Packaging the input folder into frame-sized TAR volumes...
+"%PYTHONEXE%" "%SHELL_FOLDER%\package_stream.py" --input "%SOURCE_FOLDER%" --output "%OUTPUT_FOLDER%" --width !WIDTH! --height !HEIGHT! --fec !FEC! --parity !PARITY! --bits !BITS! --cell !CELL!
 if errorlevel 1 (
-    echo Error: Failed to compress files with 7-Zip.
+    echo Error: Failed to package the input folder.
     pause
     goto End
 )
 
-:: ȡļС
-for %%F in ("%SEVENZ_FILE%") do set "FILE_SIZE=%%~zF"
-echo File size: %FILE_SIZE% bytes
-echo Threshold: %THRESHOLD% bytes
-
 echo.
-echo Step 2: Creating TAR file...
-if %FILE_SIZE% GTR %THRESHOLD% (
-    echo File size exceeds threshold, creating split TAR files...
-    "%SEVENZIP%" a -ttar -v%THRESHOLD% "%TAR_FILE%" "%SEVENZ_FILE%"
-    if errorlevel 1 (
-        echo Error: Failed to create split TAR files.
-        pause
-        goto End
-    )
-    
-    echo.
-    echo Step 3: Converting to BMP using optimized multi-file script...
-    "%PYTHONEXE%" "%SHELL_FOLDER%\tar_to_bmp.py" --folder temp --width !WIDTH! --height !HEIGHT!
-    
-    :: index.txtļ
-    echo.
-    echo Step 4: Generating index.txt file...
-    "%PYTHONEXE%" "%SHELL_FOLDER%\generate_index.py" --folder temp --output "%OUTPUT_FOLDER%\index.txt"
-    
-    :: index.txtתΪindex.bmp
-    echo.
-    echo Step 5: Converting index.txt to index.bmp...
-    "%PYTHONEXE%" "%SHELL_FOLDER%\txt_to_bmp.py" --input "%OUTPUT_FOLDER%\index.txt" --output "%OUTPUT_FOLDER%\index.bmp" --width !WIDTH! --height !HEIGHT!
-    
-) else (
-    echo File size within threshold, creating single TAR file...
-    "%SEVENZIP%" a -ttar "%TAR_FILE%" "%SEVENZ_FILE%"
-    if errorlevel 1 (
-        echo Error: Failed to create TAR file.
-        pause
-        goto End
-    )
-    
-    echo.
-    echo Step 3: Converting to BMP using optimized script...
-    "%PYTHONEXE%" "%SHELL_FOLDER%\tar_to_bmp.py" --input "%TAR_FILE%" --output "%OUTPUT_FOLDER%\output.001.bmp" --width !WIDTH! --height !HEIGHT!
-    
-    :: index.txtļ
-    echo.
-    echo Step 4: Generating index.txt file...
-    "%PYTHONEXE%" "%SHELL_FOLDER%\generate_index.py" --input "%TAR_FILE%" --output "%OUTPUT_FOLDER%\index.txt"
-    
-    :: index.txtתΪindex.bmp
-    echo.
-    echo Step 5: Converting index.txt to index.bmp...
-    "%PYTHONEXE%" "%SHELL_FOLDER%\txt_to_bmp.py" --input "%OUTPUT_FOLDER%\index.txt" --output "%OUTPUT_FOLDER%\index.bmp" --width !WIDTH! --height !HEIGHT!
-)
-
+echo Step 2: Rendering index.bin as index frames (index.bmp, index.002.bmp, ...)...
+"%PYTHONEXE%" "%SHELL_FOLDER%\tar_to_bmp.py" --index-frames "%OUTPUT_FOLDER%\index.bin" --output "%OUTPUT_FOLDER%\index.bmp" --width !WIDTH! --height !HEIGHT! --fec !FEC! --cell !CELL!
 if errorlevel 1 (
-    echo Error: Failed to convert TAR to BMP.
+    echo Error: Failed to render the index frames.
     pause
     goto End
 )
 
 echo.
-echo Step 6: Cleaning up temporary files...
-rd /s /q "%TEMP_FOLDER%"
+echo Step 3: Generating calibration.bmp...
+"%PYTHONEXE%" "%SHELL_FOLDER%\tar_to_bmp.py" --calibration --output "%OUTPUT_FOLDER%\calibration.bmp" --width !WIDTH! --height !HEIGHT! --cell !CELL!
+
+echo.
+echo Step 4: Cleaning up the input folder...
 rd /s /q "%SOURCE_FOLDER%"
 mkdir "%SOURCE_FOLDER%"
 
@@ -185,7 +141,7 @@ echo Resolution: %RESOLUTION% (!WIDTH!x!HEIGHT!)
 echo Output folder: %OUTPUT_FOLDER%
 echo.
 echo Files have been converted successfully.
-echo Check the output folder for your BMP files.
+echo The output folder holds the TAR volumes, frames.json, index.bin, the index frames and calibration.bmp.
 echo.
 
 goto End
@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+跨帧纠删编码（编码端）
+每N个数据帧为一组，生成K个校验帧：校验分片 = 柯西矩阵 × 数据分片（GF(2^8)，与帧内纠错使用同一张乘法表），
+宿主机截到同组N+K帧中的任意N帧即可恢复缺失的数据帧
+"""
+
+import struct
+from typing import List
+
+import numpy as np
+
+from reed_solomon import GF_EXP, GF_LOG, GF_MUL
+
+# 校验帧负载前缀：组内第一个数据帧编号、组内数据帧数、校验帧序号、组内校验帧数，之后是组内各数据帧的负载长度
+PARITY_PREFIX_STRUCT = struct.Struct('<IHHH')
+PARITY_LENGTH_STRUCT = struct.Struct('<I')
+
+# 柯西矩阵要求组内数据帧和校验帧共用256个不同的域元素
+MAX_GROUP_FRAMES = 256
+
+def parity_prefix_size(group_size: int) -> int:
+    """校验帧负载前缀的字节数"""
+    return PARITY_PREFIX_STRUCT.size + PARITY_LENGTH_STRUCT.size * group_size
+
+def cauchy_matrix(parity_count: int, data_count: int) -> np.ndarray:
+    """(K, N)柯西矩阵 C[j][i] = 1 / (j ^ (K + i))，任意N行的[I; C]子矩阵均可逆"""
+    if parity_count + data_count > MAX_GROUP_FRAMES:
+        raise ValueError(f"每组数据帧与校验帧总数不能超过 {MAX_GROUP_FRAMES}")
+    rows = np.arange(parity_count)[:, np.newaxis]
+    columns = parity_count + np.arange(data_count)[np.newaxis, :]
+    return GF_EXP[255 - GF_LOG[rows ^ columns]].astype(np.uint8)
+
+def build_parity_payloads(first_frame: int, data_payloads: List[bytes], parity_count: int) -> List[bytes]:
+    """为一组数据帧负载生成parity_count个校验帧负载（前缀 + 校验分片，分片长度为组内最长负载）"""
+    data_count = len(data_payloads)
+    shard_size = max(len(payload) for payload in data_payloads)
+    shards = np.zeros((data_count, shard_size), dtype=np.uint8)
+    for i, payload in enumerate(data_payloads):
+        shards[i, :len(payload)] = np.frombuffer(payload, dtype=np.uint8)
+
+    matrix = cauchy_matrix(parity_count, data_count)
+    lengths = b''.join(PARITY_LENGTH_STRUCT.pack(len(payload)) for payload in data_payloads)
+    payloads = []
+    for j in range(parity_count):
+        parity = np.zeros(shard_size, dtype=np.uint8)
+        for i in range(data_count):
+            parity ^= GF_MUL[matrix[j, i]][shards[i]]
+        prefix = PARITY_PREFIX_STRUCT.pack(first_frame, data_count, j, parity_count)
+        payloads.append(prefix + lengths + parity.tobytes())
+    return payloads
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+二进制索引（分块哈希清单）
+取代文本index.txt（每行“三位编号,MD5”，最多999帧）：定长索引头（帧数、总字节数、编码参数、分块大小、清单根）之后
+依次是每帧的长度和该帧按merkle.py分块得到的全部叶子摘要，帧编号即顺序（从1开始），没有帧数上限；
+每帧的根由其叶子算出，所有帧的根再组成一棵树，其根记录在索引头中，两端只需比对清单根即可确认索引一致；
+索引超过一帧的容量时拆分为多个索引帧（由tar_to_bmp.py --index-frames渲染），每个索引帧都带帧头（索引帧标志、分段编号、分段总数），宿主机按帧头收齐所有分段后拼接
+"""
+
+import os
+import struct
+import zlib
+from typing import List, NamedTuple, Optional, Sequence, Tuple
+from merkle import BLOCK_SIZE, DIGEST_SIZE, leaf_count, merkle_root
+
+# 索引头：魔数、版本、摘要字节数、帧数、总字节数、帧宽、帧高、纠错校验字节数、每像素位数、单元边长、
+# 校验帧分组大小、每组校验帧数、分块大小、清单根；每帧为长度 + 叶子摘要；索引末尾是覆盖之前所有字节的CRC32
+INDEX_MAGIC = b'QI'
+INDEX_VERSION = 2
+INDEX_HEADER_STRUCT = struct.Struct('<2sBBIQHHBBBHBI%ds' % DIGEST_SIZE)
+ENTRY_LENGTH_STRUCT = struct.Struct('<I')
+INDEX_CRC_STRUCT = struct.Struct('<I')
+
+class IndexFormatError(ValueError):
+    """索引格式错误、CRC或清单根不匹配"""
+
+class IndexHeader(NamedTuple):
+    """索引头；编码参数未知时为0，清单根由build_index填写"""
+    frame_count: int
+    total_size: int
+    width: int = 0
+    height: int = 0
+    fec_nsym: int = 0
+    symbol_bits: int = 0
+    cell: int = 0
+    parity_group: int = 0
+    parity_count: int = 0
+    block_size: int = BLOCK_SIZE
+    root: bytes = bytes(DIGEST_SIZE)
+
+class FrameDigest(NamedTuple):
+    """一帧（TAR分片）的长度和按block_size分块的叶子摘要"""
+    length: int
+    leaves: Tuple[bytes, ...]
+
+    @property
+    def root(self) -> bytes:
+        return merkle_root(self.leaves)
+
+def build_index(header: IndexHeader, entries: Sequence[FrameDigest]) -> bytes:
+    """按帧编号顺序的各帧摘要构建二进制索引，清单根由各帧的根算出"""
+    if len(entries) != header.frame_count:
+        raise IndexFormatError(f"摘要数 {len(entries)} 与帧数 {header.frame_count} 不一致")
+    parts = []
+    for entry in entries:
+        if len(entry.leaves) != leaf_count(entry.length, header.block_size):
+            raise IndexFormatError(f"长度 {entry.length} 的分片应有 {leaf_count(entry.length, header.block_size)} 个叶子")
+        parts.append(ENTRY_LENGTH_STRUCT.pack(entry.length))
+        parts.extend(entry.leaves)
+    header = header._replace(root=merkle_root([entry.root for entry in entries]))
+    body = INDEX_HEADER_STRUCT.pack(INDEX_MAGIC, INDEX_VERSION, DIGEST_SIZE, *header) + b''.join(parts)
+    return body + INDEX_CRC_STRUCT.pack(zlib.crc32(body))
+
+def is_binary_index(data: bytes) -> bool:
+    return data[:2] == INDEX_MAGIC
+
+def parse_index(data: bytes) -> Tuple[IndexHeader, List[FrameDigest]]:
+    """解析二进制索引并校验CRC和清单根，返回(索引头, 按帧编号顺序的各帧摘要)"""
+    if len(data) < INDEX_HEADER_STRUCT.size + INDEX_CRC_STRUCT.size or not is_binary_index(data):
+        raise IndexFormatError("不是二进制索引")
+    magic, version, digest_size, *fields = INDEX_HEADER_STRUCT.unpack_from(data)
+    if version != INDEX_VERSION or digest_size != DIGEST_SIZE:
+        raise IndexFormatError(f"不支持的索引版本 {version}")
+    header = IndexHeader(*fields)
+    end = len(data) - INDEX_CRC_STRUCT.size
+    if zlib.crc32(data[:end]) != INDEX_CRC_STRUCT.unpack_from(data, end)[0]:
+        raise IndexFormatError("索引CRC不匹配")
+    if header.block_size <= 0:
+        raise IndexFormatError(f"无效的分块大小 {header.block_size}")
+    entries = []
+    offset = INDEX_HEADER_STRUCT.size
+    for _ in range(header.frame_count):
+        if offset + ENTRY_LENGTH_STRUCT.size > end:
+            raise IndexFormatError(f"索引在第 {len(entries) + 1} 帧处截断")
+        length, = ENTRY_LENGTH_STRUCT.unpack_from(data, offset)
+        offset += ENTRY_LENGTH_STRUCT.size
+        leaves_end = offset + leaf_count(length, header.block_size) * DIGEST_SIZE
+        if leaves_end > end:
+            raise IndexFormatError(f"索引在第 {len(entries) + 1} 帧处截断")
+        entries.append(FrameDigest(length, tuple(data[i:i + DIGEST_SIZE] for i in range(offset, leaves_end, DIGEST_SIZE))))
+        offset = leaves_end
+    if offset != end:
+        raise IndexFormatError(f"索引长度 {len(data)} 与帧数 {header.frame_count} 不符")
+    if merkle_root([entry.root for entry in entries]) != header.root:
+        raise IndexFormatError("清单根不匹配")
+    return header, entries
+
+def read_index(index_path: str) -> List[Tuple[str, str]]:
+    """读取索引文件，返回(文件编号, 该帧的根摘要)列表，文件编号至少三位"""
+    with open(index_path, 'rb') as f:
+        _, entries = parse_index(f.read())
+    return [(f"{frame_number:03d}", entry.root.hex()) for frame_number, entry in enumerate(entries, 1)]
+
+def index_frame_path(first_path: str, part: int) -> str:
+    """第part个索引帧的图片路径：第1段为first_path（如index.bmp），之后为index.002.bmp、index.003.bmp……"""
+    if part == 1:
+        return first_path
+    root, ext = os.path.splitext(first_path)
+    return f"{root}.{part:03d}{ext}"
+
+def write_index(output_path: str, entries: Sequence[FrameDigest], renderer: Optional[object] = None) -> None:
+    """
+    按帧编号顺序（从1开始）的各帧摘要写入二进制索引，package_stream.py和generate_index.py共用；
+    编码参数取自renderer（tar_to_bmp.FrameRenderer），未指定时为0
+    """
+    settings = {}
+    if renderer is not None:
+        settings = {name: getattr(renderer, name) for name in IndexHeader._fields if hasattr(renderer, name)}
+    header = IndexHeader(len(entries), sum(entry.length for entry in entries), **settings)
+    with open(output_path, 'wb') as f:
+        f.write(build_index(header, entries))
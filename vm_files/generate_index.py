@@ -1,71 +1,81 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 """
-生成index.txt文件，记录文件名和MD5值
+生成二进制索引文件index.bin，记录文件编号和每个文件的分块摘要（见frame_index.py、merkle.py，没有999帧的上限）
 """
 
 import os
-import hashlib
 import argparse
 import re
-from typing import List, Tuple
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing import cpu_count
+from typing import List, Optional, Tuple
+from frame_index import FrameDigest, write_index
+from merkle import BLOCK_SIZE, leaf_hash, merkle_root
+from tar_to_bmp import FrameRenderer
 
-def calculate_md5(file_path: str) -> str:
-    """计算文件的MD5值"""
-    hash_md5 = hashlib.md5()
+def calculate_block_hashes(file_path: str, block_size: int) -> List[bytes]:
+    """按block_size分块读取文件并计算每块的叶子摘要"""
+    leaves = []
     with open(file_path, "rb") as f:
-        for chunk in iter(lambda: f.read(4096), b""):
-            hash_md5.update(chunk)
-    return hash_md5.hexdigest()
+        for block in iter(lambda: f.read(block_size), b""):
+            leaves.append(leaf_hash(block))
+    return leaves or [leaf_hash(b"")]
 
-def generate_index_from_folder(folder_path: str, output_path: str) -> None:
-    """从文件夹中的TAR文件生成index.txt"""
-    pattern = re.compile(r'^example\.tar\.(\d{3})$')
+def frame_digests(tar_files: List[Tuple[str, str, List[bytes]]]) -> List[FrameDigest]:
+    """按(文件编号, 文件路径, 分块摘要)列表得到各帧摘要；索引中的帧编号即顺序，要求文件编号从1开始连续"""
+    numbers = [int(file_number) for file_number, _, _ in tar_files]
+    if numbers != list(range(1, len(numbers) + 1)):
+        raise ValueError("二进制索引要求文件编号从001开始连续")
+    return [FrameDigest(os.path.getsize(file_path), tuple(leaves)) for _, file_path, leaves in tar_files]
+
+def generate_index_from_folder(folder_path: str, output_path: str, settings_path: Optional[str] = None) -> None:
+    """从文件夹中的TAR文件生成索引文件，各文件在线程池中并行计算分块摘要"""
+    pattern = re.compile(r'^example\.tar\.(\d{3,})$')
     
     # 收集所有TAR文件
-    tar_files = []
+    tar_paths = []
     for filename in os.listdir(folder_path):
         match = pattern.match(filename)
         if match:
-            file_path = os.path.join(folder_path, filename)
-            file_number = match.group(1)
-            md5_value = calculate_md5(file_path)
-            tar_files.append((file_number, file_path, md5_value))
+            tar_paths.append((match.group(1), os.path.join(folder_path, filename)))
     
     # 按文件编号排序
-    tar_files.sort(key=lambda x: x[0])
+    tar_paths.sort(key=lambda x: int(x[0]))
+    
+    with ThreadPoolExecutor(max_workers=cpu_count()) as executor:
+        all_leaves = executor.map(lambda item: calculate_block_hashes(item[1], BLOCK_SIZE), tar_paths)
+        tar_files = [(file_number, file_path, leaves) for (file_number, file_path), leaves in zip(tar_paths, all_leaves)]
     
-    # 写入index.txt文件
-    with open(output_path, 'w', encoding='utf-8') as f:
-        for file_number, file_path, md5_value in tar_files:
-            f.write(f"{file_number},{md5_value}\n")
+    write_index(output_path, frame_digests(tar_files), FrameRenderer.load(settings_path) if settings_path else None)
     
-    print(f"Generated index.txt with {len(tar_files)} files")
-    for file_number, _, md5_value in tar_files:
-        print(f"  File {file_number}: {md5_value}")
+    print(f"Generated {output_path} with {len(tar_files)} files")
+    for file_number, _, leaves in tar_files:
+        print(f"  File {file_number}: {merkle_root(leaves).hex()} ({len(leaves)} blocks)")
 
-def generate_index_from_single_file(file_path: str, output_path: str) -> None:
-    """从单个TAR文件生成index.txt"""
-    md5_value = calculate_md5(file_path)
+def generate_index_from_single_file(file_path: str, output_path: str, settings_path: Optional[str] = None) -> None:
+    """从单个TAR文件生成索引文件"""
+    leaves = calculate_block_hashes(file_path, BLOCK_SIZE)
     
-    with open(output_path, 'w', encoding='utf-8') as f:
-        f.write(f"001,{md5_value}\n")
+    write_index(output_path, frame_digests([("001", file_path, leaves)]),
+                FrameRenderer.load(settings_path) if settings_path else None)
     
-    print(f"Generated index.txt for single file")
-    print(f"  File 001: {md5_value}")
+    print(f"Generated {output_path} for single file")
+    print(f"  File 001: {merkle_root(leaves).hex()} ({len(leaves)} blocks)")
 
 if __name__ == '__main__':
-    parser = argparse.ArgumentParser(description='Generate index.txt file with file names and MD5 values')
+    parser = argparse.ArgumentParser(description='Generate the binary index file (index.bin) with file numbers and block digests')
     parser.add_argument('--folder', help='Input folder path containing TAR files')
     parser.add_argument('--input', '-i', help='Input single TAR file path')
-    parser.add_argument('--output', '-o', required=True, help='Output index.txt file path')
+    parser.add_argument('--output', '-o', required=True, help='Output index file path (index.bin)')
+    parser.add_argument('--settings', help='frames.json whose codec parameters are recorded in the binary index')
     
     args = parser.parse_args()
     
     if args.folder:
-        generate_index_from_folder(args.folder, args.output)
+        generate_index_from_folder(args.folder, args.output, args.settings)
     elif args.input:
-        generate_index_from_single_file(args.input, args.output)
+        generate_index_from_single_file(args.input, args.output, args.settings)
     else:
         print("Error: Please specify either --folder or --input")
-        exit(1) 
\ No newline at end of file
+        exit(1)
@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+流式打包：把input文件夹打包压缩为一条tar.xz流，边压缩边按单帧负载容量切分为分片example.tar.NNN
+取代7-Zip压缩和分卷两个步骤，不生成中间压缩包；每个分片写满后立即落盘并在内存中记录分块摘要（见merkle.py），
+打包结束后写出二进制索引index.bin；宿主机收齐后按编号顺序拼接所有分片即得到原始的tar.xz压缩包
+压缩按固定大小的块在线程池中并行进行（与xz -T相同，各块独立压缩后拼成一条多块xz流，lzma压缩时释放GIL），
+打包时间随CPU核数缩短；播放仍在打包完成后才开始：索引和每个帧头中的总帧数都需要最终的分片数
+"""
+
+import os
+import time
+import lzma
+import struct
+import tarfile
+import zlib
+import argparse
+from collections import deque
+from concurrent.futures import Executor, ThreadPoolExecutor
+from multiprocessing import cpu_count
+from typing import List, Optional, Tuple
+from tar_to_bmp import FrameRenderer, PALETTES, frame_capacity, parity_settings_error
+from frame_index import FrameDigest, write_index
+from merkle import BLOCK_SIZE, block_hashes, merkle_root
+from reed_solomon import fec_nsym_for_overhead
+
+# xz预设：各块并行压缩后，1仍在速度和压缩率之间折中；预设越高每个线程占用的内存越多
+DEFAULT_PRESET = 1
+
+# 各预设的字典大小；与xz -T一样，每块为字典大小的3倍（最大24MiB，限制在途块占用的内存）
+PRESET_DICT_SIZES = (256 << 10, 1 << 20, 2 << 20, 4 << 20, 4 << 20, 8 << 20, 8 << 20, 16 << 20, 32 << 20, 64 << 20)
+MAX_XZ_BLOCK_SIZE = 24 << 20
+
+# xz流的魔数和校验类型（各块统一使用CRC64）
+XZ_HEADER_MAGIC = b'\xfd7zXZ\x00'
+XZ_FOOTER_MAGIC = b'YZ'
+XZ_CHECK = lzma.CHECK_CRC64
+XZ_STREAM_FLAGS = bytes([0, XZ_CHECK])
+
+def xz_block_size(preset: int) -> int:
+    """并行压缩时每块的未压缩字节数"""
+    return min(3 * PRESET_DICT_SIZES[preset], MAX_XZ_BLOCK_SIZE)
+
+def _encode_varint(value: int) -> bytes:
+    """xz索引中的变长整数：每字节7位，低位在前"""
+    encoded = bytearray()
+    while value >= 0x80:
+        encoded.append(value & 0x7F | 0x80)
+        value >>= 7
+    encoded.append(value)
+    return bytes(encoded)
+
+def _decode_varint(data: bytes, position: int) -> Tuple[int, int]:
+    """解码变长整数，返回(值, 下一个位置)"""
+    value = shift = 0
+    while True:
+        byte = data[position]
+        position += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, position
+        shift += 7
+
+def compress_xz_block(data: bytes, preset: int) -> Tuple[bytes, List[Tuple[int, int]]]:
+    """
+    把一段数据独立压缩为xz流，取出其中的块：返回(块字节, 索引记录[(未填充大小, 未压缩大小)])
+    在线程池中调用，lzma压缩期间释放GIL
+    """
+    stream = lzma.compress(data, format=lzma.FORMAT_XZ, check=XZ_CHECK, preset=preset)
+    # 流尾部：索引CRC之后是4字节CRC32、4字节backward size（索引字节数 / 4 - 1）、2字节流标志和魔数
+    index_size = (struct.unpack_from('<I', stream, len(stream) - 8)[0] + 1) * 4
+    index_start = len(stream) - 12 - index_size
+    count, position = _decode_varint(stream, index_start + 1)
+    records = []
+    for _ in range(count):
+        unpadded_size, position = _decode_varint(stream, position)
+        uncompressed_size, position = _decode_varint(stream, position)
+        records.append((unpadded_size, uncompressed_size))
+    return stream[12:index_start], records
+
+def xz_stream_header() -> bytes:
+    return XZ_HEADER_MAGIC + XZ_STREAM_FLAGS + struct.pack('<I', zlib.crc32(XZ_STREAM_FLAGS))
+
+def xz_stream_footer(records: List[Tuple[int, int]]) -> bytes:
+    """为拼接起来的所有块写出xz索引和流尾部"""
+    index = bytearray(b'\x00' + _encode_varint(len(records)))
+    for unpadded_size, uncompressed_size in records:
+        index += _encode_varint(unpadded_size) + _encode_varint(uncompressed_size)
+    index += bytes(-len(index) % 4)
+    index += struct.pack('<I', zlib.crc32(index))
+    backward = struct.pack('<I', len(index) // 4 - 1) + XZ_STREAM_FLAGS
+    return bytes(index) + struct.pack('<I', zlib.crc32(backward)) + backward + XZ_FOOTER_MAGIC
+
+class ParallelXZWriter:
+    """
+    可写文件对象：把写入的字节流按固定大小分块，在线程池中并行压缩，按顺序拼成一条多块xz流写入output；
+    在途的块数不超过max_pending，输出仍是边压缩边写出的流
+    """
+
+    def __init__(self, output, executor: Executor, preset: int = DEFAULT_PRESET,
+                 block_size: Optional[int] = None, max_pending: int = 2):
+        self.output = output
+        self.executor = executor
+        self.preset = preset
+        self.block_size = block_size or xz_block_size(preset)
+        self.max_pending = max(1, max_pending)
+        self._buffer = bytearray()
+        self._pending = deque()
+        self._records: List[Tuple[int, int]] = []
+        self._closed = False
+        output.write(xz_stream_header())
+
+    def write(self, data: bytes) -> int:
+        self._buffer += data
+        while len(self._buffer) >= self.block_size:
+            self._submit(bytes(self._buffer[:self.block_size]))
+            del self._buffer[:self.block_size]
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def _submit(self, block: bytes) -> None:
+        while len(self._pending) >= self.max_pending:
+            self._write_next()
+        self._pending.append(self.executor.submit(compress_xz_block, block, self.preset))
+
+    def _write_next(self) -> None:
+        """按提交顺序写出最早提交的块"""
+        block, records = self._pending.popleft().result()
+        self.output.write(block)
+        self._records.extend(records)
+
+    def close(self) -> None:
+        """压缩剩余数据，写出所有块、索引和流尾部"""
+        if self._closed:
+            return
+        self._closed = True
+        if self._buffer:
+            self._submit(bytes(self._buffer))
+            self._buffer = bytearray()
+        while self._pending:
+            self._write_next()
+        self.output.write(xz_stream_footer(self._records))
+
+    def __enter__(self) -> 'ParallelXZWriter':
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        if exc_type is None:
+            self.close()
+
+class ChunkWriter:
+    """
+    可写文件对象：把写入的字节流按固定大小切分为分片文件example.tar.NNN，
+    每写满一个分片立即写入输出文件夹，并按编号顺序记录各分片的分块摘要（提供线程池时各块并行计算）
+    """
+
+    def __init__(self, output_folder: str, chunk_size: int, executor: Optional[Executor] = None):
+        if chunk_size <= 0:
+            raise ValueError(f"分片大小必须大于0: {chunk_size}")
+        self.output_folder = output_folder
+        self.chunk_size = chunk_size
+        self.frame_number = 0
+        self.total_bytes = 0
+        self.executor = executor
+        self.digests: List[FrameDigest] = []
+        self._buffer = bytearray()
+
+    def write(self, data: bytes) -> int:
+        self._buffer += data
+        self.total_bytes += len(data)
+        while len(self._buffer) >= self.chunk_size:
+            self._emit(bytes(self._buffer[:self.chunk_size]))
+            del self._buffer[:self.chunk_size]
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def _emit(self, chunk: bytes) -> None:
+        """写出一个分片并记录分块摘要"""
+        self.frame_number += 1
+        chunk_path = os.path.join(self.output_folder, f"example.tar.{self.frame_number:03d}")
+        with open(chunk_path, 'wb') as f:
+            f.write(chunk)
+        leaves = block_hashes(chunk, BLOCK_SIZE, self.executor)
+        self.digests.append(FrameDigest(len(chunk), tuple(leaves)))
+        print(f"Chunk {self.frame_number:03d}: {len(chunk)} bytes, {len(leaves)} blocks, {merkle_root(leaves).hex()}")
+
+    def close(self) -> None:
+        """写出最后一个不满的分片（流为空时也写出一个空分片，保证至少有一帧）"""
+        if self._buffer or self.frame_number == 0:
+            self._emit(bytes(self._buffer))
+            self._buffer = bytearray()
+
+    def __enter__(self) -> 'ChunkWriter':
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+def package_folder(input_folder: str, output_folder: str, chunk_size: int, preset: int = DEFAULT_PRESET,
+                   workers: Optional[int] = None, xz_block: Optional[int] = None) -> ChunkWriter:
+    """
+    把input_folder流式打包为tar.xz并切分为分片，返回已关闭的ChunkWriter（分片数、总字节数和各分片的分块摘要）
+    workers为压缩和摘要计算共用的线程数（默认为CPU核数），xz_block为每个压缩块的字节数（默认按预设）
+    """
+    os.makedirs(output_folder, exist_ok=True)
+    start_time = time.time()
+    workers = workers or cpu_count()
+    with ThreadPoolExecutor(max_workers=workers) as executor, ChunkWriter(output_folder, chunk_size, executor) as writer:
+        # tarfile不会关闭传入的文件对象，xz流尾部由ParallelXZWriter、最后一个分片由ChunkWriter在退出时写出
+        with ParallelXZWriter(writer, executor, preset, xz_block, max_pending=2 * workers) as compressed:
+            with tarfile.open(fileobj=compressed, mode='w|') as tar:
+                tar.add(input_folder, arcname=os.path.basename(os.path.normpath(input_folder)))
+    print(f"Packaged {input_folder} into {writer.frame_number} chunks "
+          f"({writer.total_bytes} bytes compressed) in {time.time() - start_time:.2f}s")
+    return writer
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compress a folder as a tar.xz stream and cut it into frame-sized volumes')
+    parser.add_argument('--input', '-i', default='input', help='Folder to package')
+    parser.add_argument('--output', '-o', default='output', help='Output folder for example.tar.NNN, index.bin and frames.json')
+    parser.add_argument('--index-file', default='index.bin', help='Binary index file name written in the output folder')
+    parser.add_argument('--frames-file', default='frames.json', help='Frame settings file name written in the output folder for vm_player.py')
+    parser.add_argument('--width', type=int, default=2540, help='Frame width')
+    parser.add_argument('--height', type=int, default=1470, help='Frame height')
+    parser.add_argument('--fec', type=float, default=0, help='Reed-Solomon overhead in percent, e.g. 10 (0 = off)')
+    parser.add_argument('--bits', type=int, default=2, choices=sorted(PALETTES), help='Bits per pixel: 2 (4 colors), 3 (8 colors) or 4 (16 colors)')
+    parser.add_argument('--cell', type=int, default=1, help='Edge length in pixels of one symbol cell')
+    parser.add_argument('--parity', type=int, default=0, help='Parity frames per group of --parity-group data frames (0 = off)')
+    parser.add_argument('--parity-group', type=int, default=20, help='Data frames per parity group')
+    parser.add_argument('--preset', type=int, default=DEFAULT_PRESET, choices=range(10), metavar='0-9', help='xz compression preset; higher presets use larger blocks and more memory per thread')
+    parser.add_argument('--workers', type=int, help='Threads for compression and block hashing (default: CPU count)')
+
+    args = parser.parse_args()
+    if not os.path.isdir(args.input):
+        parser.error(f'input folder not found: {args.input}')
+    if not 1 <= args.cell <= 255:
+        parser.error('--cell must be between 1 and 255')
+    if args.workers is not None and args.workers < 1:
+        parser.error('--workers must be positive')
+    parity_error = parity_settings_error(args.parity, args.parity_group)
+    if parity_error:
+        parser.error(parity_error)
+    fec_nsym = fec_nsym_for_overhead(args.fec) if args.fec > 0 else 0
+    parity_group = args.parity_group if args.parity > 0 else 0
+
+    chunk_size = frame_capacity(args.width // args.cell, args.height // args.cell, fec_nsym, parity_group, args.bits)
+    print(f"Frame payload capacity: {chunk_size} bytes")
+    writer = package_folder(args.input, args.output, chunk_size, args.preset, args.workers)
+
+    # 帧参数：vm_player.py播放时据此从分片即时渲染每一帧
+    renderer = FrameRenderer(args.width, args.height, writer.frame_number, fec_nsym, args.bits, args.cell,
+                             parity_group, args.parity)
+    renderer.save(os.path.join(args.output, args.frames_file))
+    print(f"Frame settings written to {os.path.join(args.output, args.frames_file)}")
+
+    # 二进制索引：分块摘要已在切分时算出，不必再读一遍分片
+    write_index(os.path.join(args.output, args.index_file), writer.digests, renderer)
+    print(f"Index of {writer.frame_number} chunks written to {os.path.join(args.output, args.index_file)}")
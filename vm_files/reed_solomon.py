@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+帧内前向纠错（Reed-Solomon编码端）
+GF(2^8)，本原多项式0x11d，生成元2，码字长度255字节，每个码字附加nsym个校验字节
+所有码字用numpy同时编码，码字按列交织写入帧中，使连续的坏像素分散到不同码字
+"""
+
+import numpy as np
+
+RS_CODEWORD_SIZE = 255
+RS_PRIMITIVE_POLY = 0x11d
+
+def _build_gf_tables():
+    """构建GF(2^8)的指数表、对数表和完整乘法表"""
+    exp = np.zeros(512, dtype=np.int32)
+    log = np.zeros(256, dtype=np.int32)
+    x = 1
+    for i in range(255):
+        exp[i] = x
+        log[x] = i
+        x <<= 1
+        if x & 0x100:
+            x ^= RS_PRIMITIVE_POLY
+    exp[255:510] = exp[:255]
+
+    mul = exp[(log[:, np.newaxis] + log[np.newaxis, :])].astype(np.uint8)
+    mul[0, :] = 0
+    mul[:, 0] = 0
+    return exp, log, mul
+
+GF_EXP, GF_LOG, GF_MUL = _build_gf_tables()
+
+def rs_generator_poly(nsym: int) -> np.ndarray:
+    """生成多项式 g(x) = (x - α^0)(x - α^1)...(x - α^(nsym-1))，高次项在前"""
+    generator = np.array([1], dtype=np.uint8)
+    for i in range(nsym):
+        factor = np.array([1, GF_EXP[i]], dtype=np.uint8)
+        product = np.zeros(generator.size + 1, dtype=np.uint8)
+        for j, coef in enumerate(factor):
+            product[j:j + generator.size] ^= GF_MUL[generator, coef]
+        generator = product
+    return generator
+
+def rs_encode_blocks(blocks: np.ndarray, nsym: int) -> np.ndarray:
+    """对(nblocks, k)的数据块同时做系统编码，返回(nblocks, k + nsym)的码字"""
+    generator = rs_generator_poly(nsym)[1:]
+    parity = np.zeros((blocks.shape[0], nsym), dtype=np.uint8)
+    for column in range(blocks.shape[1]):
+        # 线性反馈移位寄存器：所有码字同时处理一个数据字节
+        feedback = blocks[:, column] ^ parity[:, 0]
+        parity[:, :-1] = parity[:, 1:]
+        parity[:, -1] = 0
+        parity ^= GF_MUL[feedback[:, np.newaxis], generator[np.newaxis, :]]
+    return np.concatenate([blocks, parity], axis=1)
+
+def fec_block_count(payload_length: int, nsym: int) -> int:
+    """负载需要的码字数量"""
+    data_size = RS_CODEWORD_SIZE - nsym
+    return -(-payload_length // data_size)
+
+def fec_encoded_size(payload_length: int, nsym: int) -> int:
+    """负载经过纠错编码后的字节数"""
+    return fec_block_count(payload_length, nsym) * RS_CODEWORD_SIZE
+
+def fec_capacity(frame_bytes: int, nsym: int) -> int:
+    """frame_bytes字节的区域在纠错编码后可承载的负载字节数"""
+    return frame_bytes // RS_CODEWORD_SIZE * (RS_CODEWORD_SIZE - nsym)
+
+def fec_nsym_for_overhead(overhead_percent: float) -> int:
+    """将冗余百分比换算为每个码字的校验字节数（偶数，至少2）"""
+    nsym = int(round(RS_CODEWORD_SIZE * overhead_percent / 100.0 / 2)) * 2
+    return min(max(nsym, 2), RS_CODEWORD_SIZE - 1)
+
+def fec_encode(payload: bytes, nsym: int) -> bytes:
+    """负载末尾补零到整数个码字后编码，并按列交织输出"""
+    data_size = RS_CODEWORD_SIZE - nsym
+    nblocks = fec_block_count(len(payload), nsym)
+    blocks = np.zeros(nblocks * data_size, dtype=np.uint8)
+    blocks[:len(payload)] = np.frombuffer(payload, dtype=np.uint8)
+    codewords = rs_encode_blocks(blocks.reshape(nblocks, data_size), nsym)
+    return codewords.T.tobytes()
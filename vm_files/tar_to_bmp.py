@@ -14,7 +14,14 @@ from concurrent.futures import ProcessPoolExecutor, as_completed
 import time
 from typing import Tuple, List, Optional
 import array
+import json
+import struct
+import zlib
 from functools import lru_cache
+from math import gcd
+from reed_solomon import fec_encode, fec_capacity, fec_nsym_for_overhead
+from erasure import MAX_GROUP_FRAMES, build_parity_payloads, parity_prefix_size
+from frame_index import index_frame_path, parse_index
 
 # 预定义颜色映射，避免重复创建
 COLOR_MAP = {'0': (255, 0, 0), '1': (0, 255, 0), '2': (0, 0, 255), '3': (255, 255, 255)}
@@ -26,73 +33,288 @@ def get_color_index(color_tuple):
     """获取颜色在预定义数组中的索引"""
     return list(COLOR_MAP.values()).index(color_tuple)
 
-def binary_to_quaternary_optimized(binary_data: bytes) -> str:
-    """优化的二进制到四进制转换，使用numpy向量化操作"""
-    if not binary_data:
-        return ''
+def bytes_to_symbols(binary_data: bytes, out: Optional[np.ndarray] = None) -> np.ndarray:
+    """二进制到四进制符号的转换，每字节拆为4个2位符号（高位在前），不经过字符串"""
+    byte_array = np.frombuffer(binary_data, dtype=np.uint8)
+    if out is None:
+        out = np.empty(byte_array.size * 4, dtype=np.uint8)
     
-    # 使用numpy进行批量位操作
-    binary_array = np.unpackbits(np.frombuffer(binary_data, dtype=np.uint8))
-    
-    # 将二进制位两两分组并转换为四进制
-    # 确保长度为偶数
-    if len(binary_array) % 2 != 0:
-        binary_array = np.append(binary_array, 0)
-    
-    # 重塑为2列，然后计算四进制值
-    binary_pairs = binary_array.reshape(-1, 2)
-    quaternary_digits = binary_pairs[:, 0] * 2 + binary_pairs[:, 1]
+    # 在(-1, 4)视图上逐列移位写入，避免中间数组
+    groups = out.reshape(-1, 4)
+    np.right_shift(byte_array, 6, out=groups[:, 0])
+    np.right_shift(byte_array, 4, out=groups[:, 1])
+    np.right_shift(byte_array, 2, out=groups[:, 2])
+    groups[:, 3] = byte_array
+    groups &= 3
+    return out
+
+# 字节值 -> 4个像素RGB值的查找表（256 x 12）
+BYTE_PIXEL_TABLE = COLOR_ARRAYS[bytes_to_symbols(bytes(range(256)))].reshape(256, 12)
+
+# 每像素2/3/4位的调色板，符号值即颜色下标；2位调色板即COLOR_MAP，帧头始终用它渲染
+PALETTES = {
+    2: COLOR_ARRAYS,
+    3: np.array([(255, 0, 0), (0, 255, 0), (0, 0, 255), (255, 255, 255),
+                 (0, 255, 255), (255, 0, 255), (255, 255, 0), (0, 0, 0)], dtype=np.uint8),
+    4: np.array([(255, 0, 0), (0, 255, 0), (0, 0, 255), (255, 255, 255),
+                 (0, 255, 255), (255, 0, 255), (255, 255, 0), (0, 0, 0),
+                 (0, 85, 0), (0, 170, 0), (255, 85, 0), (255, 170, 0),
+                 (0, 85, 255), (0, 170, 255), (255, 85, 255), (255, 170, 255)], dtype=np.uint8),
+}
+
+def symbol_group(symbol_bits: int) -> Tuple[int, int]:
+    """最小打包单位：(符号数, 字节数)，例如3位时8个符号对应3个字节"""
+    symbols = 8 // gcd(8, symbol_bits)
+    return symbols, symbols * symbol_bits // 8
+
+def pack_symbols(binary_data: bytes, symbol_bits: int) -> np.ndarray:
+    """按每像素symbol_bits位将字节流拆为符号（高位在前），末尾补零到整数个打包单位"""
+    if symbol_bits == 2:
+        return bytes_to_symbols(binary_data)
+    group_symbols, group_bytes = symbol_group(symbol_bits)
+    padded = np.zeros(-(-len(binary_data) // group_bytes) * group_bytes, dtype=np.uint8)
+    padded[:len(binary_data)] = np.frombuffer(binary_data, dtype=np.uint8)
     
-    # 使用更高效的字符串转换
-    return ''.join(map(str, quaternary_digits))
+    # 每个打包单位拼成一个整数后按位段取出符号
+    words = np.zeros(padded.size // group_bytes, dtype=np.uint32)
+    for column in range(group_bytes):
+        words <<= 8
+        words |= padded[column::group_bytes]
+    shifts = np.arange(group_symbols - 1, -1, -1, dtype=np.uint32) * symbol_bits
+    return ((words[:, np.newaxis] >> shifts) & ((1 << symbol_bits) - 1)).astype(np.uint8).ravel()
 
-def quaternary_to_pixels_optimized(quaternary_str: str, width: int, height: int) -> np.ndarray:
-    """优化的四进制到像素转换，使用numpy向量化操作"""
-    # 将四进制字符串转换为数字数组
-    quaternary_array = np.array([int(digit) for digit in quaternary_str], dtype=np.uint8)
+def render_frame(binary_data: bytes, width: int, height: int, out: Optional[np.ndarray] = None,
+                 symbol_bits: int = 2, header_size: int = 0) -> np.ndarray:
+    """
+    将二进制数据直接渲染为RGB帧缓冲区（height, width, 3），剩余像素填充黑色
+    symbol_bits不为2时，前header_size字节（帧头）仍用2位调色板，其后的数据用对应的高密度调色板
+    """
+    if symbol_bits == 2:
+        header_size = len(binary_data)
+    body_symbols = pack_symbols(binary_data[header_size:], symbol_bits) if header_size < len(binary_data) else None
+    header_count = header_size * 4
+    symbol_count = header_count + (body_symbols.size if body_symbols is not None else 0)
+    if symbol_count > width * height:
+        raise ValueError(f"Data of {len(binary_data)} bytes exceeds frame capacity at {symbol_bits} bits per pixel")
     
-    # 使用索引直接获取颜色
-    pixels = COLOR_ARRAYS[quaternary_array]
+    if out is None:
+        out = np.empty((height, width, 3), dtype=np.uint8)
+    channels = out.reshape(-1)
     
-    # 如果像素数量不足，用黑色填充
-    if len(pixels) < width * height:
-        padding = np.zeros((width * height - len(pixels), 3), dtype=np.uint8)
-        pixels = np.vstack([pixels, padding])
+    # 每个字节经查表直接得到4个像素的RGB值，一次写入帧缓冲区
+    byte_array = np.frombuffer(binary_data, dtype=np.uint8, count=header_size)
+    np.take(BYTE_PIXEL_TABLE, byte_array, axis=0, out=channels[:header_count * 3].reshape(-1, 12))
+    if body_symbols is not None:
+        np.take(PALETTES[symbol_bits], body_symbols, axis=0,
+                out=channels[header_count * 3:symbol_count * 3].reshape(-1, 3))
     
-    # 重塑为图像尺寸
-    return pixels.reshape(height, width, 3)
+    # 如果像素数量不足，用黑色填充
+    channels[symbol_count * 3:] = 0
+    return out
+
+def render_cells(binary_data: bytes, width: int, height: int, symbol_bits: int = 2, cell: int = 1) -> np.ndarray:
+    """
+    渲染一帧数据：先在(height // cell, width // cell)的单元网格上渲染，再把每个单元放大为cell x cell像素，
+    网格之外的边缘像素为黑色；显示链路有缩放或模糊时用较大的单元换取可靠性
+    """
+    grid = render_frame(binary_data, width // cell, height // cell, symbol_bits=symbol_bits, header_size=FRAME_HEADER_SIZE)
+    if cell == 1:
+        return grid
+    grid_height, grid_width = grid.shape[:2]
+    pixels = np.zeros((height, width, 3), dtype=np.uint8)
+    pixels[:grid_height * cell, :grid_width * cell] = grid.repeat(cell, axis=0).repeat(cell, axis=1)
+    return pixels
+
+# 帧头：魔数、版本、标志、纠错校验字节数、每像素位数、帧编号、总帧数、负载长度、负载CRC32、帧头CRC32（覆盖之前所有字段）
+FRAME_MAGIC = b'QF'
+FRAME_VERSION = 3
+FRAME_HEADER_STRUCT = struct.Struct('<2sBBBBIIIII')
+FRAME_HEADER_SIZE = FRAME_HEADER_STRUCT.size
 
-def tar_to_bmp_optimized(tar_path: str, bmp_path: str, width: int = 2540, height: int = 1470) -> None:
+# 帧头标志位：跨帧纠删编码的校验帧；二进制索引的分段（帧编号、总帧数为分段编号、分段总数）
+FRAME_FLAG_PARITY = 0x01
+FRAME_FLAG_INDEX = 0x02
+
+def build_frame_header(payload: bytes, frame_number: int, total_frames: int,
+                       flags: int = 0, fec_nsym: int = 0, symbol_bits: int = 2) -> bytes:
+    """构建固定长度的帧头，渲染在每帧最前面的像素中；负载长度和CRC针对纠错编码前的原始负载"""
+    fields = (FRAME_MAGIC, FRAME_VERSION, flags, fec_nsym, symbol_bits, frame_number, total_frames,
+              len(payload), zlib.crc32(payload))
+    header_without_crc = FRAME_HEADER_STRUCT.pack(*fields, 0)[:-4]
+    return FRAME_HEADER_STRUCT.pack(*fields, zlib.crc32(header_without_crc))
+
+def frame_capacity(width: int, height: int, fec_nsym: int = 0, parity_group: int = 0, symbol_bits: int = 2) -> int:
+    """单帧可承载的负载字节数（扣除帧头和纠错校验字节；启用校验帧时再扣除校验帧负载前缀，保证校验帧也放得下）"""
+    group_symbols, group_bytes = symbol_group(symbol_bits)
+    frame_bytes = (width * height - FRAME_HEADER_SIZE * 4) // group_symbols * group_bytes
+    if fec_nsym:
+        frame_bytes = fec_capacity(frame_bytes, fec_nsym)
+    if parity_group:
+        frame_bytes -= parity_prefix_size(parity_group)
+    return frame_bytes
+
+def parity_settings_error(parity: int, parity_group: int) -> Optional[str]:
+    """检查--parity/--parity-group参数，有问题时返回错误说明，否则返回None"""
+    if parity < 0:
+        return '--parity must not be negative'
+    if parity_group < 1:
+        return '--parity-group must be positive'
+    if parity and parity + parity_group > MAX_GROUP_FRAMES:
+        return f'--parity plus --parity-group must not exceed {MAX_GROUP_FRAMES}'
+    return None
+
+def build_frame_data(payload: bytes, frame_number: int, total_frames: int, fec_nsym: int = 0,
+                     flags: int = 0, symbol_bits: int = 2) -> bytes:
+    """帧头 + 负载（启用纠错时为交织后的RS码字）"""
+    header = build_frame_header(payload, frame_number, total_frames, flags=flags, fec_nsym=fec_nsym,
+                                symbol_bits=symbol_bits)
+    if fec_nsym:
+        payload = fec_encode(payload, fec_nsym)
+    return header + payload
+
+def tar_to_bmp_optimized(tar_path: str, bmp_path: str, width: int = 2540, height: int = 1470,
+                         frame_number: int = 1, total_frames: int = 1, with_header: bool = True,
+                         fec_nsym: int = 0, symbol_bits: int = 2, cell: int = 1) -> None:
     """优化的TAR到BMP转换函数"""
     # 读取二进制数据
     with open(tar_path, 'rb') as tar_file:
         binary_data = tar_file.read()
     
-    # 转换为四进制
-    quaternary_str = binary_to_quaternary_optimized(binary_data)
+    # 在负载前加上帧头（可选纠错编码）
+    if with_header:
+        binary_data = build_frame_data(binary_data, frame_number, total_frames, fec_nsym, symbol_bits=symbol_bits)
+    else:
+        symbol_bits = 2
     
-    # 转换为像素数组
-    pixels = quaternary_to_pixels_optimized(quaternary_str, width, height)
+    # 直接渲染为像素数组
+    pixels = render_cells(binary_data, width, height, symbol_bits, cell)
     
     # 创建图像并保存，使用优化的保存参数
     img = Image.fromarray(pixels, 'RGB')
     img.save(bmp_path, optimize=True, quality=95)
 
-def process_single_file(args: Tuple[str, str, int, int]) -> str:
+def process_single_file(args: Tuple[str, str, int, int, int, int, int, int, int]) -> str:
     """单个文件处理函数，用于多进程"""
-    tar_file_path, bmp_file_path, width, height = args
+    tar_file_path, bmp_file_path, width, height, frame_number, total_frames, fec_nsym, symbol_bits, cell = args
     try:
         start_time = time.time()
-        tar_to_bmp_optimized(tar_file_path, bmp_file_path, width, height)
+        tar_to_bmp_optimized(tar_file_path, bmp_file_path, width, height, frame_number, total_frames,
+                             fec_nsym=fec_nsym, symbol_bits=symbol_bits, cell=cell)
         end_time = time.time()
         return f"Converted {tar_file_path} to {bmp_file_path} in {end_time - start_time:.2f}s"
     except Exception as e:
         return f"Error converting {tar_file_path}: {str(e)}"
 
+def convert_parity_frames(data_files: List[Tuple[int, str]], width: int, height: int, total_frames: int,
+                          group_size: int, parity_count: int, fec_nsym: int = 0, symbol_bits: int = 2,
+                          cell: int = 1) -> None:
+    """
+    每group_size个数据帧生成parity_count个校验帧output/parity.NNN.bmp，编号接在数据帧之后，
+    并在output/parity.txt中记录每个校验帧覆盖的数据帧编号范围（校验帧编号,第一个数据帧,最后一个数据帧）
+    """
+    data_files = sorted(data_files)
+    parity_number = total_frames
+    lines = []
+    for start in range(0, len(data_files), group_size):
+        group = data_files[start:start + group_size]
+        payloads = []
+        for _, tar_file_path in group:
+            with open(tar_file_path, 'rb') as tar_file:
+                payloads.append(tar_file.read())
+
+        first_frame, last_frame = group[0][0], group[-1][0]
+        for payload in build_parity_payloads(first_frame, payloads, parity_count):
+            parity_number += 1
+            binary_data = build_frame_data(payload, parity_number, total_frames, fec_nsym,
+                                           flags=FRAME_FLAG_PARITY, symbol_bits=symbol_bits)
+            bmp_file_path = os.path.join("output", f"parity.{parity_number:03d}.bmp")
+            Image.fromarray(render_cells(binary_data, width, height, symbol_bits, cell), 'RGB').save(bmp_file_path)
+            lines.append(f"{parity_number:03d},{first_frame:03d},{last_frame:03d}\n")
+        print(f"Generated {parity_count} parity frames for frames {first_frame:03d}-{last_frame:03d}")
+
+    with open(os.path.join("output", "parity.txt"), 'w', encoding='utf-8') as f:
+        f.writelines(lines)
+
+def parity_frame_ranges(frame_numbers: List[int], total_frames: int, group_size: int,
+                        parity_count: int) -> List[Tuple[int, int, int]]:
+    """按convert_parity_frames的编号规则列出校验帧：(校验帧编号, 第一个数据帧, 最后一个数据帧)"""
+    frame_numbers = sorted(frame_numbers)
+    ranges = []
+    parity_number = total_frames
+    for start in range(0, len(frame_numbers), group_size):
+        group = frame_numbers[start:start + group_size]
+        for _ in range(parity_count):
+            parity_number += 1
+            ranges.append((parity_number, group[0], group[-1]))
+    return ranges
+
+class FrameRenderer:
+    """
+    播放时从TAR分片直接渲染帧画面，取代预先生成的BMP文件
+    会话参数（帧尺寸、总帧数、纠错、每像素位数、单元边长、校验分组）保存在输出文件夹的frames.json中，
+    渲染结果与tar_to_bmp_optimized/convert_parity_frames写出的BMP逐像素相同
+    """
+    FIELDS = ('width', 'height', 'total_frames', 'fec_nsym', 'symbol_bits', 'cell', 'parity_group', 'parity_count')
+
+    def __init__(self, width: int, height: int, total_frames: int, fec_nsym: int = 0, symbol_bits: int = 2,
+                 cell: int = 1, parity_group: int = 0, parity_count: int = 0):
+        self.width = width
+        self.height = height
+        self.total_frames = total_frames
+        self.fec_nsym = fec_nsym
+        self.symbol_bits = symbol_bits
+        self.cell = cell
+        self.parity_group = parity_group
+        self.parity_count = parity_count
+
+    @classmethod
+    def load(cls, settings_path: str) -> 'FrameRenderer':
+        """读取frames.json"""
+        with open(settings_path, 'r', encoding='utf-8') as f:
+            settings = json.load(f)
+        return cls(**{name: settings[name] for name in cls.FIELDS if name in settings})
+
+    def save(self, settings_path: str) -> None:
+        """写入frames.json"""
+        with open(settings_path, 'w', encoding='utf-8') as f:
+            json.dump({name: getattr(self, name) for name in self.FIELDS}, f)
+
+    def render(self, payload: bytes, frame_number: int, flags: int = 0) -> np.ndarray:
+        """把一帧负载渲染为(height, width, 3)的RGB数组"""
+        binary_data = build_frame_data(payload, frame_number, self.total_frames, self.fec_nsym,
+                                       flags=flags, symbol_bits=self.symbol_bits)
+        return render_cells(binary_data, self.width, self.height, self.symbol_bits, self.cell)
+
+    def parity_ranges(self, frame_numbers: List[int]) -> List[Tuple[int, int, int]]:
+        """所有校验帧的(编号, 第一个数据帧, 最后一个数据帧)，未启用校验帧时为空"""
+        if self.parity_count <= 0:
+            return []
+        return parity_frame_ranges(frame_numbers, self.total_frames, self.parity_group, self.parity_count)
+
+    def parity_payloads(self, first_frame: int, data_payloads: List[bytes]) -> List[bytes]:
+        """一组数据帧的全部校验帧负载，依次对应该组的各个校验帧"""
+        return build_parity_payloads(first_frame, data_payloads, self.parity_count)
+
+def write_frame_settings(folder_path: str, settings_path: str, width: int = 2540, height: int = 1470,
+                         fec_nsym: int = 0, parity_group: int = 0, parity_count: int = 0,
+                         symbol_bits: int = 2, cell: int = 1) -> None:
+    """只写入frames.json，不生成BMP文件；vm_player.py播放时从文件夹中的TAR分片即时渲染每一帧"""
+    pattern = re.compile(r'^example\.tar\.(\d{3,})$')
+    total_frames = sum(1 for filename in os.listdir(folder_path) if pattern.match(filename))
+    if total_frames == 0:
+        print("No matching files found.")
+        return
+    renderer = FrameRenderer(width, height, total_frames, fec_nsym, symbol_bits, cell,
+                             parity_group if parity_count > 0 else 0, parity_count)
+    renderer.save(settings_path)
+    print(f"Frame settings for {total_frames} frames written to {settings_path}")
+
 def convert_folder_optimized(folder_path: str, width: int = 2540, height: int = 1470, 
-                           use_multiprocessing: bool = True, max_workers: Optional[int] = None) -> None:
+                           use_multiprocessing: bool = True, max_workers: Optional[int] = None,
+                           fec_nsym: int = 0, parity_group: int = 0, parity_count: int = 0,
+                           symbol_bits: int = 2, cell: int = 1) -> None:
     """优化的文件夹转换函数，支持多进程和进度显示"""
-    pattern = re.compile(r'^example\.tar\.(\d{3})$')
+    pattern = re.compile(r'^example\.tar\.(\d{3,})$')
     
     # 收集需要处理的文件
     files_to_process = []
@@ -102,12 +324,16 @@ def convert_folder_optimized(folder_path: str, width: int = 2540, height: int =
             tar_file_path = os.path.join(folder_path, filename)
             bmp_filename = f"output.{match.group(1)}.bmp"
             bmp_file_path = os.path.join("output", bmp_filename)
-            files_to_process.append((tar_file_path, bmp_file_path, width, height))
+            files_to_process.append((tar_file_path, bmp_file_path, width, height, int(match.group(1))))
     
     if not files_to_process:
         print("No matching files found.")
         return
     
+    # 帧头中记录总帧数
+    total_frames = len(files_to_process)
+    files_to_process = [file_args + (total_frames, fec_nsym, symbol_bits, cell) for file_args in files_to_process]
+    
     # 确保输出目录存在
     os.makedirs("output", exist_ok=True)
     
@@ -150,10 +376,16 @@ def convert_folder_optimized(folder_path: str, width: int = 2540, height: int =
         end_time = time.time()
         print(f"Total processing time: {end_time - start_time:.2f}s")
         print(f"Average time per file: {(end_time - start_time)/len(files_to_process):.2f}s")
+    
+    # 跨帧纠删编码的校验帧
+    if parity_count > 0:
+        data_files = [(file_args[4], file_args[0]) for file_args in files_to_process]
+        convert_parity_frames(data_files, width, height, total_frames, parity_group, parity_count, fec_nsym,
+                              symbol_bits, cell)
 
 def convert_folder_legacy(folder_path: str, width: int = 2540, height: int = 1470) -> None:
     """兼容原始版本的转换函数"""
-    pattern = re.compile(r'^example\.tar\.(\d{3})$')
+    pattern = re.compile(r'^example\.tar\.(\d{3,})$')
     
     for filename in os.listdir(folder_path):
         match = pattern.match(filename)
@@ -161,9 +393,52 @@ def convert_folder_legacy(folder_path: str, width: int = 2540, height: int = 147
             tar_file_path = os.path.join(folder_path, filename)
             bmp_filename = f"output.{match.group(1)}.bmp"
             bmp_file_path = os.path.join("output", bmp_filename)
-            tar_to_bmp_optimized(tar_file_path, bmp_file_path, width, height)
+            tar_to_bmp_optimized(tar_file_path, bmp_file_path, width, height, with_header=False)
             print(f"Converted {tar_file_path} to {bmp_file_path}")
 
+# 校准帧：四角为灰色定位块，中间为2行8列的16色调色板色块（2位、3位调色板依次是它的前4、前8种颜色），
+# 宿主机据此测量数据区域的位置、缩放比例和每种颜色的实际截图颜色
+CALIBRATION_MARKER = 16
+CALIBRATION_MARKER_COLOR = (128, 128, 128)
+
+# 定位块下方一行白块按二进制（高位在前，白为1）依次记录帧宽、帧高各16位和单元边长8位；
+# 第k位位于帧宽的(k+1)/42处，宿主机不必先知道缩放比例即可读出
+CALIBRATION_SIZE_BITS = 40
+CALIBRATION_BIT_ROW = (20, 28)
+
+def calibration_layout(width: int, height: int) -> Tuple[int, int, int, int]:
+    """校准帧布局（与宿主机calibration.py一致）：(定位块边长, 色块边长, 色块区域左上角x, y)"""
+    swatch = min(64, (width - 4 * CALIBRATION_MARKER) // 8, (height - 4 * CALIBRATION_MARKER) // 2)
+    if swatch < 4:
+        raise ValueError(f"Frame size {width}x{height} is too small for a calibration frame")
+    return CALIBRATION_MARKER, swatch, (width - 8 * swatch) // 2, (height - 2 * swatch) // 2
+
+def render_calibration_frame(width: int, height: int, cell: int = 1) -> np.ndarray:
+    """渲染与数据帧同尺寸的校准帧"""
+    marker, swatch, left, top = calibration_layout(width, height)
+    pixels = np.zeros((height, width, 3), dtype=np.uint8)
+    for y in (0, height - marker):
+        for x in (0, width - marker):
+            pixels[y:y + marker, x:x + marker] = CALIBRATION_MARKER_COLOR
+    size_bits = (width << 24) | (height << 8) | cell
+    for k in range(CALIBRATION_SIZE_BITS):
+        if size_bits >> (CALIBRATION_SIZE_BITS - 1 - k) & 1:
+            x = (k + 1) * width // (CALIBRATION_SIZE_BITS + 2)
+            pixels[CALIBRATION_BIT_ROW[0]:CALIBRATION_BIT_ROW[1], x - 2:x + 2] = 255
+    for i, color in enumerate(PALETTES[4]):
+        x = left + (i % 8) * swatch
+        y = top + (i // 8) * swatch
+        pixels[y:y + swatch, x:x + swatch] = color
+    return pixels
+
+def render_index_frames(index_data: bytes, width: int, height: int, fec_nsym: int = 0, cell: int = 1) -> List[np.ndarray]:
+    """把索引拆分为若干索引帧并渲染为RGB数组；索引帧始终使用4色调色板"""
+    capacity = frame_capacity(width // cell, height // cell, fec_nsym)
+    parts = [index_data[i:i + capacity] for i in range(0, len(index_data), capacity)]
+    return [render_cells(build_frame_data(part, number, len(parts), fec_nsym, flags=FRAME_FLAG_INDEX),
+                         width, height, cell=cell)
+            for number, part in enumerate(parts, 1)]
+
 if __name__ == '__main__':
     import argparse
     
@@ -175,14 +450,57 @@ if __name__ == '__main__':
     parser.add_argument('--height', type=int, default=1470, help='Output image height')
     parser.add_argument('--single', action='store_true', help='Use single process mode')
     parser.add_argument('--workers', type=int, help='Number of worker processes')
-    parser.add_argument('--legacy', action='store_true', help='Use legacy mode (compatible with original)')
+    parser.add_argument('--legacy', action='store_true', help='Use legacy mode (compatible with original, no frame header)')
+    parser.add_argument('--frame-number', type=int, default=1, help='Frame number written to the header (single file mode)')
+    parser.add_argument('--total-frames', type=int, default=1, help='Total frame count written to the header (single file mode)')
+    parser.add_argument('--settings', help='Write only the frame settings file (frames.json) for the volumes in --folder; vm_player.py renders the frames during playback instead of loading BMP files')
+    parser.add_argument('--calibration', action='store_true', help='Write the calibration frame to --output and exit')
+    parser.add_argument('--index-frames', metavar='INDEX_FILE', help='Render a binary index file (index.bin) as index frames starting at --output (further parts are written as index.002.bmp, ...) and exit')
+    parser.add_argument('--capacity', action='store_true', help='Print the payload capacity in bytes of one frame and exit')
+    parser.add_argument('--fec', type=float, default=0, help='Reed-Solomon overhead in percent, e.g. 10 (0 = off)')
+    parser.add_argument('--bits', type=int, default=2, choices=sorted(PALETTES), help='Bits per pixel: 2 (4 colors), 3 (8 colors) or 4 (16 colors); the display path must be lossless')
+    parser.add_argument('--cell', type=int, default=1, help='Edge length in pixels of one symbol cell; use 2-4 when the display path scales or blurs the frame')
+    parser.add_argument('--parity', type=int, default=0, help='Parity frames per group of --parity-group data frames (0 = off, folder mode only)')
+    parser.add_argument('--parity-group', type=int, default=20, help='Data frames per parity group')
     
     args = parser.parse_args()
+    if not 1 <= args.cell <= 255:
+        parser.error('--cell must be between 1 and 255')
+    parity_error = parity_settings_error(args.parity, args.parity_group)
+    if parity_error:
+        parser.error(parity_error)
+    fec_nsym = fec_nsym_for_overhead(args.fec) if args.fec > 0 else 0
+    # 单文件模式不生成校验帧，单帧容量也不扣除校验帧前缀
+    parity_group = args.parity_group if args.parity > 0 and not args.input else 0
+    parity_count = args.parity if parity_group else 0
     
+    if args.capacity:
+        print(frame_capacity(args.width // args.cell, args.height // args.cell, fec_nsym, parity_group, args.bits))
+    elif args.calibration:
+        if not args.output:
+            parser.error('--calibration requires --output')
+        Image.fromarray(render_calibration_frame(args.width, args.height, args.cell), 'RGB').save(args.output)
+        print(f"Calibration frame written to {args.output}")
+    elif args.index_frames:
+        if not args.output:
+            parser.error('--index-frames requires --output')
+        with open(args.index_frames, 'rb') as f:
+            index_data = f.read()
+        header, _ = parse_index(index_data)
+        frames = render_index_frames(index_data, args.width, args.height, fec_nsym, args.cell)
+        for part, pixels in enumerate(frames, 1):
+            Image.fromarray(pixels, 'RGB').save(index_frame_path(args.output, part))
+        print(f"Index of {header.frame_count} frames ({header.total_size} bytes, {len(index_data)} byte index) "
+              f"written as {len(frames)} index frame(s) starting at {args.output}")
     # 如果指定了单个文件，直接处理单个文件
-    if args.input and args.output:
+    elif args.input and args.output:
         print(f"Processing single file: {args.input} -> {args.output}")
-        tar_to_bmp_optimized(args.input, args.output, args.width, args.height)
+        tar_to_bmp_optimized(args.input, args.output, args.width, args.height, args.frame_number, args.total_frames,
+                             fec_nsym=fec_nsym, symbol_bits=args.bits, cell=args.cell)
+    elif args.settings:
+        write_frame_settings(args.folder, args.settings, args.width, args.height, fec_nsym=fec_nsym,
+                             parity_group=parity_group, parity_count=parity_count, symbol_bits=args.bits,
+                             cell=args.cell)
     elif args.legacy:
         convert_folder_legacy(args.folder, args.width, args.height)
     else:
@@ -191,5 +509,10 @@ if __name__ == '__main__':
             args.width, 
             args.height, 
             use_multiprocessing=not args.single,
-            max_workers=args.workers
-        ) 
\ No newline at end of file
+            max_workers=args.workers,
+            fec_nsym=fec_nsym,
+            parity_group=parity_group,
+            parity_count=parity_count,
+            symbol_bits=args.bits,
+            cell=args.cell
+        )
@@ -6,24 +6,75 @@
 
 import os
 import time
-import hashlib
 import subprocess
 import sys
 import signal
 import atexit
 import threading
-from typing import List, Tuple, Optional
+import itertools
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Tuple, Optional, Union
 import argparse
+from ack_channel import AckWatcher, is_acked
+from tar_to_bmp import FRAME_FLAG_PARITY, FrameRenderer
+from frame_index import IndexFormatError, index_frame_path, parse_index, read_index
 from PyQt5.QtWidgets import QApplication, QMainWindow, QLabel
 from PyQt5.QtCore import Qt, QObject, pyqtSignal
-from PyQt5.QtGui import QPixmap
+from PyQt5.QtGui import QImage, QPixmap
 
 # 全局变量存储当前打开的进程
 current_process: Optional[subprocess.Popen] = None
 
+# 有校验帧且未指定--frame-timeout时，逐帧模式等待每帧确认的秒数：解码不了的帧不会一直卡住播放，
+# 超时的帧最后连同所在组的校验帧一起连续重播
+PARITY_FRAME_TIMEOUT = 10.0
+
 # 用于线程间通信的信号
 class ImageUpdater(QObject):
-    update_signal = pyqtSignal(str)
+    # 图片路径(str)或即时渲染的帧(QImage)
+    update_signal = pyqtSignal(object)
+
+class FrameLabel(QLabel):
+    """显示画面的标签，新画面实际绘制完成后发出frame_painted信号（画面标识, 绘制完成时间）"""
+    frame_painted = pyqtSignal(str, float)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.pending_frame = None
+
+    def paintEvent(self, event):
+        super().paintEvent(event)
+        if self.pending_frame is not None:
+            frame, self.pending_frame = self.pending_frame, None
+            self.frame_painted.emit(frame, time.time())
+
+class PaintClock:
+    """记录每个画面实际绘制完成的时间（主线程写入），工作线程据此测量显示延迟并按绘制时间计时"""
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._painted: Dict[str, float] = {}
+
+    def on_painted(self, frame: str, timestamp: float) -> None:
+        with self._condition:
+            self._painted[frame] = timestamp
+            self._condition.notify_all()
+
+    def expect(self, frame: str) -> None:
+        """显示画面前调用，丢弃同一画面上一次的绘制记录"""
+        with self._condition:
+            self._painted.pop(frame, None)
+
+    def wait(self, frame: str, timeout: float) -> Optional[float]:
+        """等待画面绘制完成，返回绘制完成时间；超时返回None"""
+        deadline = time.time() + timeout
+        with self._condition:
+            while frame not in self._painted:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    return None
+                self._condition.wait(remaining)
+            return self._painted.pop(frame)
 
 class FullScreenBMPViewer(QMainWindow):
     def __init__(self, screen_index=1, initial_image="image.bmp"):
@@ -43,8 +94,10 @@ class FullScreenBMPViewer(QMainWindow):
         self.setWindowFlags(Qt.FramelessWindowHint)
         self.setGeometry(screen_geometry)
 
-        # 创建图片显示标签
-        self.label = QLabel(self)
+        # 创建图片显示标签，绘制完成时间记录到paint_clock
+        self.paint_clock = PaintClock()
+        self.label = FrameLabel(self)
+        self.label.frame_painted.connect(self.paint_clock.on_painted)
         self.label.setAlignment(Qt.AlignCenter)
         self.label.setGeometry(0, 0, screen_geometry.width(), screen_geometry.height())
 
@@ -55,9 +108,15 @@ class FullScreenBMPViewer(QMainWindow):
         self.label.setFocus()
         self.label.keyPressEvent = self.keyPressEvent
 
-    def load_image(self, image_path):
-        """加载并居中显示BMP图片（不缩放）"""
-        pixmap = QPixmap(image_path)
+    def load_image(self, image):
+        """加载并居中显示BMP图片或即时渲染的QImage（不缩放）"""
+        if isinstance(image, QImage):
+            pixmap = QPixmap.fromImage(image)
+            frame = image.text('frame')
+            image_path = image.text('path') or f"帧 {frame}（即时渲染）"
+        else:
+            pixmap = QPixmap(image)
+            frame = image_path = image
         if pixmap.isNull():
             print(f"错误：无法加载图片 {image_path}")
             return False
@@ -72,9 +131,11 @@ class FullScreenBMPViewer(QMainWindow):
         x = (window_width - image_width) // 2
         y = (window_height - image_height) // 2
 
-        # 设置标签位置和大小（使用图片原始尺寸）
+        # 设置标签位置和大小（使用图片原始尺寸），立即重绘并记录绘制完成时间
         self.label.setPixmap(pixmap)
         self.label.setGeometry(x, y, image_width, image_height)
+        self.label.pending_frame = frame
+        self.label.repaint()
 
         print(f"图片已更新: {image_path}")
         print(f"图片尺寸: {image_width}x{image_height}")
@@ -82,9 +143,9 @@ class FullScreenBMPViewer(QMainWindow):
         print(f"居中位置: ({x}, {y})")
         return True
 
-    def update_image(self, image_path):
+    def update_image(self, image):
         """更新当前窗口显示的图片"""
-        self.load_image(image_path)
+        self.load_image(image)
 
     def keyPressEvent(self, event):
         """ESC键退出程序"""
@@ -116,69 +177,65 @@ signal.signal(signal.SIGINT, signal_handler)
 signal.signal(signal.SIGTERM, signal_handler)
 atexit.register(cleanup_process)
 
-def calculate_md5(file_path: str) -> str:
-    """计算文件的MD5值"""
-    hash_md5 = hashlib.md5()
-    with open(file_path, "rb") as f:
-        for chunk in iter(lambda: f.read(4096), b""):
-            hash_md5.update(chunk)
-    return hash_md5.hexdigest()
+def read_index_root(index_path: str) -> Optional[bytes]:
+    """读取索引文件中记录的清单根（解析时已校验CRC和由各帧摘要重新算出的根），无法读取或格式错误时返回None"""
+    try:
+        with open(index_path, 'rb') as f:
+            header, _ = parse_index(f.read())
+    except (OSError, IndexFormatError) as e:
+        print(f"无法读取索引 {index_path}: {e}")
+        return None
+    return header.root
 
 def read_index_file(index_path: str) -> List[Tuple[str, str]]:
-    """读取index.txt文件，返回文件编号和MD5值的列表"""
-    files = []
-    with open(index_path, 'r', encoding='utf-8') as f:
-        for line in f:
-            line = line.strip()
-            if line:
-                parts = line.split(',')
-                if len(parts) == 2:
-                    file_number, md5_value = parts
-                    files.append((file_number, md5_value))
-    return files
-
-def open_image_with_window(image_path: str, viewer, updater) -> bool:
-    """在现有窗口中更新图片"""
+    """读取二进制索引文件，返回文件编号和每帧根摘要的列表"""
+    return read_index(index_path)
+
+def open_image_with_window(image: Union[str, QImage], viewer, updater) -> bool:
+    """在现有窗口中更新图片（图片路径或即时渲染的QImage）"""
     try:
         # 通过信号安全更新图片（跨线程）
-        updater.update_signal.emit(image_path)
+        updater.update_signal.emit(image)
         return True
     except Exception as e:
-        print(f"Error updating image {image_path}: {e}")
+        print(f"Error updating image {image}: {e}")
         return False
 
-def check_tar_file_exists(transfer_path: str, file_number: str) -> bool:
-    """检查对应的tar文件是否存在且可访问（带稳定性检查）"""
-    tar_file_path = os.path.join(transfer_path, f"example.tar.{file_number}")
-    
-    # 文件不存在直接返回False
-    if not os.path.exists(tar_file_path):
-        return False
+def show_frame(image: QImage, viewer, updater, timeout: float = 1.0) -> Optional[float]:
+    """显示一帧并等待它实际绘制完成，返回绘制完成时间；无法显示或超时未绘制时返回None"""
+    frame = image.text('frame')
+    viewer.paint_clock.expect(frame)
+    if not open_image_with_window(image, viewer, updater):
+        return None
+    return viewer.paint_clock.wait(frame, timeout)
+
+def show_calibration_frame(args, viewer, updater) -> None:
+    """显示校准帧，直到宿主机在传输路径中写入校准结果或超时（超时后宿主机使用固定裁剪偏移和颜色规则）"""
+    calibration_bmp_path = os.path.join(args.output_folder, args.calibration_bmp)
+    if not os.path.exists(calibration_bmp_path):
+        print(f"未找到校准帧 {calibration_bmp_path}，跳过校准")
+        return
     
+    # 删除上一次会话遗留的校准结果，避免还没被截图就进入下一步
+    calibration_path = os.path.join(args.transfer_path, args.calibration_file)
     try:
-        # 尝试打开文件确认文件状态稳定
-        with open(tar_file_path, 'rb') as test_file:
-            # 尝试读取1字节确认文件可访问
-            if test_file.read(1):
-                # 文件有内容且可读
-                print(f"验证成功: example.tar.{file_number} 稳定存在")
-                return True
-            else:
-                # 文件存在但为空（可能正在传输中）
-                print(f"文件为空，可能正在传输: example.tar.{file_number}")
-                return False
-    except (IOError, PermissionError) as e:
-        # 文件访问错误
-        print(f"文件访问错误，可能正在生成: {e}")
-        return False
-    except Exception as e:
-        # 其他异常情况
-        print(f"检查文件时发生意外错误: {e}")
-        return False
-
+        os.remove(calibration_path)
+    except OSError:
+        pass
+    
+    print("步骤0: 显示校准帧...")
+    open_image_with_window(calibration_bmp_path, viewer, updater)
+    deadline = time.time() + args.wait_timeout
+    while not os.path.exists(calibration_path):
+        if time.time() >= deadline:
+            print(f"警告: {args.wait_timeout}秒内未收到宿主机的校准结果，继续传输")
+            return
+        time.sleep(0.2)
+    print("宿主机已完成校准")
 
-def wait_for_index_file_with_retry(transfer_path: str, index_file: str, max_wait_time: int = 30) -> bool:
-    """等待index.txt文件生成，带稳定性检查和重试机制"""
+def wait_for_index_file_with_retry(transfer_path: str, index_file: str, max_wait_time: int = 30,
+                                   on_wait: Optional[Callable[[], None]] = None) -> bool:
+    """等待索引文件生成，带稳定性检查和重试机制；每等待一秒调用一次on_wait（轮流显示各个索引帧）"""
     received_index_path = os.path.join(transfer_path, index_file)
     
     wait_time = 0
@@ -187,7 +244,7 @@ def wait_for_index_file_with_retry(transfer_path: str, index_file: str, max_wait
         if os.path.exists(received_index_path):
             try:
                 # 尝试打开文件确认非临时状态
-                with open(received_index_path, 'r') as test_file:
+                with open(received_index_path, 'rb') as test_file:
                     if test_file.read(1):  # 尝试读取1字节
                         print(f"验证成功: {index_file} 稳定存在")
                         return True
@@ -198,14 +255,16 @@ def wait_for_index_file_with_retry(transfer_path: str, index_file: str, max_wait
                 # 其他异常
                 print(f"检查文件时发生意外错误: {e}")
         
-        print(f"等待index.txt文件... ({wait_time}/{max_wait_time}秒)")
+        print(f"等待{index_file}文件... ({wait_time}/{max_wait_time}秒)")
+        if on_wait is not None:
+            on_wait()
         time.sleep(1)
         wait_time += 1
     
     # 最终检查
     if os.path.exists(received_index_path):
         try:
-            with open(received_index_path, 'r') as test_file:
+            with open(received_index_path, 'rb') as test_file:
                 if test_file.read(1):
                     print(f"最终验证成功: {index_file}")
                     return True
@@ -216,39 +275,247 @@ def wait_for_index_file_with_retry(transfer_path: str, index_file: str, max_wait
 
 
 
-def verify_index_file_md5(original_index_path: str, received_index_path: str, max_retries: int = 3) -> bool:
-    """验证index.txt文件的MD5值，带重试机制"""
+def verify_index_file(original_index_path: str, received_index_path: str, max_retries: int = 3) -> bool:
+    """比对原始索引和宿主机收到的索引的清单根，带重试机制"""
     for attempt in range(max_retries):
-        print(f"步骤3:{os.path.exists(received_index_path)} 比对MD5值... (尝试 {attempt + 1}/{max_retries})")
+        print(f"步骤3:{os.path.exists(received_index_path)} 比对清单根... (尝试 {attempt + 1}/{max_retries})")
 
         if not os.path.exists(original_index_path):
-            print(f"错误: 找不到原始index.txt文件: {original_index_path}")
+            print(f"错误: 找不到原始索引文件: {original_index_path}")
             return False
 
         if not os.path.exists(received_index_path):
-            print(f"错误: 找不到接收的index.txt文件: {received_index_path}")
+            print(f"错误: 找不到接收的索引文件: {received_index_path}")
             return False
 
-        original_md5 = calculate_md5(original_index_path)
-        received_md5 = calculate_md5(received_index_path)
+        original_root = read_index_root(original_index_path)
+        received_root = read_index_root(received_index_path)
+        if original_root is None:
+            return False
 
-        print(f"原始index.txt MD5: {original_md5}")
-        print(f"接收index.txt MD5: {received_md5}")
+        print(f"原始索引清单根: {original_root.hex()}")
+        print(f"接收索引清单根: {received_root.hex() if received_root is not None else '无效'}")
 
-        if original_md5 == received_md5:
-            print("MD5值匹配成功！")
+        if original_root == received_root:
+            print("清单根匹配成功！")
             return True
         else:
-            print(f"MD5值不匹配 (尝试 {attempt + 1}/{max_retries})")
+            print(f"清单根不匹配 (尝试 {attempt + 1}/{max_retries})")
             if attempt < max_retries - 1:
                 print("等待5秒后重试...")
                 time.sleep(5)
             else:
-                print("所有重试失败，MD5值仍然不匹配")
+                print("所有重试失败，清单根仍然不匹配")
                 return False
 
     return False
 
+def read_parity_file(parity_path: str) -> List[Tuple[str, int, int]]:
+    """读取parity.txt，返回(校验帧编号, 第一个数据帧, 最后一个数据帧)列表；未生成校验帧时返回空列表"""
+    parities = []
+    if not os.path.exists(parity_path):
+        return parities
+    with open(parity_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            parts = line.strip().split(',')
+            if len(parts) == 3:
+                parities.append((parts[0], int(parts[1]), int(parts[2])))
+    return parities
+
+def pixels_to_qimage(pixels, label: str) -> QImage:
+    """把(height, width, 3)的RGB数组转换为QImage（复制一份，不再引用numpy缓冲区）"""
+    height, width = pixels.shape[:2]
+    image = QImage(pixels.data, width, height, 3 * width, QImage.Format_RGB888).copy()
+    image.setText('frame', label)
+    return image
+
+class FrameSource:
+    """
+    按帧编号提供要显示的画面：输出文件夹中有预先生成的BMP时直接使用，
+    否则按frames.json从TAR分片example.tar.NNN即时渲染为QImage，不再需要BMP编码阶段和BMP文件；
+    校验帧由所在组的数据分片即时计算，同组的校验帧连续播放，因此只缓存最近一组的校验负载
+    """
+
+    def __init__(self, output_folder: str, settings_file: str, parity_file: str, frame_numbers: List[str]):
+        self.output_folder = output_folder
+        settings_path = os.path.join(output_folder, settings_file)
+        self.renderer = FrameRenderer.load(settings_path) if os.path.exists(settings_path) else None
+
+        # 校验帧列表：优先使用parity.txt（预先生成的校验帧），否则按frames.json中的分组参数推算
+        self.parities = read_parity_file(os.path.join(output_folder, parity_file))
+        if not self.parities and self.renderer is not None:
+            self.parities = [(f"{parity_number:03d}", first, last) for parity_number, first, last
+                             in self.renderer.parity_ranges([int(n) for n in frame_numbers])]
+        # 校验帧编号 -> (第一个数据帧, 最后一个数据帧, 组内序号)
+        self._parity_frames = {}
+        group_counts = {}
+        for parity_number, first, last in self.parities:
+            index = group_counts.get(first, 0)
+            group_counts[first] = index + 1
+            self._parity_frames[parity_number] = (first, last, index)
+        self._parity_cache: Tuple[int, List[bytes]] = (0, [])
+
+    def volume_path(self, frame_number: int) -> str:
+        """数据帧对应的TAR分片路径"""
+        return os.path.join(self.output_folder, f"example.tar.{frame_number:03d}")
+
+    def read_volume(self, frame_number: int) -> bytes:
+        """读取数据帧的负载"""
+        with open(self.volume_path(frame_number), 'rb') as f:
+            return f.read()
+
+    def image_path(self, frame_number: str) -> str:
+        """预先生成的BMP路径（数据帧output.NNN.bmp，校验帧parity.NNN.bmp）"""
+        prefix = 'parity' if frame_number in self._parity_frames else 'output'
+        return os.path.join(self.output_folder, f"{prefix}.{frame_number}.bmp")
+
+    def frame(self, frame_number: str) -> Optional[Union[str, QImage]]:
+        """返回帧的BMP路径或渲染好的QImage；两者都无法得到时返回None"""
+        image_path = self.image_path(frame_number)
+        if os.path.exists(image_path):
+            return image_path
+        if self.renderer is None:
+            print(f"错误: 找不到图片文件 {image_path}，输出文件夹中也没有帧参数文件")
+            return None
+        try:
+            if frame_number in self._parity_frames:
+                pixels = self._render_parity(frame_number)
+            else:
+                pixels = self.renderer.render(self.read_volume(int(frame_number)), int(frame_number))
+        except (IOError, OSError) as e:
+            print(f"错误: 无法读取帧 {frame_number} 的TAR分片: {e}")
+            return None
+        return pixels_to_qimage(pixels, frame_number)
+
+    def _render_parity(self, frame_number: str):
+        """渲染校验帧，负载由所在组的全部数据分片计算"""
+        first, last, index = self._parity_frames[frame_number]
+        cached_first, payloads = self._parity_cache
+        if cached_first != first:
+            data_payloads = [self.read_volume(n) for n in range(first, last + 1)]
+            payloads = self.renderer.parity_payloads(first, data_payloads)
+            self._parity_cache = (first, payloads)
+        return self.renderer.render(payloads[index], int(frame_number), flags=FRAME_FLAG_PARITY)
+
+class FramePrefetcher:
+    """
+    在后台线程中提前准备接下来K帧的QImage（读取并解码BMP，或从TAR分片渲染），
+    播放时只需在主线程把准备好的QImage换到屏幕上；QPixmap只能在主线程创建，因此预取到QImage为止
+    """
+
+    def __init__(self, source: FrameSource, depth: int):
+        self.source = source
+        self.depth = depth
+        # 单个后台线程，FrameSource（含校验负载缓存）只在该线程中使用
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self._pending = {}
+
+    def _load(self, frame_number: str) -> Optional[QImage]:
+        """准备一帧的QImage，帧标识为帧编号"""
+        image = self.source.frame(frame_number)
+        if isinstance(image, str):
+            image_path, image = image, QImage(image)
+            if image.isNull():
+                print(f"错误: 无法加载图片 {image_path}")
+                return None
+            image.setText('path', image_path)
+            image.setText('frame', frame_number)
+        return image
+
+    def get(self, frame_number: str, upcoming: List[str]) -> Optional[QImage]:
+        """取出一帧（未预取时当场准备），并为随后upcoming中的前K帧提交预取"""
+        future = self._pending.pop(frame_number, None)
+        if future is None:
+            future = self._executor.submit(self._load, frame_number)
+
+        # 不再需要的预取直接丢弃，只保留接下来的K帧
+        wanted = [n for n in upcoming[:self.depth] if n != frame_number]
+        for stale in [n for n in self._pending if n not in wanted]:
+            self._pending.pop(stale).cancel()
+        for n in wanted:
+            if n not in self._pending:
+                self._pending[n] = self._executor.submit(self._load, n)
+        return future.result()
+
+    def close(self) -> None:
+        for future in self._pending.values():
+            future.cancel()
+        self._pending.clear()
+        self._executor.shutdown(wait=False)
+
+def average_ms(samples: List[float]) -> str:
+    """样本平均值（毫秒）"""
+    return f"{sum(samples) / len(samples) * 1000:.1f}ms" if samples else "-"
+
+def group_confirmed(confirmed: bytes, first_frame: int, last_frame: int) -> bool:
+    """一组数据帧是否已全部确认"""
+    return all(is_acked(confirmed, n) for n in range(first_frame, last_frame + 1))
+
+def play_stream(files_to_play: List[Tuple[str, str]], args, viewer, updater, ack_watcher: AckWatcher,
+                prefetcher: FramePrefetcher) -> None:
+    """
+    连续播放模式：按固定帧率循环播放所有未确认的帧，不逐帧等待宿主机
+    宿主机按帧头识别截到的帧，确认位图中未置位的帧即为缺失集合，之后每一轮只重播缺失的帧；
+    仍有缺失数据帧的组同时播放其校验帧，宿主机截到组内任意N帧即可恢复整组
+    每帧从实际绘制完成起计时，保证在屏幕上完整停留一个帧间隔
+    """
+    frame_interval = 1.0 / args.frame_rate
+    unavailable = set()
+    round_number = 0
+    while True:
+        confirmed = ack_watcher.read()
+        missing = [file_number for file_number, _ in files_to_play
+                   if file_number not in unavailable and not is_acked(confirmed, int(file_number))]
+        if not missing:
+            break
+
+        # 本轮播放列表：(帧编号, 第一个和最后一个数据帧)，数据帧的范围只有它自己，校验帧为所在组
+        playlist = [(file_number, int(file_number), int(file_number)) for file_number in missing]
+        playlist += [(parity_number, first, last) for parity_number, first, last in prefetcher.source.parities
+                     if not group_confirmed(confirmed, first, last)]
+        upcoming = [frame_number for frame_number, _, _ in playlist]
+
+        round_number += 1
+        print(f"\n第 {round_number} 轮: 播放 {len(missing)}/{len(files_to_play)} 个未确认的帧"
+              f"（另有 {len(playlist) - len(missing)} 个校验帧），帧率 {args.frame_rate} 帧/秒")
+        shown = None
+        display_latencies = []
+        for position, (frame_number, first, last) in enumerate(playlist):
+            # 本轮播放过程中已确认的帧（或已全部确认的组的校验帧）不再播放
+            if group_confirmed(ack_watcher.read(), first, last):
+                continue
+
+            image = prefetcher.get(frame_number, upcoming[position + 1:])
+            if image is None:
+                unavailable.add(frame_number)
+                continue
+            requested = time.time()
+            painted = show_frame(image, viewer, updater)
+            if painted is None:
+                print(f"警告: 帧 {frame_number} 未在1秒内完成绘制")
+                painted = time.time()
+            else:
+                display_latencies.append(painted - requested)
+            if frame_number in missing:
+                shown = frame_number
+
+            # 显示跟不上帧率时不追赶，下一帧紧接着显示
+            delay = painted + frame_interval - time.time()
+            if delay > 0:
+                time.sleep(delay)
+
+        # 给宿主机留出解码最后几帧的时间，避免无谓地多播放一轮
+        if shown is not None:
+            ack_watcher.wait_for(int(shown), timeout=max(1.0, 4 * frame_interval))
+
+        confirmed = ack_watcher.read()
+        done = sum(1 for file_number, _ in files_to_play if is_acked(confirmed, int(file_number)))
+        print(f"第 {round_number} 轮结束: 已确认 {done}/{len(files_to_play)}，"
+              f"平均显示延迟 {average_ms(display_latencies)}")
+
+    if unavailable:
+        print(f"\n以下帧无法得到画面，未能传输: {', '.join(sorted(unavailable))}")
+
 def run_playback_logic(args, viewer, updater):
     """执行播放逻辑的工作线程函数"""
     try:
@@ -258,111 +525,152 @@ def run_playback_logic(args, viewer, updater):
         print("=== 虚拟机端自动播放脚本 ===")
         print(f"输出文件夹: {args.output_folder}")
         print(f"传输路径: {args.transfer_path}")
-        print(f"检查间隔: {args.check_interval}秒")
+        print(f"确认文件: {args.ack_file}（最长轮询间隔 {args.check_interval}秒）")
         print(f"最大重试次数: {args.max_retries}")
         print(f"等待超时: {args.wait_timeout}秒")
+        if args.stream:
+            print(f"连续播放模式: {args.frame_rate} 帧/秒")
 
-        # 检查进度文件
-        progress_file = os.path.join(args.transfer_path, args.progress_file)
-        processed_files = set()
-        if os.path.exists(progress_file):
-            with open(progress_file, 'r') as f:
-                processed_files = set(f.read().splitlines())
-            print(f"检测到进度文件: {len(processed_files)} 个文件已处理")
-
-        # 步骤1: 首先播放index.bmp文件
+        show_calibration_frame(args, viewer, updater)
+        
+        # 步骤1: 首先播放索引帧（索引较大时为index.bmp、index.002.bmp……，等待期间轮流显示）
         index_bmp_path = os.path.join(args.output_folder, args.index_bmp)
         if not os.path.exists(index_bmp_path):
             print(f"错误: 找不到index.bmp文件: {index_bmp_path}")
             return
+        index_frames = [index_bmp_path]
+        while os.path.exists(index_frame_path(index_bmp_path, len(index_frames) + 1)):
+            index_frames.append(index_frame_path(index_bmp_path, len(index_frames) + 1))
 
-        print("步骤1: 播放index.bmp文件...")
+        print(f"步骤1: 播放索引帧（共 {len(index_frames)} 帧）...")
         if not open_image_with_window(index_bmp_path, viewer, updater):
             print("错误: 无法打开index.bmp文件")
             return
+        index_cycle = itertools.cycle(index_frames)
+        next(index_cycle)
+
+        def show_next_index_frame() -> None:
+            if len(index_frames) > 1:
+                open_image_with_window(next(index_cycle), viewer, updater)
 
         # 等待5秒让宿主机开始截图
         print("等待5秒让宿主机开始截图...")
         time.sleep(2)
 
-        # 步骤2: 检查index.txt文件是否生成
-        print("步骤2: 检查index.txt文件...")
+        # 步骤2: 检查索引文件是否生成
+        print(f"步骤2: 检查{args.index_file}文件...")
         received_index_path = os.path.join(args.transfer_path, args.index_file)
 
-        if not wait_for_index_file_with_retry(args.transfer_path, args.index_file, args.wait_timeout):
-            print("错误: 超时，未收到index.txt文件")
+        if not wait_for_index_file_with_retry(args.transfer_path, args.index_file, args.wait_timeout,
+                                              show_next_index_frame):
+            print(f"错误: 超时，未收到{args.index_file}文件")
             return
 
-        # 步骤3: 比对MD5值（带重试机制）
+        # 步骤3: 比对清单根（带重试机制）
         original_index_path = os.path.join(args.output_folder, args.index_file)
 
-        if not verify_index_file_md5(original_index_path, received_index_path, args.max_retries):
-            print("错误: MD5验证失败，程序退出")
+        if not verify_index_file(original_index_path, received_index_path, args.max_retries):
+            print("错误: 索引验证失败，程序退出")
             return
 
-        print("MD5值匹配，开始播放文件...")
+        print("清单根匹配，开始播放文件...")
 
-        # 步骤4: 读取文件列表并依次播放（支持断点续传）
+        # 步骤4: 读取文件列表并依次播放（支持断点续传：跳过确认位图中已确认的帧）
         files_to_play = read_index_file(received_index_path)
         total_files = len(files_to_play)
-        print(f"需要播放 {total_files} 个文件，{len(processed_files)} 个已跳过")
-        
-        # 初始化进度条变量
-        processed_count = 0
-        start_processing_time = time.time()
+        ack_watcher = AckWatcher(args.transfer_path, args.ack_file, max_interval=args.check_interval)
+        confirmed = ack_watcher.read()
+        skipped = sum(1 for file_number, _ in files_to_play if is_acked(confirmed, int(file_number)))
+        print(f"需要播放 {total_files} 个文件，{skipped} 个已跳过")
+
+        source = FrameSource(args.output_folder, args.frames_file, args.parity_file,
+                             [file_number for file_number, _ in files_to_play])
+        if source.renderer is not None:
+            print(f"按 {args.frames_file} 从TAR分片即时渲染没有预先生成BMP的帧")
+        if source.parities:
+            print(f"检测到 {len(source.parities)} 个校验帧")
+        frame_timeout = args.frame_timeout
+        if frame_timeout is None:
+            frame_timeout = PARITY_FRAME_TIMEOUT if source.parities else 0
+        if frame_timeout and not args.stream:
+            print(f"逐帧模式: 每帧最多等待确认 {frame_timeout}秒")
+        prefetcher = FramePrefetcher(source, args.prefetch)
+
+        if args.stream:
+            play_stream(files_to_play, args, viewer, updater, ack_watcher, prefetcher)
+        else:
+            # 初始化进度条变量
+            processed_count = 0
+            start_processing_time = time.time()
+            display_latencies = []
+            ack_latencies = []
+            # 预取顺序：开始时尚未确认的帧
+            upcoming = [file_number for file_number, _ in files_to_play if not is_acked(confirmed, int(file_number))]
+            upcoming_positions = {file_number: k for k, file_number in enumerate(upcoming)}
         
-        def print_progress_bar(current, total, bar_length=50):
-            """打印文本进度条"""
-            percent = float(current) / total
-            arrow = '#' * int(round(percent * bar_length))
-            spaces = '-' * (bar_length - len(arrow))
-            elapsed_time = time.time() - start_processing_time
-            time_per_file = elapsed_time / current if current > 0 else 0
-            remaining_files = total - current
-            remaining_time = time_per_file * remaining_files
+            def print_progress_bar(current, total, bar_length=50):
+                """打印文本进度条"""
+                percent = float(current) / total
+                arrow = '#' * int(round(percent * bar_length))
+                spaces = '-' * (bar_length - len(arrow))
+                elapsed_time = time.time() - start_processing_time
+                time_per_file = elapsed_time / current if current > 0 else 0
+                remaining_files = total - current
+                remaining_time = time_per_file * remaining_files
             
-            print(f"\r进度: [{arrow}{spaces}] {int(round(percent * 100))}% | "
-                  f"已处理: {current}/{total} | "
-                  f"耗时: {elapsed_time:.1f}秒 | "
-                  f"剩余时间: ~{remaining_time:.1f}秒", end='', flush=True)
-
-        for i, (file_number, md5_value) in enumerate(files_to_play, 1):
-            # 检查是否已处理
-            if file_number in processed_files:
-                print(f"\n跳过已处理文件 {file_number} ({i}/{total_files})")
+                print(f"\r进度: [{arrow}{spaces}] {int(round(percent * 100))}% | "
+                      f"已处理: {current}/{total} | "
+                      f"耗时: {elapsed_time:.1f}秒 | "
+                      f"剩余时间: ~{remaining_time:.1f}秒", end='', flush=True)
+
+            for i, (file_number, _) in enumerate(files_to_play, 1):
+                # 检查是否已处理
+                if is_acked(confirmed, int(file_number)):
+                    print(f"\n跳过已处理文件 {file_number} ({i}/{total_files})")
+                    processed_count += 1
+                    print_progress_bar(processed_count, total_files)
+                    continue
+
+                # 后台预取好的帧（预先生成的BMP或从TAR分片即时渲染），同时预取之后的K帧
+                image = prefetcher.get(file_number, upcoming[upcoming_positions[file_number] + 1:])
+                if image is None:
+                    print(f"\n错误: 无法得到帧 {file_number} 的画面")
+                    processed_count += 1
+                    print_progress_bar(processed_count, total_files)
+                    continue
+
+                # 更新图片，等待实际绘制完成
+                print(f"\n更新图片: 帧 {file_number} ({i}/{total_files})")
+                requested = time.time()
+                painted = show_frame(image, viewer, updater)
+                if painted is None:
+                    print(f"警告: 帧 {file_number} 未在1秒内完成绘制")
+                    painted = time.time()
+                else:
+                    display_latencies.append(painted - requested)
+
+                # 等待宿主机确认（宿主机保存文件后原子地改写确认位图）
+                print(f"等待宿主机确认: example.tar.{file_number}")
+                if not ack_watcher.wait_for(int(file_number), timeout=frame_timeout or None):
+                    print(f"等待超时，先播放下一张图片（缺失的帧最后由校验帧或重播补齐）")
+                    continue
+
+                ack_latencies.append(time.time() - painted)
+                print(f"宿主机已确认（绘制后 {ack_latencies[-1] * 1000:.0f}ms），准备下一张图片...")
                 processed_count += 1
                 print_progress_bar(processed_count, total_files)
-                continue
-
-            # 构建图片文件路径
-            image_filename = f"output.{file_number}.bmp"
-            image_path = os.path.join(args.output_folder, image_filename)
-
-            if not os.path.exists(image_path):
-                print(f"\n错误: 找不到图片文件: {image_path}")
-                processed_count += 1
-                print_progress_bar(processed_count, total_files)
-                continue
-
-            # 更新图片
-            print(f"\n更新图片: {image_filename} ({i}/{total_files})")
-            if not open_image_with_window(image_path, viewer, updater):
-                print(f"错误: 无法更新图片: {image_filename}")
-                processed_count += 1
-                print_progress_bar(processed_count, total_files)
-                continue
 
-            # 等待对应的tar文件生成
-            print(f"等待tar文件生成: example.tar.{file_number}")
-            while not check_tar_file_exists(args.transfer_path, file_number):
-                time.sleep(args.check_interval)
+            print(f"\n平均显示延迟 {average_ms(display_latencies)}，平均确认延迟（绘制完成到收到确认）"
+                  f"{average_ms(ack_latencies)}")
 
-            print(f"检测到tar文件，准备下一张图片...")
-            processed_count += 1
-            print_progress_bar(processed_count, total_files)
+            # 超时跳过的帧：改为连续播放缺失帧及其所在组的校验帧，直到全部确认
+            confirmed = ack_watcher.read()
+            if any(not is_acked(confirmed, int(file_number)) for file_number, _ in files_to_play):
+                print("\n\n仍有未确认的帧，转为连续播放缺失帧和校验帧...")
+                play_stream(files_to_play, args, viewer, updater, ack_watcher, prefetcher)
 
-            # 短暂延迟，确保文件传输完成
-            time.sleep(1)
+        prefetcher.close()
+        ack_watcher.close()
 
         # 进度条完成后换行
         print("\n\n=== 所有文件播放完成 ===")
@@ -380,16 +688,30 @@ def run_playback_logic(args, viewer, updater):
 
 def main():
     parser = argparse.ArgumentParser(description='VM Image Player')
-    parser.add_argument('--progress-file', default='progress.txt', help='Progress tracking file')
     parser.add_argument('--output-folder', default='output', help='Output folder path')
     parser.add_argument('--transfer-path', default='Y:\\auto_transfer\\host_files\\transferPath', help='Transfer path for communication')
-    parser.add_argument('--index-file', default='index.txt', help='Index file name')
-    parser.add_argument('--index-bmp', default='index.bmp', help='Index BMP file name')
-    parser.add_argument('--check-interval', type=int, default=3, help='Check interval in seconds')
-    parser.add_argument('--max-retries', type=int, default=999, help='Maximum retry attempts for MD5 verification')
-    parser.add_argument('--wait-timeout', type=int, default=120, help='Timeout for waiting index.txt file')
+    parser.add_argument('--index-file', default='index.bin', help='Binary index file name (written by package_stream.py in the output folder, by the host in the transfer path)')
+    parser.add_argument('--index-bmp', default='index.bmp', help='First index frame; larger indexes continue in index.002.bmp, index.003.bmp, ... and are shown in turn')
+    parser.add_argument('--calibration-bmp', default='calibration.bmp', help='Calibration frame shown before index.bmp (skipped if missing from the output folder)')
+    parser.add_argument('--calibration-file', default='calibration.json', help='Calibration result written by the host in the transfer path')
+    parser.add_argument('--ack-file', default='ack.bin', help='Bitmap of confirmed frame numbers written by the host in the transfer path')
+    parser.add_argument('--check-interval', type=float, default=0.25, help='Maximum acknowledgement polling interval in seconds')
+    parser.add_argument('--stream', action='store_true', help='Continuous playback: cycle through unconfirmed frames at --frame-rate without waiting for each acknowledgement')
+    parser.add_argument('--frame-rate', type=float, default=5, help='Frames per second in --stream mode')
+    parser.add_argument('--frame-timeout', type=float, help='Seconds to wait for each acknowledgement before moving on; frames left unconfirmed are replayed with parity frames at the end (0 = wait forever; default: %g when parity frames exist, otherwise 0)' % PARITY_FRAME_TIMEOUT)
+    parser.add_argument('--frames-file', default='frames.json', help='Frame settings written by tar_to_bmp.py --settings in the output folder; frames without a BMP file are rendered from the example.tar.NNN volumes')
+    parser.add_argument('--prefetch', type=int, default=3, help='Upcoming frames prepared in a background thread so that switching frames is an immediate swap')
+    parser.add_argument('--parity-file', default='parity.txt', help='Parity frame list written by tar_to_bmp.py in the output folder')
+    parser.add_argument('--max-retries', type=int, default=999, help='Maximum retry attempts for index verification')
+    parser.add_argument('--wait-timeout', type=int, default=120, help='Timeout for waiting for the index file')
 
     args = parser.parse_args()
+    if args.frame_timeout is not None and args.frame_timeout < 0:
+        parser.error('--frame-timeout must be >= 0')
+    if args.frame_rate <= 0:
+        parser.error('--frame-rate must be > 0')
+    if args.prefetch < 0:
+        parser.error('--prefetch must be >= 0')
         
     # 创建Qt应用
     app = QApplication(sys.argv)